@@ -0,0 +1,439 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+import s_ast as ast
+from s_data import TokenType
+from s_lex import Lexer, FastLexer, TokenBuffer
+from s_parse import Parser
+import s_run
+import s_pure
+import s_builtins
+from s_type import Function, ListType, IntType, FloatType, BoolType, Rope
+
+programs = {
+    "loop": """
+let i: int = 0, j: int = 0, s: int = 0;
+while i < 300 {
+    j = 0;
+    while j < 300 {
+        if (i + j) % 3 == 0 {
+            s = s + i * j;
+        } else {
+            s = s - 1;
+        }
+        j = j + 1;
+    }
+    i = i + 1;
+}
+""",
+    "locals": """
+let i: int = 0, s: int = 0;
+while i < 100000 {
+    let a: int = i * 2, b: int = i % 7;
+    if a > b {
+        let d: int = a - b;
+        s = s + d;
+    }
+    i = i + 1;
+}
+""",
+    "search": """
+fn find(limit: int, target: int) -> int {
+    let i: int = 0;
+    while i < limit {
+        if i == target {
+            return i;
+        }
+        if i % 2 == 0 {
+            i = i + 1;
+            continue;
+        }
+        i = i + 1;
+    }
+    return -1;
+}
+fn guard(x: int) -> int {
+    if x < 0 {
+        return 0;
+    }
+    if x > 100 {
+        return 100;
+    }
+    return x;
+}
+let k: int = 0, s: int = 0;
+while k < 3000 {
+    s = s + guard(k % 300 - 100) + find(50, k % 40);
+    k = k + 1;
+}
+""",
+    "call": """
+fn fib(n: int) -> int {
+    if n < 2 {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+let res: int = fib(20);
+""",
+    "args": """
+fn add3(a: int, b: int, c: int) -> int {
+    return a + b + c;
+}
+fn inc(x: int) -> int {
+    return x + 1;
+}
+let i: int = 0, s: int = 0;
+while i < 30000 {
+    s = add3(s, inc(i), 1);
+    i = i + 1;
+}
+""",
+    "dotloop": """
+let a: list<int> = arange(100000), b: list<int> = map_scale(arange(100000), 3);
+let i: int = 0, s: int = 0;
+while i < 100000 {
+    s = s + a[i] * b[i];
+    i = i + 1;
+}
+""",
+    "dot": """
+let a: list<int> = arange(100000), b: list<int> = map_scale(arange(100000), 3);
+let s: int = dot(a, b);
+""",
+}
+
+
+def results(scope: ast.Scope) -> dict:
+    return {k: v for k, v in scope.variables.items() if not callable(v)}
+
+
+def bench_lexers(lexers: list[type], repeat: int = 3, copies: int = 500):
+    code = "".join(programs.values()) * copies
+    base = None
+    for lexer in lexers:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokens = lexer(code)
+            while tokens.next().tp != TokenType.EOF:
+                pass
+            best = min(best, time.perf_counter() - start)
+        if base is None:
+            base = best
+        print(f"{'lex':<8} {lexer.__name__:<12} {best * 1000:9.2f} ms  x{base / best:.2f}")
+
+
+def bench_token_memory(copies: int = 500):
+    """比较保存全部 Token 对象与 TokenBuffer 的内存峰值"""
+    code = "".join(programs.values()) * copies
+    for name in ("tokens", "buffer"):
+        tracemalloc.start()
+        if name == "tokens":
+            lexer = FastLexer(code)
+            tokens = [lexer.next()]
+            while tokens[-1].tp != TokenType.EOF:
+                tokens.append(lexer.next())
+        else:
+            tokens = TokenBuffer(code)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{'memory':<8} {name:<12} {peak / 1024:9.1f} KB  {len(tokens)} tokens")
+        del tokens
+
+
+def bench_list_memory(size: int = 1000000):
+    """比较 Python list 与紧凑存储的 list<int>/list<float>/list<bool> 的内存峰值"""
+    for elem, values in ((IntType, lambda: range(size)), (FloatType, lambda: map(float, range(size))),
+                         (BoolType, lambda: (i % 2 == 0 for i in range(size)))):
+        peaks = []
+        for make in (list, ListType(elem).make):
+            tracemalloc.start()
+            lst = make(values())
+            peaks.append(tracemalloc.get_traced_memory()[0])
+            tracemalloc.stop()
+            del lst
+        print(f"{'list':<8} {str(elem):<12} {peaks[0] / 1024:9.1f} KB  typed {peaks[1] / 1024:9.1f} KB  x{peaks[0] / peaks[1]:.2f}")
+
+
+def bench_string_building(engine: str = "tree", sizes: list[int] = [1, 10], piece: int = 100):
+    """循环中追加构造 size MB 的 str，比较 Rope 与每次复制的直接拼接；直接拼接是平方复杂度，只测 1 MB"""
+    threshold = Rope.threshold
+    for size in sizes:
+        count = size * 1000000 // piece
+        code = f'let s: str = "", i: int = 0;\nwhile i < {count} {{\n    s = s + "{"x" * (piece - 1)}\\n";\n    i = i + 1;\n}}\n'
+        runner = s_run.prepare(s_run.load(code), engine)
+        for name in ("rope", "str"):
+            if name == "str" and size > 1:
+                continue
+            Rope.threshold = threshold if name == "rope" else sys.maxsize
+            try:
+                scope = s_builtins.new_run_scope()
+                start = time.perf_counter()
+                runner(scope)
+                text = str(scope.variables["s"])
+                elapsed = time.perf_counter() - start
+            finally:
+                Rope.threshold = threshold
+            print(f"{'concat':<8} {f'{size} MB {name}':<12} {elapsed * 1000:9.2f} ms  {len(text)} chars")
+
+
+def bench_parser(terms: list[int] = [10000, 100000], depth: int = 50000):
+    for n in terms:
+        code = " + ".join(f"x * {i} - (y << {i % 8})" for i in range(n))
+        start = time.perf_counter()
+        Parser(FastLexer(code)).parse_expr()
+        print(f"{'parse':<8} {str(n) + ' terms':<12} {(time.perf_counter() - start) * 1000:9.2f} ms")
+    code = "(" * depth + "1" + ")" * depth
+    start = time.perf_counter()
+    Parser(FastLexer(code)).parse_expr()
+    print(f"{'parse':<8} {str(depth) + ' deep':<12} {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+
+def bench_allocations(engine: str = "tree"):
+    """统计执行时创建的 Scope 数量和 tracemalloc 的内存峰值"""
+    jit_threshold, Function.jit_threshold = Function.jit_threshold, None
+    memo_size, Function.memo_size = Function.memo_size, None
+    init = ast.Scope.__init__
+    for name, code in programs.items():
+        runner = s_run.prepare(s_run.load(code), engine)
+        created = 0
+
+        def counting(self, *args):
+            nonlocal created
+            created += 1
+            init(self, *args)
+        ast.Scope.__init__ = counting
+        tracemalloc.start()
+        try:
+            runner(s_builtins.new_run_scope())
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+            ast.Scope.__init__ = init
+        print(f"{'alloc':<8} {name:<12} {created:>9} scopes {peak / 1024:9.1f} KB peak")
+    Function.jit_threshold, Function.memo_size = jit_threshold, memo_size
+
+
+def bench(engines: list[str], repeat: int = 3):
+    jit_threshold, memo_size = Function.jit_threshold, Function.memo_size
+    for name, code in programs.items():
+        program, optimized = s_run.load(code), s_run.load(code, optimize=True)
+        base = None
+        for engine in engines:
+            # "tree" 为纯解释执行，"+jit" 打开热点函数编译，"+opt" 先优化程序，"+memo" 缓存纯函数的结果
+            engine_name, *options = engine.split("+")
+            Function.jit_threshold = jit_threshold if "jit" in options else None
+            Function.memo_size = memo_size if "memo" in options else None
+            runner = s_run.prepare(optimized if "opt" in options else program, engine_name)
+            best = float("inf")
+            for _ in range(repeat):
+                scope = s_builtins.new_run_scope()
+                start = time.perf_counter()
+                runner(scope)
+                best = min(best, time.perf_counter() - start)
+            if base is None:
+                base = (best, results(scope))
+            elif results(scope) != base[1]:
+                raise AssertionError(f"engine '{engine}' disagrees on '{name}'.")
+            print(f"{name:<8} {engine:<12} {best * 1000:9.2f} ms  x{base[0] / best:.2f}")
+    Function.jit_threshold, Function.memo_size = jit_threshold, memo_size
+
+
+def deep_expression(depth: int = 100, rounds: int = 200) -> str:
+    """嵌套 depth 层的算术表达式，反复求值"""
+    expr = "x"
+    for k in range(depth):
+        expr = f"({expr} * {k % 7 + 1} + {k}) % 1009"
+    return f"let x: int = 0, r: int = 0;\nwhile r < {rounds} {{\n    x = {expr};\n    r = r + 1;\n}}\n"
+
+
+def generated_source(functions: int = 500) -> str:
+    """许多结构相似的函数及依次调用它们的主程序，约每个函数十行"""
+    parts = []
+    for i in range(functions):
+        parts.append(f"""fn f{i}(a: int, b: int) -> int {{
+    let s: int = a, k: int = 0;
+    while k < b {{
+        if (s + k) % 3 == {i % 3} {{
+            s = s + k * {i};
+        }} else {{
+            s = s - {i % 7};
+        }}
+        k = k + 1;
+    }}
+    return s % 100003;
+}}
+""")
+    parts.append("let acc: int = 0;\n")
+    parts.extend(f"acc = f{i}(acc, 10);\n" for i in range(functions))
+    return "".join(parts)
+
+
+# 基准测试集：各程序分别计时词法分析、语法分析、检查和执行
+suite = {
+    "fib": """
+fn fib(n: int) -> int {
+    if n < 2 {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+let res: int = fib(20);
+""",
+    "loops": programs["loop"],
+    "strings": """
+let s: str = "", i: int = 0, hits: int = 0;
+while i < 20000 {
+    s = s + "item " + "#" + "; ";
+    if s[i] == "#" {
+        hits = hits + 1;
+    }
+    i = i + 1;
+}
+""",
+    "sort": """
+let n: int = 400, a: list<int> = zeros(400), seed: int = 12345, i: int = 0;
+while i < n {
+    seed = (seed * 1103515245 + 12345) % 2147483648;
+    a[i] = seed % 100000;
+    i = i + 1;
+}
+i = 1;
+while i < n {
+    let x: int = a[i], j: int = i - 1;
+    while j >= 0 && a[j] > x {
+        a[j + 1] = a[j];
+        j = j - 1;
+    }
+    a[j + 1] = x;
+    i = i + 1;
+}
+""",
+    "deep": deep_expression(),
+    "generated": generated_source(),
+}
+PHASES = ("lex", "parse", "check", "run")
+
+
+def measure(code: str, engine: str = "tree", repeat: int = 5) -> dict[str, list[float]]:
+    """各阶段每次运行的时间（秒）；engine 的写法与 bench 相同，+opt 的优化不计入时间"""
+    engine_name, *options = engine.split("+")
+    jit_threshold, memo_size = Function.jit_threshold, Function.memo_size
+    Function.jit_threshold = jit_threshold if "jit" in options else None
+    Function.memo_size = memo_size if "memo" in options else None
+    times: dict[str, list[float]] = {phase: [] for phase in PHASES}
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tokens = TokenBuffer(code)
+            times["lex"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            program = Parser(tokens).parse_program()  # type: ignore
+            times["parse"].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            program.check(s_builtins.new_check_scope())
+            s_pure.analyze(program)
+            times["check"].append(time.perf_counter() - start)
+            if "opt" in options:
+                s_run.optimize_program(program)
+            scope = s_builtins.new_run_scope()
+            start = time.perf_counter()
+            s_run.prepare(program, engine_name)(scope)
+            times["run"].append(time.perf_counter() - start)
+    finally:
+        Function.jit_threshold, Function.memo_size = jit_threshold, memo_size
+    return times
+
+
+def summarize(times: list[float]) -> dict[str, float]:
+    return {"median": statistics.median(times), "min": min(times), "max": max(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0}
+
+
+def run_suite(names: list[str] | None = None, engine: str = "tree", repeat: int = 5) -> dict:
+    """运行基准测试集，返回可写成 JSON 的结果"""
+    results: dict[str, dict] = {}
+    for name in names or list(suite):
+        times = measure(suite[name], engine, repeat)
+        results[name] = {phase: summarize(times[phase]) for phase in PHASES}
+        cells = "  ".join(f"{phase} {results[name][phase]['median'] * 1000:8.2f} ms "
+                          f"±{results[name][phase]['stdev'] * 1000:6.2f}" for phase in PHASES)
+        print(f"{name:<10} {cells}")
+    return {"format": 1, "engine": engine, "repeat": repeat,
+            "python": platform.python_version(), "results": results}
+
+
+def compare(old: dict, new: dict, threshold: float = 0.1) -> int:
+    """按中位数比较两次结果，打印变化并返回慢了超过 threshold 的项数"""
+    if old.get("engine") != new.get("engine"):
+        print(f"warning: comparing engine '{old.get('engine')}' with '{new.get('engine')}'.")
+    regressions = 0
+    for name, phases in new["results"].items():
+        if name not in old["results"]:
+            continue
+        for phase, stats in phases.items():
+            before = old["results"][name].get(phase)
+            if before is None or not before["median"]:
+                continue
+            ratio = stats["median"] / before["median"]
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "REGRESSION"
+                regressions += 1
+            elif ratio < 1 / (1 + threshold):
+                flag = "improved"
+            print(f"{name:<10} {phase:<6} {before['median'] * 1000:9.2f} ms -> {stats['median'] * 1000:9.2f} ms"
+                  f"  x{ratio:.2f}  {flag}")
+    return regressions
+
+
+def main(argv: list[str] | None = None):
+    argparser = argparse.ArgumentParser(description="benchmark the Static interpreter.")
+    commands = argparser.add_subparsers(dest="command")
+    run = commands.add_parser("suite", help="time each phase of the benchmark programs.")
+    run.add_argument("names", nargs="*", help=f"programs to run, all by default: {', '.join(suite)}.")
+    run.add_argument("--engine", default="tree",
+                     help="engine with optional +opt/+jit/+memo, as in the default benchmarks.")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--json", metavar="FILE", help="write the results to FILE.")
+    diff = commands.add_parser("compare", help="compare two result files of 'suite --json'.")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.1,
+                      help="relative slowdown of the median reported as a regression.")
+    args = argparser.parse_args(argv)
+
+    if args.command == "suite":
+        if args.engine.split("+")[0] not in s_run.engines:
+            argparser.error(f"unknown engine '{args.engine}'.")
+        unknown = [name for name in args.names if name not in suite]
+        if unknown:
+            argparser.error(f"unknown programs: {', '.join(unknown)}.")
+        data = run_suite(args.names, args.engine, args.repeat)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+    elif args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        if compare(old, new, args.threshold):
+            sys.exit(1)
+    else:
+        bench_lexers([Lexer, FastLexer, TokenBuffer])
+        bench_token_memory()
+        bench_parser()
+        bench_list_memory()
+        bench_string_building()
+        bench_allocations()
+        bench(["tree", "tree+opt", "tree+jit", "tree+memo", *list(s_run.engines)[1:], "closure+opt", "vm+memo"])
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,8 @@ from typing import Any, TypeAlias
 from s_type import *
 from enum import Enum, unique
 from s_error import SNameError, STypeError
-from s_data import TokenType
-from s_type import Any, Scope, Type
+from s_data import TokenType, binary_ops, unary_ops
+from s_type import Any, Type
 
 
 @unique
@@ -14,39 +14,87 @@ class SignalType(Enum):
 
 
 class RunSignal:
+    __slots__ = ("signal", "ret_val")
+
     def __init__(self, signal: SignalType, ret_val: Any = None):
         self.signal, self.ret_val = signal, ret_val
 
 
+# 控制流信号都是共享的单例，循环和函数用 is 判断即可
+BREAK = RunSignal(SignalType.BREAK)
+CONTINUE = RunSignal(SignalType.CONTINUE)
+# 返回值写入 RETURN.ret_val 后立即沿调用链返回，在执行其他语句之前就会被 Function 取走
+RETURN = RunSignal(SignalType.RETURN)
+
+
 class Scope:
-    def __init__(self, parent: "Scope | None" = None):
+    __slots__ = ("parent", "names", "slots")
+
+    def __init__(self, parent: "Scope | None" = None, names: dict[str, int] | None = None, slots: list[Any] | None = None):
         self.parent = parent
-        self.variables: dict[str, Any] = {}
+        # 变量名到槽位的映射，槽位按定义顺序分配，与 check 时的顺序一致
+        # 检查过的块会传入 check 得到的完整映射，各次运行共享而不再修改
+        self.names: dict[str, int] = {} if names is None else names
+        self.slots: list[Any] = [] if slots is None else slots
+
+    @property
+    def variables(self) -> dict[str, Any]:
+        return {name: self.slots[slot] for name, slot in self.names.items()}
+
+    def bind(self, names: list[str], vals):
+        self.names = dict(zip(names, range(len(names))))
+        self.slots = list(vals)
 
     def find(self, name: str):
-        if name in self.variables:
-            return self.variables[name]
-        if self.parent:
-            return self.parent.find(name)
+        scope = self
+        while scope is not None:
+            slot = scope.names.get(name)
+            if slot is not None:
+                return scope.slots[slot]
+            scope = scope.parent
         raise SNameError(f"undefined variable '{name}'.")
 
     def set(self, name: str, val):
-        if name in self.variables:
-            self.variables[name] = val
-            return
-        if self.parent:
-            self.parent.set(name, val)
-            return
+        scope = self
+        while scope is not None:
+            slot = scope.names.get(name)
+            if slot is not None:
+                scope.slots[slot] = val
+                return
+            scope = scope.parent
         raise SNameError(f"undefined variable '{name}'.")
 
-    def define(self, name: str, val):
-        self.variables[name] = val
+    def define(self, name: str, val) -> int:
+        if name in self.names:
+            slot = self.names[name]
+            self.slots[slot] = val
+            return slot
+        self.names[name] = len(self.slots)
+        self.slots.append(val)
+        return self.names[name]
+
+    def lookup(self, name: str) -> tuple[int, int]:
+        """静态解析变量，返回 (向外的层数, 槽位)"""
+        scope, depth = self, 0
+        while scope is not None:
+            if name in scope.names:
+                return depth, scope.names[name]
+            scope, depth = scope.parent, depth + 1
+        raise SNameError(f"undefined variable '{name}'.")
 
 
 class Expr:
     """表达式"""
+    # check 推导出的类型
+    type: Type | None = None
+    # 起始 Token 的 (行, 列)，与语法错误信息中的行列号一致，只在解析时要求记录位置才有
+    pos: tuple[int, int] | None = None
 
     def check(self, scope: Scope) -> Type:
+        self.type = self.infer(scope)
+        return self.type
+
+    def infer(self, scope: Scope) -> Type:
         ...
 
     def eval(self, scope: Scope) -> Any:
@@ -55,6 +103,7 @@ class Expr:
 
 class Stmt:
     """语句"""
+    pos: tuple[int, int] | None = None
 
     def check(self, scope: Scope) -> Type | None:
         ...
@@ -66,6 +115,10 @@ class Stmt:
 class Block(Stmt):
     def __init__(self, stmts: list[Stmt]):
         self.stmts = stmts
+        # 由 check 填写：是否需要独立作用域，以及作用域中变量的槽位映射和数量
+        self.scoped = True
+        self.layout: dict[str, int] | None = None
+        self.size = 0
 
     def check(self, scope: Scope) -> Type | None:
         ret_type = None
@@ -81,9 +134,44 @@ class Block(Stmt):
     def run(self, scope: Scope) -> RunSignal | None:
         for stmt in self.stmts:
             ret = stmt.run(scope)
-            if ret:
+            if ret is not None:
                 return ret
 
+    def has_bindings(self) -> bool:
+        """块中是否直接声明了变量或函数，没有声明的块无需新建作用域"""
+        return any(isinstance(stmt, (VarDecl, FnDef)) for stmt in self.stmts)
+
+    def defines_functions(self) -> bool:
+        """块中（包括嵌套的块）是否定义了函数，函数会捕获所在的作用域"""
+        for stmt in self.stmts:
+            if isinstance(stmt, FnDef):
+                return True
+            if isinstance(stmt, IfStmt) and (stmt.else_block.defines_functions() or
+                                             any(body.defines_functions() for _, body in stmt.cases)):
+                return True
+            if isinstance(stmt, WhileStmt) and stmt.body.defines_functions():
+                return True
+            if isinstance(stmt, RangeStmt) and stmt.loop.body.defines_functions():
+                return True
+        return False
+
+    def check_nested(self, scope: Scope) -> Type | None:
+        """检查 if/while 的块，只有声明了变量的块才会有自己的作用域"""
+        self.scoped = self.has_bindings()
+        if not self.scoped:
+            return self.check(scope)
+        inner = Scope(scope)
+        ret = self.check(inner)
+        self.layout, self.size = inner.names, len(inner.slots)
+        return ret
+
+    def enter(self, scope: Scope) -> Scope:
+        if not self.scoped:
+            return scope
+        if self.layout is None:
+            return Scope(scope)
+        return Scope(scope, self.layout, [None] * self.size)
+
 
 class NoOp(Stmt):
     ...
@@ -108,13 +196,13 @@ class IfStmt(Stmt):
         ret_type = None
         for cond, body in self.cases:
             cond.check(scope)
-            ret = body.check(Scope(scope))
+            ret = body.check_nested(scope)
             if ret is not None:
                 if ret_type is not None and ret_type != ret_type:
                     raise STypeError(
                         f"conflicting return type '{ret}' and '{ret_type}'.")
                 ret_type = ret
-        ret = self.else_block.check(Scope(scope))
+        ret = self.else_block.check_nested(scope)
         if ret is not None:
             if ret_type is not None and ret_type != ret_type:
                 raise STypeError(
@@ -124,26 +212,93 @@ class IfStmt(Stmt):
     def run(self, scope: Scope) -> RunSignal | None:
         for cond, body in self.cases:
             if cond.eval(scope):
-                return body.run(Scope(scope))
-        return self.else_block.run(Scope(scope))
+                return body.run(body.enter(scope))
+        return self.else_block.run(self.else_block.enter(scope))
 
 
 class WhileStmt(Stmt):
     def __init__(self, cond: Expr, body: Block):
         self.cond, self.body = cond, body
+        # 循环体中没有函数捕获作用域时，各次迭代复用同一个作用域
+        self.reuse_frame = False
 
     def check(self, scope: Scope) -> Type | None:
         self.cond.check(scope)
-        return self.body.check(Scope(scope))
+        ret = self.body.check_nested(scope)
+        self.reuse_frame = self.body.scoped and not self.body.defines_functions()
+        return ret
 
     def run(self, scope: Scope) -> RunSignal | None:
+        if self.reuse_frame:
+            return self.run_in_frame(scope)
+        while self.cond.eval(scope):
+            ret = self.body.run(self.body.enter(scope))
+            if ret is not None:
+                if ret is BREAK:
+                    break
+                if ret is RETURN:
+                    return ret
+
+
+    def run_in_frame(self, scope: Scope) -> RunSignal | None:
+        frame = self.body.enter(scope)
+        blank = (None,) * self.body.size
         while self.cond.eval(scope):
-            ret = self.body.run(Scope(scope))
-            if ret:
-                if ret.signal == SignalType.BREAK:
+            ret = self.body.run(frame)
+            frame.slots[:] = blank
+            if ret is not None:
+                if ret is BREAK:
                     break
-                if ret.signal == SignalType.RETURN:
+                if ret is RETURN:
+                    return ret
+
+
+class RangeStmt(Stmt):
+    """由优化器把 while i < n { ...; i = i + step; } 改写为 range 迭代
+    body 不含末尾的自增；运行时 i 或 n 不是 int 时退回原来的循环"""
+
+    def __init__(self, loop: WhileStmt, var: "Variable", stop: Expr, step: int, inclusive: bool, body: Block):
+        self.loop, self.var, self.stop = loop, var, stop
+        self.step, self.inclusive = step, inclusive
+        self.body = body
+
+    def check(self, scope: Scope) -> Type | None:
+        # var 和 stop 是 loop.cond 的子节点，随 loop 一起检查
+        ret = self.loop.check(scope)
+        body = self.loop.body
+        self.body.scoped, self.body.layout, self.body.size = body.scoped, body.layout, body.size
+        return ret
+
+    def run(self, scope: Scope) -> RunSignal | None:
+        owner = scope
+        for _ in range(self.var.depth):
+            owner = owner.parent  # type: ignore
+        slots, slot = owner.slots, self.var.slot
+        start, stop = slots[slot], self.stop.eval(scope)
+        if type(start) is not int or type(stop) is not int:
+            return self.loop.run(scope)
+        body, step = self.body, self.step
+        reuse = self.loop.reuse_frame
+        frame = body.enter(scope)
+        blank = (None,) * body.size
+        if self.inclusive:
+            stop += 1
+        for i in range(start, stop, step):
+            slots[slot] = i
+            ret = body.run(frame)
+            if reuse:
+                frame.slots[:] = blank
+            elif body.scoped:
+                frame = body.enter(scope)
+            if ret is not None:
+                if ret is BREAK:
+                    return None
+                if ret is RETURN:
                     return ret
+        else:
+            # 正常结束时补上最后一次自增
+            if start < stop:
+                slots[slot] += step
 
 
 class ReturnStmt(Stmt):
@@ -154,17 +309,18 @@ class ReturnStmt(Stmt):
         return self.ret.check(scope)
 
     def run(self, scope: Scope) -> RunSignal | None:
-        return RunSignal(SignalType.RETURN, self.ret.eval(scope))
+        RETURN.ret_val = self.ret.eval(scope)
+        return RETURN
 
 
 class BreakStmt(Stmt):
     def run(self, scope: Scope) -> RunSignal | None:
-        return RunSignal(SignalType.BREAK)
+        return BREAK
 
 
 class ContinueStmt(Stmt):
     def run(self, scope: Scope) -> RunSignal | None:
-        return RunSignal(SignalType.CONTINUE)
+        return CONTINUE
 
 
 class VarDecl(Stmt):
@@ -173,6 +329,10 @@ class VarDecl(Stmt):
 
     def check(self, scope: Scope) -> Type | None:
         for name, tp, val in self.variables:
+            # 初值在声明生效前检查，其中同名变量仍指向外层
+            if val and val.check(scope) != tp:
+                raise STypeError(f"conflicting declared type '{
+                                 tp}' and initial type '{val.type}' of '{name}'.")
             scope.define(name, tp)
 
     def run(self, scope: Scope) -> RunSignal | None:
@@ -199,30 +359,45 @@ class Assign(Stmt):
     def run(self, scope: Scope) -> RunSignal | None:
         right = self.right.eval(scope)
         if isinstance(self.left, Variable):
-            scope.set(self.left.name, right)
+            if self.left.slot < 0:
+                scope.set(self.left.name, right)
+                return
+            for _ in range(self.left.depth):
+                scope = scope.parent  # type: ignore
+            scope.slots[self.left.slot] = right
         elif isinstance(self.left, IndexOp):
             left_base = self.left.base.eval(scope)
             left_index = self.left.index.eval(scope)
-            left_base[left_index] = right
+            try:
+                left_base[left_index] = right
+            except OverflowError:
+                raise out_of_range() from None
 
 
 class FnDef(Stmt):
+    # 由 s_pure.analyze 标记：是否为纯函数，以及是否按参数缓存结果
+    pure = memoize = False
+    # 由 s_opt 标记：删去不可达分支后函数体中没有 return 了，重新检查时沿用声明的返回类型
+    pruned_returns = False
+
     def __init__(self, name: str, params: list[str], param_types: list[Type], ret_type: Type, body: Block):
         self.name, self.params, self.param_types = name, params, param_types
         self.ret_type = ret_type
         self.body = body
 
     def check(self, scope: Scope) -> Type | None:
+        scope.define(self.name, FunctionType(self.ret_type, self.param_types))
         new_scope = Scope(scope)
-        new_scope.variables = dict(zip(self.params, self.param_types))
+        new_scope.bind(self.params, self.param_types)
         ret_type = self.body.check(new_scope)
-        if ret_type != self.ret_type:
+        self.body.layout, self.body.size = new_scope.names, len(new_scope.slots)
+        if ret_type != self.ret_type and not (ret_type is None and self.pruned_returns):
             raise STypeError("conflicting return types '{}' and '{}'.".format(
                 self.ret_type, ret_type))
-        scope.define(self.name, FunctionType(self.ret_type, self.param_types))
 
     def run(self, scope: Scope) -> RunSignal | None:
-        scope.define(self.name, Function(
+        cls = MemoFunction if self.memoize and Function.memo_size else Function
+        scope.define(self.name, cls(
             self.params, self.param_types, self.ret_type, self.body, scope))
 
 
@@ -230,8 +405,8 @@ class Const(Expr):
     def __init__(self, val: Any):
         self.val = val
 
-    def check(self, scope: Scope) -> Type | None:
-        return BasicType(type(self.val).__name__)
+    def infer(self, scope: Scope) -> Type | None:
+        return NoneType if self.val is None else BasicType(type(self.val).__name__)
 
     def eval(self, scope: Scope) -> Any:
         return self.val
@@ -240,77 +415,243 @@ class Const(Expr):
 class Variable(Expr):
     def __init__(self, name: str):
         self.name = name
+        # 由 check 解析出的地址，未检查过的节点按名字查找
+        self.depth, self.slot = 0, -1
 
-    def check(self, scope: Scope) -> Type | None:
+    def infer(self, scope: Scope) -> Type | None:
+        self.depth, self.slot = scope.lookup(self.name)
+        self.__class__ = LocalVariable if self.depth == 0 else Variable
         return scope.find(self.name)
 
     def eval(self, scope: Scope) -> Any:
-        return scope.find(self.name)
+        if self.slot < 0:
+            return scope.find(self.name)
+        for _ in range(self.depth):
+            scope = scope.parent  # type: ignore
+        return scope.slots[self.slot]
+
+
+class LocalVariable(Variable):
+    """check 时解析到当前作用域的变量"""
+
+    def eval(self, scope: Scope) -> Any:
+        return scope.slots[self.slot]
 
 
 class Binary(Expr):
+    def __new__(cls, op: TokenType | None = None, *args):
+        # 按运算符构造对应的子类，求值时无需再分派
+        if cls is Binary and op is not None:
+            cls = binary_nodes.get(op, Binary)
+        return super().__new__(cls)
+
     def __init__(self, op: TokenType, left: Expr, right: Expr):
         self.op, self.left, self.right = op, left, right
+        self.func = binary_ops.get(op)
+
+    def __reduce_ex__(self, protocol):
+        # 反序列化时类已经确定，绕过按运算符选择子类的 __new__
+        return object.__new__, (type(self),), self.__dict__
 
     def check(self, scope: Scope) -> Type:
+        super().check(scope)
+        # 按 check 得到的类型和操作数的形状选择求值实现，重新检查时重新选择
+        self.func = binary_func(self)
+        self.__class__ = specialize_binary(self)
+        return self.type  # type: ignore
+
+    def infer(self, scope: Scope) -> Type:
         op = self.op
         left, right = self.left.check(scope), self.right.check(scope)
         if op in (TokenType.EQ, TokenType.NE, TokenType.AND, TokenType.OR):
-            return BasicType("bool")
+            return BoolType
         if isinstance(left, BasicType) and isinstance(right, BasicType) and \
                 left.name in ("int", "float", "bool") and right.name in ("int", "float", "bool"):
             if op in (TokenType.GT, TokenType.LT, TokenType.GE, TokenType.LE):
                 return BoolType
-            if "float" in (left.name, right.name):
+            # 与运行时一致，/ 的结果总是 float
+            if "float" in (left.name, right.name) or op == TokenType.DIV:
                 return FloatType
             return IntType
         if op == TokenType.ADD and left.issubscriptable() and right.issubscriptable():
             return left
         if op == TokenType.MUL and (left == IntType and right.issubscriptable()
                                     or left.issubscriptable() and right == IntType):
-            return right
+            return left if left.issubscriptable() else right
         raise STypeError(
             f"unsupported binary operation '{op}' between type '{left}' and type '{right}'.")
 
     def eval(self, scope: Scope) -> Any:
-        op = self.op
-        left = self.left.eval(scope)
-        if op == TokenType.AND:
-            if not left:
-                return False
-            else:
-                return bool(self.right.eval(scope))
-        if op == TokenType.OR:
-            if left:
-                return True
-            else:
-                return bool(self.right.eval(scope))
-        right = self.right.eval(scope)
-        return {
-            TokenType.ADD: lambda a, b: a + b,
-            TokenType.SUB: lambda a, b: a - b,
-            TokenType.MUL: lambda a, b: a * b,
-            TokenType.DIV: lambda a, b: a / b,
-            TokenType.MOD: lambda a, b: a % b,
-            TokenType.EQ: lambda a, b: a == b,
-            TokenType.NE: lambda a, b: a != b,
-            TokenType.GT: lambda a, b: a > b,
-            TokenType.LT: lambda a, b: a < b,
-            TokenType.GE: lambda a, b: a >= b,
-            TokenType.LE: lambda a, b: a <= b,
-            TokenType.LSH: lambda a, b: a << b,
-            TokenType.RSH: lambda a, b: a >> b,
-            TokenType.BITAND: lambda a, b: a & b,
-            TokenType.BITOR: lambda a, b: a | b,
-            TokenType.XOR: lambda a, b: a ^ b,
-        }[op](left, right)
+        return self.func(self.left.eval(scope), self.right.eval(scope))
+
+
+class AndOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return bool(self.right.eval(scope)) if self.left.eval(scope) else False
+
+
+class OrOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return True if self.left.eval(scope) else bool(self.right.eval(scope))
+
+
+class AddOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) + self.right.eval(scope)
+
+
+class SubOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) - self.right.eval(scope)
+
+
+class MulOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) * self.right.eval(scope)
+
+
+class DivOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) / self.right.eval(scope)
+
+
+class ModOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) % self.right.eval(scope)
+
+
+class EqOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) == self.right.eval(scope)
+
+
+class NeOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) != self.right.eval(scope)
+
+
+class GtOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) > self.right.eval(scope)
+
+
+class LtOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) < self.right.eval(scope)
+
+
+class GeOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) >= self.right.eval(scope)
+
+
+class LeOp(Binary):
+    def eval(self, scope: Scope) -> Any:
+        return self.left.eval(scope) <= self.right.eval(scope)
+
+
+binary_nodes: dict[TokenType, type[Binary]] = {
+    TokenType.AND: AndOp,
+    TokenType.OR: OrOp,
+    TokenType.ADD: AddOp,
+    TokenType.SUB: SubOp,
+    TokenType.MUL: MulOp,
+    TokenType.DIV: DivOp,
+    TokenType.MOD: ModOp,
+    TokenType.EQ: EqOp,
+    TokenType.NE: NeOp,
+    TokenType.GT: GtOp,
+    TokenType.LT: LtOp,
+    TokenType.GE: GeOp,
+    TokenType.LE: LeOp,
+}
+
+
+class BoolAndOp(AndOp):
+    """右侧已是 bool，无需再转换"""
+
+    def eval(self, scope: Scope) -> Any:
+        return self.right.eval(scope) if self.left.eval(scope) else False
+
+
+class BoolOrOp(OrOp):
+    def eval(self, scope: Scope) -> Any:
+        return True if self.left.eval(scope) else self.right.eval(scope)
+
+
+class LocalConstOp(Binary):
+    """左侧是当前作用域的变量，右侧是常量"""
+
+    def eval(self, scope: Scope) -> Any:
+        return self.func(scope.slots[self.left.slot], self.right.val)  # type: ignore
+
+
+class LocalLocalOp(Binary):
+    """两侧都是当前作用域的变量"""
+
+    def eval(self, scope: Scope) -> Any:
+        slots = scope.slots
+        return self.func(slots[self.left.slot], slots[self.right.slot])  # type: ignore
+
+
+class StrAddOp(AddOp):
+    def eval(self, scope: Scope) -> Any:
+        return concat(self.left.eval(scope), self.right.eval(scope))
+
+
+class StrConcatOp(AddOp):
+    """连续的 str 拼接，一次 join 得到结果而不产生中间字符串"""
+    parts: list[Expr] = []
+
+    def eval(self, scope: Scope) -> Any:
+        return concat_all([part.eval(scope) for part in self.parts])
+
+
+def concat_parts(node: Expr) -> list[Expr]:
+    parts = []
+    while isinstance(node, Binary) and node.op == TokenType.ADD and \
+            node.left.type == StrType and node.right.type == StrType:
+        parts.append(node.right)
+        node = node.left
+    parts.append(node)
+    parts.reverse()
+    return parts
+
+
+def binary_func(node: Binary) -> Any:
+    """检查过的二元运算的实现，str 的 + 较长时拼接为 Rope"""
+    if node.op == TokenType.ADD and node.type == StrType:
+        return concat
+    return binary_ops.get(node.op)
+
+
+def specialize_binary(node: Binary) -> type[Binary]:
+    op, left, right = node.op, node.left, node.right
+    if op in (TokenType.AND, TokenType.OR):
+        if right.type == BoolType:
+            return BoolAndOp if op == TokenType.AND else BoolOrOp
+        return binary_nodes[op]
+    if op == TokenType.ADD and node.type == StrType:
+        parts = concat_parts(node)
+        if len(parts) > 2:
+            node.parts = parts  # type: ignore
+            return StrConcatOp
+    if isinstance(left, LocalVariable) and left.type in (IntType, FloatType, BoolType, StrType):
+        if isinstance(right, Const):
+            return LocalConstOp
+        if isinstance(right, LocalVariable):
+            return LocalLocalOp
+    if op == TokenType.ADD and node.type == StrType:
+        return StrAddOp
+    return binary_nodes.get(op, Binary)
 
 
 class Unary(Expr):
     def __init__(self, op: TokenType, val: Expr):
         self.op, self.val = op, val
+        self.func = unary_ops[op]
 
-    def check(self, scope: Scope) -> Type:
+    def infer(self, scope: Scope) -> Type:
         op = self.op
         val = self.val.check(scope)
         if op == TokenType.NOT:
@@ -322,48 +663,159 @@ class Unary(Expr):
         raise STypeError(f"unsupported unary operation '{op}' on type '{val}'")
 
     def eval(self, scope: Scope) -> Any:
-        return {
-            TokenType.ADD: lambda x: +x,
-            TokenType.SUB: lambda x: -x,
-            TokenType.NOT: lambda x: not x,
-            TokenType.INV: lambda x: ~x,
-        }[self.op](self.val.eval(scope))
+        return self.func(self.val.eval(scope))
 
 
 class IndexOp(Expr):
     def __init__(self, base: Expr, index: Expr):
         self.base, self.index = base, index
 
-    def check(self, scope: Scope) -> Type:
+    def infer(self, scope: Scope) -> Type:
         base, index = self.base.check(scope), self.index.check(scope)
         if index != IntType:
             raise STypeError(f"can't use type '{index}' as index.")
-        if isinstance(index, TemplateType) and index.tname == "list":
-            return index.targs[0]
-        elif index == StrType:
+        if isinstance(base, TemplateType) and base.tname == "list":
+            return base.targs[0]
+        elif base == StrType:
             return StrType
         else:
             raise STypeError(f"type '{base}' is not subscriptable.")
 
+    def check(self, scope: Scope) -> Type:
+        super().check(scope)
+        local = isinstance(self.base, LocalVariable) and isinstance(self.index, LocalVariable)
+        self.__class__ = LocalIndexOp if local else IndexOp
+        return self.type  # type: ignore
+
     def eval(self, scope: Scope) -> Any:
         return self.base.eval(scope)[self.index.eval(scope)]
 
 
+class LocalIndexOp(IndexOp):
+    """list 或 str 与下标都是当前作用域的变量"""
+
+    def eval(self, scope: Scope) -> Any:
+        slots = scope.slots
+        return slots[self.base.slot][slots[self.index.slot]]  # type: ignore
+
+
 class Call(Expr):
+    # 内联缓存：本调用点上次调用的函数及其快速调用入口，函数不变时省去查找
+    callee: Any = None
+    invoke: Any = None
+
     def __init__(self, func: Expr, args: list[Expr]):
         self.func, self.args = func, args
 
+    def __getstate__(self):
+        # 缓存的函数引用着运行时的作用域，不随 AST 序列化
+        state = self.__dict__.copy()
+        state.pop("callee", None)
+        state.pop("invoke", None)
+        return state
+
     def check(self, scope: Scope) -> Type:
+        super().check(scope)
+        # 按参数个数选用展开了实参求值的节点
+        self.__class__ = call_nodes.get(len(self.args), Call)
+        return self.type  # type: ignore
+
+    def infer(self, scope: Scope) -> Type:
         func = self.func.check(scope)
-        if not isinstance(func, TemplateType) or func.tname != "function":
+        if not isinstance(func, TemplateType) or func.tname not in ("function", "overload"):
             raise STypeError("type '{}' is not callable.".format(func))
-        ret_type, param_types = func.targs
         arg_types = list(map(lambda a: a.check(scope), self.args))
-        if param_types != arg_types:
+        if func.tname == "overload":
+            for candidate in func.targs:
+                params = candidate.targs[1:]  # type: ignore
+                if len(params) == len(arg_types) and all(map(accepts, params, arg_types)):
+                    return candidate.targs[0]  # type: ignore
+            raise STypeError("no signature of '{}' accepts argument types ({}).".format(
+                func, ", ".join(map(str, arg_types))))
+        ret_type, *param_types = func.targs
+        if len(param_types) != len(arg_types) or not all(map(accepts, param_types, arg_types)):
             raise STypeError("conflicting parameter types and argument types.")
         return ret_type
 
     def eval(self, scope: Scope) -> Any:
         func = self.func.eval(scope)
-        args = list(map(lambda a: a.eval(scope), self.args))
-        return func(*args)
+        if func is not self.callee:
+            self.callee, self.invoke = func, call_entry(func)
+        return self.invoke([arg.eval(scope) for arg in self.args])
+
+
+class Call0(Call):
+    def eval(self, scope: Scope) -> Any:
+        func = self.func.eval(scope)
+        if func is not self.callee:
+            self.callee, self.invoke = func, call_entry(func)
+        return self.invoke([])
+
+
+class Call1(Call):
+    def eval(self, scope: Scope) -> Any:
+        func = self.func.eval(scope)
+        if func is not self.callee:
+            self.callee, self.invoke = func, call_entry(func)
+        return self.invoke([self.args[0].eval(scope)])
+
+
+class Call2(Call):
+    def eval(self, scope: Scope) -> Any:
+        func = self.func.eval(scope)
+        if func is not self.callee:
+            self.callee, self.invoke = func, call_entry(func)
+        a, b = self.args
+        return self.invoke([a.eval(scope), b.eval(scope)])
+
+
+class Call3(Call):
+    def eval(self, scope: Scope) -> Any:
+        func = self.func.eval(scope)
+        if func is not self.callee:
+            self.callee, self.invoke = func, call_entry(func)
+        a, b, c = self.args
+        return self.invoke([a.eval(scope), b.eval(scope), c.eval(scope)])
+
+
+call_nodes: dict[int, type[Call]] = {0: Call0, 1: Call1, 2: Call2, 3: Call3}
+
+
+def children(node: Stmt | Expr) -> list[Stmt | Expr]:
+    """节点的直接子节点，供遍历 AST 的各个 pass 使用"""
+    if isinstance(node, Block):
+        return list(node.stmts)
+    if isinstance(node, ExprStmt):
+        return [node.expr]
+    if isinstance(node, IfStmt):
+        return [*(child for case in node.cases for child in case), node.else_block]
+    if isinstance(node, WhileStmt):
+        return [node.cond, node.body]
+    if isinstance(node, RangeStmt):
+        return [node.loop]
+    if isinstance(node, ReturnStmt):
+        return [node.ret]
+    if isinstance(node, VarDecl):
+        return [val for _, _, val in node.variables if val]
+    if isinstance(node, Assign):
+        return [node.left, node.right]
+    if isinstance(node, FnDef):
+        return [node.body]
+    if isinstance(node, Binary):
+        return [node.left, node.right]
+    if isinstance(node, Unary):
+        return [node.val]
+    if isinstance(node, IndexOp):
+        return [node.base, node.index]
+    if isinstance(node, Call):
+        return [node.func, *node.args]
+    return []
+
+
+def walk(node: Stmt | Expr):
+    """先序遍历，用显式栈避免深层嵌套时递归过深"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(children(node)))
@@ -0,0 +1,247 @@
+from typing import Any, Callable, Iterable, Iterator
+from array import array
+from collections import deque
+from itertools import islice
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+from s_lex import FastLexer
+from s_parse import Parser
+from s_error import SException, SValueError
+import s_ast as ast
+from s_type import Type, TemplateType, IntType, FloatType, BoolType, StrType, Function, Rope
+import s_run
+import s_builtins
+
+
+class Result:
+    """一个任务的结果：执行后的全局变量，或者出错信息"""
+    __slots__ = ("index", "values", "error")
+
+    def __init__(self, index: int, values: dict[str, Any] | None = None, error: str | None = None):
+        self.index, self.values, self.error = index, values, error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return f"Result({self.index}, {self.values!r})" if self.ok else f"Result({self.index}, error={self.error!r})"
+
+
+# 输入值的类型检查，float 参数也接受 int
+value_types: dict[Type, type | tuple[type, ...]] = {
+    IntType: int, FloatType: (int, float), BoolType: bool, StrType: str}
+
+
+def convert(tp: Type, val: Any) -> Any:
+    """把输入值转换为 tp 的运行时表示，list 使用与程序中相同的紧凑存储"""
+    if isinstance(tp, TemplateType) and tp.tname == "list":
+        if not isinstance(val, (list, tuple, array)):
+            raise SValueError(f"expected a list for type '{tp}', got '{type(val).__name__}'.")
+        return tp.make([convert(tp.targs[0], elem) for elem in val])
+    expected = value_types.get(tp)
+    if expected is not None and (not isinstance(val, expected) or tp != BoolType and type(val) is bool):
+        raise SValueError(f"expected a value of type '{tp}', got '{type(val).__name__}'.")
+    return float(val) if tp == FloatType else val
+
+
+def collect(scope: ast.Scope, names: list[str] | None = None) -> dict[str, Any]:
+    """全局变量中可以传回主进程的值，不含函数"""
+    variables = scope.variables
+    if names is not None:
+        variables = {name: variables[name] for name in names if name in variables}
+    return {name: val for name, val in variables.items() if not callable(val)}
+
+
+class Batch:
+    """只解析、检查一次，按不同的输入反复执行的程序
+
+    params 是由输入提供的全局变量及其类型，在程序之前依次定义；
+    outputs 是要取回的全局变量，None 表示全部。"""
+
+    def __init__(self, code: str, params: dict[str, Type] | None = None,
+                 outputs: list[str] | None = None, optimize: bool = False):
+        self.params = list((params or {}).items())
+        self.outputs = outputs
+        self.program = s_run.load(code, optimize, check_scope=self.check_scope)
+
+    def check_scope(self) -> ast.Scope:
+        scope = s_builtins.new_check_scope()
+        for name, tp in self.params:
+            scope.define(name, tp)
+        return scope
+
+    def bind(self, inputs: dict[str, Any]) -> ast.Scope:
+        """以输入定义参数的全局作用域，槽位与检查时一致"""
+        missing = [name for name, _ in self.params if name not in inputs]
+        if missing:
+            raise SValueError(f"missing inputs: {', '.join(missing)}.")
+        scope = s_builtins.new_run_scope()
+        for name, tp in self.params:
+            scope.define(name, convert(tp, inputs[name]))
+        return scope
+
+
+def attempt(index: int, job: Callable[[], dict[str, Any]]) -> Result:
+    """执行一个任务，程序的错误和运行时的 Python 异常都只影响本任务"""
+    try:
+        return Result(index, job())
+    except Exception as e:
+        return Result(index, error=f"{type(e).__name__}: {e}")
+
+
+# 工作进程中的状态，由各自的 init 函数在进程启动时设置一次
+worker: Any = None
+
+
+def init_batch(data: bytes, engine: str, jit_threshold: int | None, memo_size: int | None):
+    global worker
+    Function.jit_threshold, Function.memo_size = jit_threshold, memo_size
+    batch = pickle.loads(data)
+    worker = batch, s_run.prepare(batch.program, engine)
+
+
+def run_inputs(chunk: list[tuple[int, dict[str, Any] | str]]) -> list[Result]:
+    batch, runner = worker
+
+    def job(inputs: dict[str, Any] | str) -> dict[str, Any]:
+        # JSON 行在任务中解析，格式错误只影响这一组输入
+        if isinstance(inputs, str):
+            inputs = json.loads(inputs)
+            if not isinstance(inputs, dict):
+                raise SValueError(f"expected a JSON object, got '{type(inputs).__name__}'.")
+        scope = batch.bind(inputs)
+        runner(scope)
+        return collect(scope, batch.outputs)
+    return [attempt(index, lambda: job(inputs)) for index, inputs in chunk]
+
+
+def init_sources(engine: str, optimize: bool, jit_threshold: int | None, memo_size: int | None):
+    global worker
+    Function.jit_threshold, Function.memo_size = jit_threshold, memo_size
+    worker = engine, optimize
+
+
+def run_sources(chunk: list[tuple[int, str]]) -> list[Result]:
+    engine, optimize = worker
+
+    def job(code: str) -> dict[str, Any]:
+        return collect(s_run.execute(s_run.load(code, optimize), engine=engine))
+    return [attempt(index, lambda: job(code)) for index, code in chunk]
+
+
+def fan_out(func: Callable[[list], list[Result]], items: Iterable[Any], init: Callable, initargs: tuple,
+            workers: int | None = None, chunksize: int = 16, max_pending: int | None = None) -> Iterator[Result]:
+    """把 items 按块分给进程池，按原顺序逐个产出结果
+
+    同时在途的块不超过 max_pending（默认每个进程两块），输入可以是很长的迭代器而内存占用不变。
+    workers 为 0 时在当前进程中依次执行。"""
+    indexed = enumerate(items)
+    chunks = iter(lambda: list(islice(indexed, chunksize)), [])
+    if workers == 0:
+        init(*initargs)
+        for chunk in chunks:
+            yield from func(chunk)
+        return
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    with multiprocessing.Pool(workers, init, initargs) as pool:
+        pending: deque = deque()
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(func, (chunk,)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def run_batch(batch: Batch, inputs: Iterable[dict[str, Any] | str], engine: str = "tree",
+              **options) -> Iterator[Result]:
+    """以每组输入执行同一个程序；检查过的程序只序列化一次，各工作进程启动时接收
+
+    每组输入是参数名到值的字典，或者一行表示这样的对象的 JSON。"""
+    data = pickle.dumps(batch, pickle.HIGHEST_PROTOCOL)
+    return fan_out(run_inputs, inputs, init_batch,
+                   (data, engine, Function.jit_threshold, Function.memo_size), **options)
+
+
+def run_programs(sources: Iterable[str], engine: str = "tree", optimize: bool = False,
+                 **options) -> Iterator[Result]:
+    """在工作进程中分别解析、检查并执行每个程序，默认每块一个程序"""
+    options.setdefault("chunksize", 1)
+    return fan_out(run_sources, sources, init_sources,
+                   (engine, optimize, Function.jit_threshold, Function.memo_size), **options)
+
+
+def jsonable(val: Any) -> Any:
+    if isinstance(val, array):
+        return list(val)
+    if isinstance(val, Rope):
+        return str(val)
+    raise TypeError(f"'{type(val).__name__}' is not JSON serializable.")
+
+
+def parse_param(text: str) -> tuple[str, Type]:
+    name, sep, tp = text.partition(":")
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME:TYPE, got '{text}'.")
+    try:
+        return name.strip(), Parser(FastLexer(tp)).parse_type()
+    except SException as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main(argv: list[str] | None = None):
+    argparser = argparse.ArgumentParser(description="run Static programs in parallel.")
+    argparser.add_argument("files", nargs="+",
+                           help="programs to run; with --inputs, the single program to run per input.")
+    argparser.add_argument("--inputs", metavar="FILE",
+                           help="JSON lines, each an object of values for the --param globals.")
+    argparser.add_argument("--param", type=parse_param, action="append", default=[], metavar="NAME:TYPE",
+                           help="a global variable given by the inputs.")
+    argparser.add_argument("--output", action="append", metavar="NAME",
+                           help="a global variable to report, all by default.")
+    argparser.add_argument("--engine", choices=list(s_run.engines), default="tree")
+    argparser.add_argument("-O", "--optimize", action="store_true")
+    argparser.add_argument("--workers", type=int, default=None,
+                           help="worker processes, the CPU count by default, 0 runs in this process.")
+    argparser.add_argument("--chunksize", type=int, default=None,
+                           help="jobs sent to a worker at a time.")
+    args = argparser.parse_args(argv)
+    options: dict[str, Any] = {"workers": args.workers}
+    if args.chunksize:
+        options["chunksize"] = args.chunksize
+
+    if args.inputs is not None:
+        if len(args.files) != 1:
+            argparser.error("--inputs takes exactly one program.")
+        with open(args.files[0], encoding="utf-8") as f:
+            code = f.read()
+        try:
+            batch = Batch(code, dict(args.param), args.output, args.optimize)
+        except SException as e:
+            print(f"{type(e).__name__}: {e}", file=sys.stderr)
+            sys.exit(1)
+        with open(args.inputs, encoding="utf-8") as f:
+            lines = (line for line in f if line.strip())
+            results = run_batch(batch, lines, args.engine, **options)
+            for res in results:
+                print(json.dumps({"index": res.index, "values": res.values} if res.ok else
+                                 {"index": res.index, "error": res.error}, default=jsonable))
+    else:
+        def sources() -> Iterator[str]:
+            for path in args.files:
+                with open(path, encoding="utf-8") as f:
+                    yield f.read()
+        for res in run_programs(sources(), args.engine, args.optimize, **options):
+            path = args.files[res.index]
+            print(json.dumps({"file": path, "values": res.values} if res.ok else
+                             {"file": path, "error": res.error}, default=jsonable))
+
+
+if __name__ == "__main__":
+    main()
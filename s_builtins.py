@@ -0,0 +1,221 @@
+from typing import Any, Callable
+from array import array
+import operator
+from s_error import SValueError
+from s_type import Type, AnyType, IntType, FloatType, BoolType, ListType, FunctionType, OverloadType, BoolArray
+import s_ast as ast
+
+# NumPy 可选：安装了就把整个 list 的运算交给它一次完成，否则逐元素计算
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+IntList, FloatList, BoolList = ListType(IntType), ListType(FloatType), ListType(BoolType)
+
+# 内置函数名到 (类型, 实现)，有多个签名的类型为 OverloadType
+builtins: dict[str, tuple[Type, Callable]] = {}
+
+
+def builtin(name: str, *signatures: Type):
+    def register(impl: Callable) -> Callable:
+        tp = signatures[0] if len(signatures) == 1 else OverloadType(signatures)
+        builtins[name] = (tp, impl)
+        return impl
+    return register
+
+
+def overloads(*signatures: tuple[Type, list[Type]]) -> list[Type]:
+    """由 (返回类型, 参数类型) 构造各个签名"""
+    return [FunctionType(ret, params) for ret, params in signatures]
+
+
+def to_numpy(val: Any) -> Any:
+    """紧凑存储的 list 不复制地转换为 ndarray"""
+    if isinstance(val, BoolArray):
+        return np.frombuffer(val, np.uint8).view(np.bool_)
+    if isinstance(val, array):
+        return np.frombuffer(val, np.int64 if val.typecode == "q" else np.float64)
+    return np.asarray(val)
+
+
+def from_numpy(res: Any) -> Any:
+    """把 ndarray 结果转换回对应的紧凑存储"""
+    if res.dtype == np.bool_:
+        return BoolArray(res.astype(np.uint8).tobytes())
+    if res.dtype.kind in "iu":
+        return array("q", res.astype(np.int64, copy=False).tobytes())
+    return array("d", res.astype(np.float64, copy=False).tobytes())
+
+
+# NumPy 的 int64 运算溢出时静默回绕，纯 Python 实现则得到精确的结果（结果为 list<int> 时报错）。
+# 由元素的最大绝对值估计结果的上界，可能超出这个界时改用纯 Python 实现，两种后端的结果总是相同。
+int64_bound = 2.0 ** 62
+
+
+def peak(x: Any) -> float:
+    """ndarray 中最大的绝对值，按 float 计算以免自身溢出"""
+    return max(-float(x.min()), float(x.max())) if len(x) else 0.0
+
+
+def same_length(a: Any, b: Any):
+    if len(a) != len(b):
+        raise SValueError(f"lists of different lengths {len(a)} and {len(b)}.")
+
+
+def make_like(a: Any, values: Any) -> Any:
+    """与 a 同类型的紧凑存储的 list，超出 int64 范围时报错"""
+    return (IntList if a.typecode == "q" else FloatList).make(values)
+
+
+def not_empty(a: Any):
+    if not len(a):
+        raise SValueError("empty list.")
+
+
+def not_negative(n: int):
+    if n < 0:
+        raise SValueError(f"negative list length {n}.")
+
+
+@builtin("zeros", FunctionType(IntList, [IntType]))
+def zeros(n: int) -> Any:
+    not_negative(n)
+    return IntList.new(n)
+
+
+@builtin("fzeros", FunctionType(FloatList, [IntType]))
+def fzeros(n: int) -> Any:
+    not_negative(n)
+    return FloatList.new(n)
+
+
+@builtin("arange", FunctionType(IntList, [IntType]))
+def arange(n: int) -> Any:
+    not_negative(n)
+    if np is not None:
+        return from_numpy(np.arange(n, dtype=np.int64))
+    return array("q", range(n))
+
+
+@builtin("len", FunctionType(IntType, [ListType(AnyType)]))
+def length(a: Any) -> int:
+    """任意元素类型的 list 的长度"""
+    return len(a)
+
+
+@builtin("sum", *overloads((IntType, [IntList]), (FloatType, [FloatList])))
+def total(a: Any) -> Any:
+    if np is not None:
+        x = to_numpy(a)
+        if x.dtype.kind == "f" or len(x) * peak(x) < int64_bound:
+            return x.sum().item()
+    return sum(a)
+
+
+@builtin("dot", *overloads((IntType, [IntList, IntList]), (FloatType, [FloatList, FloatList])))
+def dot(a: Any, b: Any) -> Any:
+    same_length(a, b)
+    if np is not None:
+        x, y = to_numpy(a), to_numpy(b)
+        if x.dtype.kind == "f" or len(x) * peak(x) * peak(y) < int64_bound:
+            return np.dot(x, y).item()
+    return sum(map(operator.mul, a, b))
+
+
+@builtin("add", *overloads((IntList, [IntList, IntList]), (FloatList, [FloatList, FloatList])))
+def add(a: Any, b: Any) -> Any:
+    same_length(a, b)
+    if np is not None:
+        x, y = to_numpy(a), to_numpy(b)
+        if x.dtype.kind == "f" or peak(x) + peak(y) < int64_bound:
+            return from_numpy(x + y)
+    return make_like(a, map(operator.add, a, b))
+
+
+@builtin("mul", *overloads((IntList, [IntList, IntList]), (FloatList, [FloatList, FloatList])))
+def mul(a: Any, b: Any) -> Any:
+    same_length(a, b)
+    if np is not None:
+        x, y = to_numpy(a), to_numpy(b)
+        if x.dtype.kind == "f" or peak(x) * peak(y) < int64_bound:
+            return from_numpy(x * y)
+    return make_like(a, map(operator.mul, a, b))
+
+
+@builtin("map_scale", *overloads((IntList, [IntList, IntType]), (FloatList, [FloatList, FloatType])))
+def map_scale(a: Any, k: Any) -> Any:
+    if np is not None:
+        x = to_numpy(a)
+        if x.dtype.kind == "f" or peak(x) * abs(k) < int64_bound:
+            return from_numpy(x * k)
+    return make_like(a, [x * k for x in a])
+
+
+@builtin("argmax", *overloads((IntType, [IntList]), (IntType, [FloatList])))
+def argmax(a: Any) -> int:
+    not_empty(a)
+    if np is not None:
+        return int(np.argmax(to_numpy(a)))
+    return a.index(max(a))
+
+
+@builtin("max", *overloads((IntType, [IntList]), (FloatType, [FloatList])))
+def maximum(a: Any) -> Any:
+    not_empty(a)
+    if np is not None:
+        return to_numpy(a).max().item()
+    return max(a)
+
+
+@builtin("min", *overloads((IntType, [IntList]), (FloatType, [FloatList])))
+def minimum(a: Any) -> Any:
+    not_empty(a)
+    if np is not None:
+        return to_numpy(a).min().item()
+    return min(a)
+
+
+@builtin("sort", *overloads((IntList, [IntList]), (FloatList, [FloatList])))
+def sort(a: Any) -> Any:
+    """返回排好序的新 list，不修改参数"""
+    if np is not None:
+        return from_numpy(np.sort(to_numpy(a)))
+    return array(a.typecode, sorted(a))
+
+
+@builtin("less", *overloads((BoolList, [IntList, IntList]), (BoolList, [FloatList, FloatList])))
+def less(a: Any, b: Any) -> Any:
+    same_length(a, b)
+    if np is not None:
+        return from_numpy(to_numpy(a) < to_numpy(b))
+    return BoolArray(map(operator.lt, a, b))
+
+
+@builtin("greater", *overloads((BoolList, [IntList, IntList]), (BoolList, [FloatList, FloatList])))
+def greater(a: Any, b: Any) -> Any:
+    same_length(a, b)
+    if np is not None:
+        return from_numpy(to_numpy(a) > to_numpy(b))
+    return BoolArray(map(operator.gt, a, b))
+
+
+@builtin("count", FunctionType(IntType, [BoolList]))
+def count(a: Any) -> int:
+    if np is not None:
+        return int(np.count_nonzero(to_numpy(a)))
+    return sum(a)
+
+
+# 内置作用域的槽位映射，检查和运行时的全局作用域都以内置作用域为父作用域，变量的地址一致
+names = {name: slot for slot, name in enumerate(builtins)}
+
+
+def new_check_scope() -> ast.Scope:
+    """新的全局作用域，用于检查，内置函数在其父作用域中"""
+    return ast.Scope(ast.Scope(None, names, [tp for tp, _ in builtins.values()]))
+
+
+def new_run_scope() -> ast.Scope:
+    """新的全局作用域，用于运行"""
+    return ast.Scope(ast.Scope(None, names, [impl for _, impl in builtins.values()]))
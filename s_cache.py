@@ -0,0 +1,103 @@
+from typing import Any
+import gc
+import glob
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+# 缓存文件格式变化时递增
+CACHE_FORMAT = 1
+MAGIC = b"SAST"
+
+
+def interpreter_version() -> str:
+    """解释器自身的版本：缓存格式、Python 版本和各模块源码的哈希，任一变化都会使缓存失效"""
+    digest = hashlib.sha256(f"{CACHE_FORMAT}:{sys.version}".encode())
+    root = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(root, "s_*.py"))):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+_version: str | None = None
+
+
+def cache_key(code: str, optimize: bool = False) -> str:
+    global _version
+    if _version is None:
+        _version = interpreter_version()
+    digest = hashlib.sha256(_version.encode())
+    digest.update(b"O" if optimize else b"-")
+    digest.update(code.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key[:2], key + ".sast")
+
+
+def trusted(st: os.stat_result) -> bool:
+    """当前用户所有且其他用户不能写入"""
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def read(path: str, key: str) -> Any:
+    """读取缓存的程序，不存在、损坏或键不符时返回 None
+
+    缓存文件会被反序列化，能写入缓存文件的人就能执行任意代码。
+    文件或所在目录不属于当前用户、或者其他用户可以写入时不加载。"""
+    try:
+        with open(path, "rb") as f:
+            if hasattr(os, "getuid") and not (trusted(os.fstat(f.fileno())) and
+                                              trusted(os.stat(os.path.dirname(path)))):
+                return None
+            data = f.read()
+    except OSError:
+        return None
+    header = MAGIC + key.encode()
+    if not data.startswith(header):
+        return None
+    # 反序列化会一次创建大量对象，期间关闭 GC 避免反复触发无用的回收
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(memoryview(data)[len(header):])
+    except Exception:
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def write(path: str, key: str, program: Any) -> bool:
+    """先写入同目录下的临时文件再原子地替换，并发的进程不会读到写了一半的文件"""
+    try:
+        data = pickle.dumps(program, pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        # 嵌套过深的程序无法序列化，不缓存
+        return False
+    directory = os.path.dirname(path)
+    try:
+        # 目录只允许当前用户写入，否则 read 不会信任其中的文件
+        os.makedirs(directory, 0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(MAGIC + key.encode())
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError:
+        return False
+    return True
+
+
+def default_dir() -> str:
+    """STATIC_CACHE_DIR 不应指向其他用户可以写入的目录，见 read"""
+    return os.environ.get("STATIC_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "static")
@@ -0,0 +1,314 @@
+from typing import Any, Callable
+from s_data import TokenType, unary_ops
+import s_ast as ast
+from s_ast import RunSignal, BREAK, CONTINUE, RETURN
+from s_type import Function, Memoized, Type, call_entry, out_of_range
+
+Eval = Callable[[ast.Scope], Any]
+Run = Callable[[ast.Scope], RunSignal | None]
+
+
+class ClosureFunction(Function):
+    def __init__(self, params: list[str], param_types: list[Type], ret_type: Type, body: ast.Block, closure: ast.Scope, code: Run):
+        super().__init__(params, param_types, ret_type, body, closure)
+        self.code = code
+        self.names = dict(zip(params, range(len(params))))
+
+    def call(self, slots: list) -> Any:
+        new_scope = ast.Scope(self.closure, self.names.copy(), slots)
+        if self.code(new_scope) is RETURN:
+            ret, RETURN.ret_val = RETURN.ret_val, None
+            return ret
+        return None
+
+
+class MemoClosureFunction(Memoized, ClosureFunction):
+    pass
+
+
+def compile_const(node: ast.Const) -> Eval:
+    val = node.val
+    return lambda scope: val
+
+
+def compile_variable(node: ast.Variable) -> Eval:
+    # 按 check 解析出的地址访问，与树遍历解释器一致；未检查过的节点按名字查找
+    name, depth, slot = node.name, node.depth, node.slot
+    if slot < 0:
+        return lambda scope: scope.find(name)
+    if depth == 0:
+        return lambda scope: scope.slots[slot]
+    if depth == 1:
+        return lambda scope: scope.parent.slots[slot]  # type: ignore
+
+    def load(scope: ast.Scope) -> Any:
+        for _ in range(depth):
+            scope = scope.parent  # type: ignore
+        return scope.slots[slot]
+    return load
+
+
+def compile_binary(node: ast.Binary) -> Eval:
+    left, right = compile_expr(node.left), compile_expr(node.right)
+    if node.op == TokenType.AND:
+        if isinstance(node, ast.BoolAndOp):
+            return lambda scope: right(scope) if left(scope) else False
+        return lambda scope: bool(right(scope)) if left(scope) else False
+    if node.op == TokenType.OR:
+        if isinstance(node, ast.BoolOrOp):
+            return lambda scope: True if left(scope) else right(scope)
+        return lambda scope: True if left(scope) else bool(right(scope))
+    op = ast.binary_func(node)
+    # 常量操作数直接捕获其值，省去一次调用
+    if isinstance(node.right, ast.Const):
+        rval = node.right.val
+        return lambda scope: op(left(scope), rval)
+    if isinstance(node.left, ast.Const):
+        lval = node.left.val
+        return lambda scope: op(lval, right(scope))
+    return lambda scope: op(left(scope), right(scope))
+
+
+def compile_unary(node: ast.Unary) -> Eval:
+    op, val = unary_ops[node.op], compile_expr(node.val)
+    return lambda scope: op(val(scope))
+
+
+def compile_index(node: ast.IndexOp) -> Eval:
+    base, index = compile_expr(node.base), compile_expr(node.index)
+    return lambda scope: base(scope)[index(scope)]
+
+
+def compile_call(node: ast.Call) -> Eval:
+    func = compile_expr(node.func)
+    args = list(map(compile_expr, node.args))
+    # 内联缓存：上次调用的函数及其快速调用入口，按参数个数展开实参求值
+    callee = invoke = None
+    if len(args) == 1:
+        a, = args
+
+        def call1(scope: ast.Scope) -> Any:
+            nonlocal callee, invoke
+            f = func(scope)
+            if f is not callee:
+                callee, invoke = f, call_entry(f)
+            return invoke([a(scope)])
+        return call1
+    if len(args) == 2:
+        a, b = args
+
+        def call2(scope: ast.Scope) -> Any:
+            nonlocal callee, invoke
+            f = func(scope)
+            if f is not callee:
+                callee, invoke = f, call_entry(f)
+            return invoke([a(scope), b(scope)])
+        return call2
+
+    def call(scope: ast.Scope) -> Any:
+        nonlocal callee, invoke
+        f = func(scope)
+        if f is not callee:
+            callee, invoke = f, call_entry(f)
+        return invoke([arg(scope) for arg in args])
+    return call
+
+
+def compile_block(node: ast.Block, new_scope: bool = False) -> Run:
+    stmts = list(map(compile_stmt, node.stmts))
+    if len(stmts) == 1:
+        run, = stmts
+    else:
+        def run(scope: ast.Scope) -> RunSignal | None:
+            for stmt in stmts:
+                ret = stmt(scope)
+                if ret is not None:
+                    return ret
+    if new_scope and node.has_bindings():
+        inner = run
+        return lambda scope: inner(ast.Scope(scope))
+    return run
+
+
+def compile_noop(node: ast.NoOp) -> Run:
+    return lambda scope: None
+
+
+def compile_expr_stmt(node: ast.ExprStmt) -> Run:
+    expr = compile_expr(node.expr)
+
+    def run(scope: ast.Scope) -> None:
+        expr(scope)
+    return run
+
+
+def compile_if(node: ast.IfStmt) -> Run:
+    cases = [(compile_expr(cond), compile_block(body, True))
+             for cond, body in node.cases]
+    else_block = compile_block(node.else_block, True)
+    if len(cases) == 1:
+        (cond, body), = cases
+        return lambda scope: body(scope) if cond(scope) else else_block(scope)
+
+    def run(scope: ast.Scope) -> RunSignal | None:
+        for cond, body in cases:
+            if cond(scope):
+                return body(scope)
+        return else_block(scope)
+    return run
+
+
+def compile_while(node: ast.WhileStmt) -> Run:
+    cond, body = compile_expr(node.cond), compile_block(node.body, True)
+
+    def run(scope: ast.Scope) -> RunSignal | None:
+        while cond(scope):
+            ret = body(scope)
+            if ret is not None:
+                if ret is BREAK:
+                    break
+                if ret is RETURN:
+                    return ret
+    return run
+
+
+def compile_range(node: ast.RangeStmt) -> Run:
+    loop, stop = compile_while(node.loop), compile_expr(node.stop)
+    body = compile_block(node.body, True)
+    depth, slot, step, inclusive = node.var.depth, node.var.slot, node.step, node.inclusive
+
+    def run(scope: ast.Scope) -> RunSignal | None:
+        owner = scope
+        for _ in range(depth):
+            owner = owner.parent  # type: ignore
+        slots = owner.slots
+        start, end = slots[slot], stop(scope)
+        if type(start) is not int or type(end) is not int:
+            return loop(scope)
+        if inclusive:
+            end += 1
+        for i in range(start, end, step):
+            slots[slot] = i
+            ret = body(scope)
+            if ret is not None:
+                if ret is BREAK:
+                    return None
+                if ret is RETURN:
+                    return ret
+        else:
+            if start < end:
+                slots[slot] += step
+    return run
+
+
+def compile_return(node: ast.ReturnStmt) -> Run:
+    ret = compile_expr(node.ret)
+
+    def run(scope: ast.Scope) -> RunSignal:
+        RETURN.ret_val = ret(scope)
+        return RETURN
+    return run
+
+
+def compile_break(node: ast.BreakStmt) -> Run:
+    return lambda scope: BREAK
+
+
+def compile_continue(node: ast.ContinueStmt) -> Run:
+    return lambda scope: CONTINUE
+
+
+def compile_var_decl(node: ast.VarDecl) -> Run:
+    variables = [(name, compile_expr(val) if val else None)
+                 for name, tp, val in node.variables]
+
+    def run(scope: ast.Scope) -> None:
+        for name, val in variables:
+            scope.define(name, val(scope) if val else None)
+    return run
+
+
+def compile_assign(node: ast.Assign) -> Run:
+    right = compile_expr(node.right)
+    if isinstance(node.left, ast.Variable):
+        name, depth, slot = node.left.name, node.left.depth, node.left.slot
+        if slot < 0:
+            def run(scope: ast.Scope) -> None:
+                scope.set(name, right(scope))
+            return run
+
+        def store(scope: ast.Scope) -> None:
+            val = right(scope)
+            for _ in range(depth):
+                scope = scope.parent  # type: ignore
+            scope.slots[slot] = val
+        return store
+    base = compile_expr(node.left.base)  # type: ignore
+    index = compile_expr(node.left.index)  # type: ignore
+
+    def run(scope: ast.Scope) -> None:
+        val = right(scope)
+        try:
+            base(scope)[index(scope)] = val
+        except OverflowError:
+            raise out_of_range() from None
+    return run
+
+
+def compile_fn_def(node: ast.FnDef) -> Run:
+    body = compile_block(node.body)
+    name, params, param_types, ret_type = node.name, node.params, node.param_types, node.ret_type
+
+    def run(scope: ast.Scope) -> None:
+        cls = MemoClosureFunction if node.memoize and Function.memo_size else ClosureFunction
+        scope.define(name, cls(
+            params, param_types, ret_type, node.body, scope, body))
+    return run
+
+
+expr_compilers: dict[type, Callable[[Any], Eval]] = {
+    ast.Const: compile_const,
+    ast.Variable: compile_variable,
+    ast.Binary: compile_binary,
+    ast.Unary: compile_unary,
+    ast.IndexOp: compile_index,
+    ast.Call: compile_call,
+    **dict.fromkeys(ast.call_nodes.values(), compile_call),
+    **dict.fromkeys(ast.binary_nodes.values(), compile_binary),
+    # check 按类型和形状选出的特化节点
+    ast.LocalVariable: compile_variable,
+    ast.BoolAndOp: compile_binary,
+    ast.BoolOrOp: compile_binary,
+    ast.LocalConstOp: compile_binary,
+    ast.LocalLocalOp: compile_binary,
+    ast.StrAddOp: compile_binary,
+    ast.StrConcatOp: compile_binary,
+    ast.LocalIndexOp: compile_index,
+}
+stmt_compilers: dict[type, Callable[[Any], Run]] = {
+    ast.Block: compile_block,
+    ast.NoOp: compile_noop,
+    ast.ExprStmt: compile_expr_stmt,
+    ast.IfStmt: compile_if,
+    ast.WhileStmt: compile_while,
+    ast.RangeStmt: compile_range,
+    ast.ReturnStmt: compile_return,
+    ast.BreakStmt: compile_break,
+    ast.ContinueStmt: compile_continue,
+    ast.VarDecl: compile_var_decl,
+    ast.Assign: compile_assign,
+    ast.FnDef: compile_fn_def,
+}
+
+
+def compile_expr(node: ast.Expr) -> Eval:
+    return expr_compilers[type(node)](node)
+
+
+def compile_stmt(node: ast.Stmt) -> Run:
+    return stmt_compilers[type(node)](node)
+
+
+def compile_program(program: ast.Block) -> Run:
+    """把检查过的程序一次性转换为闭包，返回的 run(scope) 可反复执行"""
+    return compile_block(program)
@@ -1,4 +1,5 @@
 from enum import Enum, unique
+import operator
 
 
 @unique
@@ -9,7 +10,7 @@ class TokenType(Enum):
     SUB = 2
     MUL = 3
     DIV = 4
-    MOD = 30
+    MOD = 31
     EQ = 5
     NE = 6
     GT = 7
@@ -81,6 +82,7 @@ operators = [
     (',', TokenType.COMMA),
     (':', TokenType.COLON),
     (';', TokenType.SEMICOLON),
+    ('=', TokenType.ASSIGN),
 ]
 escape = {
     'r': '\r',
@@ -124,3 +126,27 @@ keywords = {
     "break": TokenType.BREAK,
     "continue": TokenType.CONTINUE,
 }
+binary_ops = {
+    TokenType.ADD: operator.add,
+    TokenType.SUB: operator.sub,
+    TokenType.MUL: operator.mul,
+    TokenType.DIV: operator.truediv,
+    TokenType.MOD: operator.mod,
+    TokenType.EQ: operator.eq,
+    TokenType.NE: operator.ne,
+    TokenType.GT: operator.gt,
+    TokenType.LT: operator.lt,
+    TokenType.GE: operator.ge,
+    TokenType.LE: operator.le,
+    TokenType.LSH: operator.lshift,
+    TokenType.RSH: operator.rshift,
+    TokenType.BITAND: operator.and_,
+    TokenType.BITOR: operator.or_,
+    TokenType.XOR: operator.xor,
+}
+unary_ops = {
+    TokenType.ADD: operator.pos,
+    TokenType.SUB: operator.neg,
+    TokenType.NOT: operator.not_,
+    TokenType.INV: operator.invert,
+}
@@ -12,3 +12,7 @@ class SNameError(SException):
 
 class STypeError(SException):
     """类型错误"""
+
+
+class SValueError(SException):
+    """参数的值不合法"""
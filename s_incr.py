@@ -0,0 +1,253 @@
+from typing import Any
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+from itertools import islice
+from s_lex import FastLexer, LazyToken, LineMap
+from s_parse import Parser
+from s_error import SException
+import s_ast as ast
+import s_builtins
+from s_data import TokenType
+
+
+class TextLines(LineMap):
+    """不预先扫描全部换行，每次编辑后的源码通常只需要一两个位置"""
+
+    def position(self, offset: int) -> tuple[int, int]:
+        code = self.code
+        return code.count("\n", 0, offset), offset - (code.rfind("\n", 0, offset) + 1)
+
+
+class WindowLexer(FastLexer):
+    """从任意 Token 边界开始分析，并记录当前 Token 的起点和上一个 Token 的终点"""
+
+    def __init__(self, code: str, pos: int = 0):
+        super().__init__(code)
+        self.lines = TextLines(code)
+        self.pos = pos
+        self.start = self.end = self.prev_end = pos
+
+    def next(self) -> LazyToken:
+        tp, start, end, val = self.scan()
+        self.prev_end, self.start, self.end = self.end, start, end
+        return LazyToken(self.lines, end, tp, val, start)
+
+
+class Segment:
+    """一条顶层语句及其在源码中的范围 [start, end)，以及上次检查的结果"""
+
+    def __init__(self, start: int, end: int, stmt: ast.Stmt):
+        self.start, self.end, self.stmt = start, end, stmt
+        if isinstance(stmt, ast.VarDecl):
+            self.defined = list(dict.fromkeys(name for name, _, _ in stmt.variables))
+        elif isinstance(stmt, ast.FnDef):
+            self.defined = [stmt.name]
+        else:
+            self.defined = []
+        # 引用和定义的名字，包括局部变量，多算只会导致多余的重新检查
+        self.used = sorted({node.name for node in ast.walk(stmt) if isinstance(node, ast.Variable)}
+                           | set(self.defined))
+        self.names = frozenset(self.used)
+        # 检查时所见的全局作用域，以及检查后定义的 (名字, 类型)
+        self.signature: tuple | None = None
+        # 上次检查时之前已有的全局变量数
+        self.slots_before = -1
+        self.defs: list[tuple[str, Any]] = []
+        self.error: SException | None = None
+        # 撤销本语句的定义所需的信息：被覆盖的 (槽位, 旧值) 和新增的名字
+        self.overwritten: list[tuple[int, Any]] = []
+        self.added: list[str] = []
+
+    def environment(self, scope: ast.Scope) -> tuple:
+        """语句依赖的全局变量的槽位和类型；类型经过驻留，按对象比较即可"""
+        names, slots = scope.names, scope.slots
+        sig = []
+        for name in self.used:
+            slot = names.get(name)
+            if slot is not None:
+                sig.append((slot, slots[slot]))
+            elif name in self.defined:
+                # 新定义的名字的槽位取决于之前定义了多少全局变量
+                sig.append(len(slots))
+            else:
+                sig.append(None)
+        return tuple(sig)
+
+    def replay(self, scope: ast.Scope):
+        names, slots = scope.names, scope.slots
+        self.overwritten, self.added = [], []
+        for name, tp in self.defs:
+            slot = names.get(name)
+            if slot is None:
+                self.added.append(name)
+                names[name] = len(slots)
+                slots.append(tp)
+            else:
+                self.overwritten.append((slot, slots[slot]))
+                slots[slot] = tp
+
+    def recheck(self, scope: ast.Scope):
+        """重新检查语句，记录其定义的结果"""
+        names, slots = scope.names, scope.slots
+        before = {name: slots[names[name]] for name in self.defined if name in names}
+        self.error = None
+        try:
+            self.stmt.check(scope)
+        except SException as e:
+            self.error = e
+        # 只记录确实生效的定义，出错时可能只定义了一部分；
+        # 重放时这些名字的环境与检查时相同，值未变的定义无需重放
+        self.defs = [(name, slots[names[name]]) for name in self.defined
+                     if name in names and (name not in before or slots[names[name]] is not before[name])]
+        self.overwritten = [(names[name], val) for name, val in before.items()]
+        self.added = [name for name in self.defined if name in names and name not in before]
+
+
+class Document:
+    """编辑器中的一份源码，每次编辑只重新分析受影响的顶层语句，只重新检查依赖变化的语句
+
+    偏移量都以字符计。存在语法错误时 dirty 记录需要重新分析的范围，
+    在之后的编辑中与编辑范围合并，直到能重新解析。"""
+
+    # 撤销并重放一条语句的开销约为复制一个全局变量的多少倍，用于选择编辑后更新全局作用域的方式
+    replay_cost = 32
+
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.segments: list[Segment] = []
+        self.syntax_error: SException | None = None
+        self.dirty: tuple[int, int] | None = None
+        # 依次执行完所有语句的定义后的全局作用域
+        self.scope = s_builtins.new_check_scope()
+        # 统计最近一次更新重新解析和重新检查的语句数
+        self.parsed = self.checked = 0
+        self.reparse(0, len(text), 0)
+
+    @property
+    def program(self) -> ast.Block:
+        return ast.Block([seg.stmt for seg in self.segments])
+
+    @property
+    def errors(self) -> list[SException]:
+        errors = [seg.error for seg in self.segments if seg.error is not None]
+        return errors if self.syntax_error is None else [self.syntax_error, *errors]
+
+    def edit(self, start: int, end: int, text: str):
+        """把 [start, end) 替换为 text"""
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"invalid edit range [{start}, {end}).")
+        self.text = self.text[:start] + text + self.text[end:]
+        delta = len(text) - (end - start)
+        if self.dirty is not None:
+            # 上次未能解析的范围与本次编辑合并
+            start, end = min(start, self.dirty[0]), max(end, self.dirty[1])
+        self.reparse(start, end, delta)
+
+    def reparse(self, low: int, high: int, delta: int):
+        """重新解析旧源码中 [low, high) 所在的语句；high 之后的旧语句偏移 delta 后复用"""
+        segments = self.segments
+        # 与受影响范围相接的语句也要重新解析，编辑可能与其首尾的 Token 连在一起
+        i = bisect_left(segments, low, key=attrgetter("end"))
+        j = max(i, bisect_right(segments, high, key=attrgetter("start")))
+        pos = segments[i - 1].end if i else 0
+        later = segments[j:]
+        for seg in later:
+            seg.start += delta
+            seg.end += delta
+        limit = high + delta
+        parsed: list[Segment] = []
+        k = 0
+        lexer = WindowLexer(self.text, pos)
+        try:
+            parser = Parser(lexer)  # type: ignore
+            while True:
+                if lexer.start >= limit:
+                    while k < len(later) and later[k].start < lexer.start:
+                        k += 1
+                    # 与旧的语句边界重合，之后的源码未变，直接复用
+                    if k < len(later) and later[k].start == lexer.start:
+                        break
+                if parser.token.tp == TokenType.EOF:
+                    k = len(later)
+                    break
+                begin = lexer.start
+                stmt = parser.parse_stmt()
+                parsed.append(Segment(begin, lexer.prev_end, stmt))
+        except SException as e:
+            # 受影响范围内仍使用上次解析成功的语句，定义都不变，无需重新检查；
+            # 否则输入过程中依赖它们的语句会反复报错又恢复
+            self.syntax_error = e
+            self.dirty = (pos, limit)
+            for seg in segments[i:j]:
+                seg.start = seg.end = pos
+            self.parsed = self.checked = 0
+            return
+        self.syntax_error, self.dirty = None, None
+        # 被替换的旧语句和新解析的语句定义的名字，其取值可能与上次不同
+        old, following = segments[i:j + k], later[k:]
+        changed = {name for seg in old + parsed for name in seg.defined}
+        self.segments = segments[:i] + parsed + following
+        self.parsed, self.checked = len(parsed), 0
+        before = segments[i].slots_before if i < len(segments) else len(self.scope.slots)
+        if len(following) * self.replay_cost < before:
+            # 之后的语句不多，撤销它们再重放比复制之前的全局变量更快
+            self.rewind(old + following)
+            self.recheck(parsed + following, self.scope, changed)
+            return
+        # 在受影响的语句之前的全局作用域中检查新解析的语句，不动之后的语句
+        names, slots = self.snapshot(before, old + following)
+        self.recheck(parsed, ast.Scope(self.scope.parent, names, slots), changed)
+        # 导出的全局变量与上次相同时，之后的语句所见的环境不变，无需重放
+        if following:
+            if len(slots) == following[0].slots_before and \
+                    (names, slots) == self.snapshot(len(slots), following):
+                return
+        elif names == self.scope.names and slots == self.scope.slots:
+            return
+        self.scope.names, self.scope.slots = names, slots
+        self.recheck(following, self.scope, changed)
+
+    def rewind(self, segments: list[Segment]):
+        """从后往前撤销这些语句的定义，它们须是最后的若干条语句"""
+        names, slots = self.scope.names, self.scope.slots
+        for seg in reversed(segments):
+            for slot, val in reversed(seg.overwritten):
+                slots[slot] = val
+            for name in seg.added:
+                del names[name]
+            del slots[seg.slots_before:]
+
+    def snapshot(self, before: int, following: list[Segment]) -> tuple[dict[str, int], list[Any]]:
+        """语句 following 执行前的全局变量，before 是此时的全局变量数
+
+        从最终的全局作用域撤销这些语句覆盖的值；名字按槽位的顺序加入，新增的都在 before 之后，截去即可。"""
+        slots = self.scope.slots[:]
+        for seg in reversed([seg for seg in following if seg.overwritten]):
+            for slot, val in reversed(seg.overwritten):
+                slots[slot] = val
+        del slots[before:]
+        return dict(islice(self.scope.names.items(), before)), slots
+
+    def recheck(self, segments: list[Segment], scope: ast.Scope, changed: set[str]):
+        """在 scope 中按顺序模拟各语句，所见环境未变的语句只重放其定义
+
+        changed 中是取值或槽位可能与上次不同的全局变量，
+        不引用它们且之前的全局变量数不变的语句无需比较环境。"""
+        slots = scope.slots
+        for seg in segments:
+            shifted = len(slots) != seg.slots_before
+            seg.slots_before = len(slots)
+            if shifted:
+                # 新定义的名字会分配到不同的槽位
+                changed.update(seg.defined)
+            elif seg.signature is not None and changed.isdisjoint(seg.names):
+                seg.replay(scope)
+                continue
+            sig = seg.environment(scope)
+            if sig == seg.signature:
+                seg.replay(scope)
+                continue
+            changed.update(seg.defined)
+            seg.signature = sig
+            seg.recheck(scope)
+            self.checked += 1
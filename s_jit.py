@@ -0,0 +1,225 @@
+from typing import Any, Callable
+from s_data import TokenType
+import s_ast as ast
+from s_type import StrType, concat, out_of_range
+
+binary_symbols = {
+    TokenType.ADD: "+",
+    TokenType.SUB: "-",
+    TokenType.MUL: "*",
+    TokenType.DIV: "/",
+    TokenType.MOD: "%",
+    TokenType.EQ: "==",
+    TokenType.NE: "!=",
+    TokenType.GT: ">",
+    TokenType.LT: "<",
+    TokenType.GE: ">=",
+    TokenType.LE: "<=",
+    TokenType.LSH: "<<",
+    TokenType.RSH: ">>",
+    TokenType.BITAND: "&",
+    TokenType.BITOR: "|",
+    TokenType.XOR: "^",
+}
+unary_symbols = {
+    TokenType.ADD: "+",
+    TokenType.SUB: "-",
+    TokenType.NOT: "not ",
+    TokenType.INV: "~",
+}
+
+
+class Unsupported(Exception):
+    """遇到无法翻译的结构，放弃编译并继续解释执行"""
+
+
+class Translator:
+    """把函数体翻译为 Python 源码，块作用域中的变量重命名为互不冲突的局部变量"""
+
+    def __init__(self):
+        self.lines: list[str] = []
+        self.scopes: list[dict[str, str]] = []
+        self.counter = 0
+        self.loops = 0
+        # 函数内运行时作用域的层数（函数帧及有自己作用域的块），以及用到的外层作用域距闭包的层数
+        self.frames = 0
+        self.outers: set[int] = set()
+
+    def declare(self, name: str) -> str:
+        self.counter += 1
+        # 优化器生成的临时变量名不是合法的 Python 标识符
+        local = f"v_{name}_{self.counter}" if name.isidentifier() else f"t_{self.counter}"
+        self.scopes[-1][name] = local
+        return local
+
+    def lookup(self, name: str) -> str | None:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def outer(self, var: "ast.Variable") -> str:
+        """函数之外的变量按 check 解析出的地址访问，与解释器一致；未检查过的按名字查找"""
+        if var.slot < 0:
+            return ""
+        depth = var.depth - self.frames
+        if depth < 0:
+            raise Unsupported(var.name)
+        self.outers.add(depth)
+        return f"_s{depth}.slots[{var.slot}]"
+
+    def line(self, indent: int, code: str):
+        self.lines.append("    " * indent + code)
+
+    def function(self, name: str, params: list[str], body: "ast.Block") -> str:
+        self.scopes.append({})
+        self.frames += 1
+        args = ", ".join(self.declare(param) for param in params)
+        self.line(1, f"def {name}({args}):")
+        self.block(body, 2, False)
+        self.line(2, "return None")
+        self.frames -= 1
+        self.scopes.pop()
+        return "\n".join(self.lines)
+
+    def block(self, block: "ast.Block", indent: int, new_scope: bool = True):
+        frame = new_scope and block.scoped
+        if new_scope:
+            self.scopes.append({})
+        self.frames += frame
+        for stmt in block.stmts:
+            self.stmt(stmt, indent)
+        if not block.stmts:
+            self.line(indent, "pass")
+        self.frames -= frame
+        if new_scope:
+            self.scopes.pop()
+
+    def stmt(self, stmt: "ast.Stmt", indent: int):
+        if isinstance(stmt, ast.ExprStmt):
+            self.line(indent, self.expr(stmt.expr))
+        elif isinstance(stmt, ast.Assign):
+            right = self.expr(stmt.right)
+            if isinstance(stmt.left, ast.Variable):
+                local = self.lookup(stmt.left.name) or self.outer(stmt.left)
+                if not local:
+                    self.line(indent, f"_set({stmt.left.name!r}, {right})")
+                else:
+                    self.line(indent, f"{local} = {right}")
+            elif isinstance(stmt.left, ast.IndexOp):
+                base, index = self.expr(
+                    stmt.left.base), self.expr(stmt.left.index)
+                self.line(indent, "try:")
+                self.line(indent + 1, f"{base}[{index}] = {right}")
+                self.line(indent, "except OverflowError:")
+                self.line(indent + 1, "raise _out_of_range() from None")
+        elif isinstance(stmt, ast.VarDecl):
+            for name, tp, val in stmt.variables:
+                # 初值在声明生效前求值，其中同名变量仍指向外层
+                val = self.expr(val) if val else "None"
+                self.line(indent, f"{self.declare(name)} = {val}")
+        elif isinstance(stmt, ast.IfStmt):
+            if not stmt.cases:
+                # 优化后只剩需要独立作用域的 else 块
+                self.line(indent, "if True:")
+                self.block(stmt.else_block, indent + 1)
+                return
+            keyword = "if"
+            for cond, body in stmt.cases:
+                self.line(indent, f"{keyword} {self.cond(cond)}:")
+                self.block(body, indent + 1)
+                keyword = "elif"
+            if stmt.else_block.stmts:
+                self.line(indent, "else:")
+                self.block(stmt.else_block, indent + 1)
+        elif isinstance(stmt, ast.WhileStmt):
+            self.line(indent, f"while {self.cond(stmt.cond)}:")
+            self.loops += 1
+            self.block(stmt.body, indent + 1)
+            self.loops -= 1
+        elif isinstance(stmt, ast.RangeStmt):
+            local = self.lookup(stmt.var.name)
+            if local is None:
+                self.stmt(stmt.loop, indent)
+                return
+            self.counter += 1
+            stop = f"_stop_{self.counter}"
+            self.line(indent, f"{stop} = {self.expr(stmt.stop)}")
+            self.line(indent, f"if type({local}) is int and type({stop}) is int:")
+            if stmt.inclusive:
+                self.line(indent + 1, f"{stop} += 1")
+            self.line(indent + 1, f"if {local} < {stop}:")
+            self.line(indent + 2, f"for {local} in range({local}, {stop}, {stmt.step}):")
+            self.loops += 1
+            self.block(stmt.body, indent + 3)
+            self.loops -= 1
+            self.line(indent + 2, "else:")
+            self.line(indent + 3, f"{local} += {stmt.step}")
+            self.line(indent, "else:")
+            self.stmt(stmt.loop, indent + 1)
+        elif isinstance(stmt, ast.ReturnStmt):
+            self.line(indent, f"return {self.expr(stmt.ret)}")
+        elif isinstance(stmt, ast.BreakStmt):
+            self.line(indent, "break" if self.loops else "return None")
+        elif isinstance(stmt, ast.ContinueStmt):
+            self.line(indent, "continue" if self.loops else "return None")
+        elif isinstance(stmt, ast.NoOp):
+            self.line(indent, "pass")
+        else:
+            raise Unsupported(type(stmt).__name__)
+
+    def cond(self, expr: "ast.Expr") -> str:
+        # 条件只关心真假，无需把 && / || 的结果转换为 bool
+        if isinstance(expr, ast.Binary) and expr.op in (TokenType.AND, TokenType.OR):
+            op = "and" if expr.op == TokenType.AND else "or"
+            return f"({self.cond(expr.left)} {op} {self.cond(expr.right)})"
+        return self.expr(expr)
+
+    def expr(self, expr: "ast.Expr") -> str:
+        if isinstance(expr, ast.Const):
+            if not isinstance(expr.val, (bool, int, float, str, type(None))):
+                raise Unsupported(type(expr.val).__name__)
+            return repr(expr.val)
+        elif isinstance(expr, ast.Variable):
+            local = self.lookup(expr.name) or self.outer(expr)
+            return local or f"_find({expr.name!r})"
+        elif isinstance(expr, ast.Binary):
+            if expr.op in (TokenType.AND, TokenType.OR):
+                return f"bool{self.cond(expr)}"
+            left, right = self.expr(expr.left), self.expr(expr.right)
+            if expr.op == TokenType.ADD and expr.type == StrType:
+                return f"_concat({left}, {right})"
+            return f"({left} {binary_symbols[expr.op]} {right})"
+        elif isinstance(expr, ast.Unary):
+            return f"({unary_symbols[expr.op]}{self.expr(expr.val)})"
+        elif isinstance(expr, ast.IndexOp):
+            return f"{self.expr(expr.base)}[{self.expr(expr.index)}]"
+        elif isinstance(expr, ast.Call):
+            args = ", ".join(map(self.expr, expr.args))
+            return f"{self.expr(expr.func)}({args})"
+        raise Unsupported(type(expr).__name__)
+
+
+def translate(name: str, params: list[str], body: "ast.Block") -> str:
+    """生成工厂函数 _make(closure) 的源码，它返回编译好的函数"""
+    translator = Translator()
+    source = translator.function(name, params, body)
+    outers = "".join(f"    _s{depth} = _s{depth - 1}.parent\n" for depth in range(1, max(translator.outers, default=0) + 1))
+    return "def _make(_closure):\n" \
+        "    _find, _set = _closure.find, _closure.set\n" \
+        "    _s0 = _closure\n" \
+        f"{outers}" \
+        f"{source}\n" \
+        f"    return {name}\n"
+
+
+def compile_function(func: Any) -> Callable | None:
+    """把 Function 编译为原生 Python 函数，无法翻译时返回 None"""
+    name = "jit_function"
+    try:
+        source = translate(name, func.params, func.body)
+    except Unsupported:
+        return None
+    namespace: dict[str, Any] = {"_concat": concat, "_out_of_range": out_of_range}
+    exec(compile(source, f"<jit {name}>", "exec"), namespace)
+    return namespace["_make"](func.closure)
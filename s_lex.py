@@ -1,12 +1,21 @@
 from typing import Any
+from array import array
+from bisect import bisect_left
+import re
 from s_error import SSyntaxError
 from s_data import TokenType, operators, escape, keywords
 
 
 class Token:
+    __slots__ = ("ln", "col", "tp", "val")
+
     def __init__(self, ln: int, col: int, tp: TokenType, val: Any = None):
         self.ln, self.col, self.tp, self.val = ln, col, tp, val
 
+    def start(self) -> tuple[int, int]:
+        """Token 起点的行列号；Lexer 只记录了末尾的位置"""
+        return self.ln, self.col
+
 
 class CodeStream:
     def __init__(self, code: str):
@@ -32,7 +41,7 @@ class CodeStream:
                 break
 
     def cmp(self, pat: str, skip: bool = False):
-        if self.pos + len(pat) >= len(self.code):
+        if self.pos + len(pat) > len(self.code):
             return False
         for i in range(len(pat)):
             if pat[i] != self.code[self.pos + i]:
@@ -49,17 +58,19 @@ class Lexer:
         self.code = CodeStream(code)
 
     def skip(self):
-        while not self.code.eof() and (self.code.cur() in " \n\t" or self.code.cmp("//") or self.code.cmp("/*")):
+        while not self.code.eof():
             if self.code.cur() in " \n\t":
                 self.code.next()
             elif self.code.cmp("//"):
                 while not self.code.eof() and self.code.cur() != '\n':
                     self.code.next()
-            else:
-                self.code.next(2)
+            elif self.code.cmp("/*"):
                 while not self.code.cmp("*/"):
+                    if self.code.eof():
+                        raise SSyntaxError("unexpected EOF.")
                     self.code.next()
-                self.code.next(2)
+            else:
+                break
 
     def escape(self):
         if self.code.eof():
@@ -90,11 +101,7 @@ class Lexer:
             while not self.code.eof() and (self.code.cur().isdigit() or self.code.cur() == '.'):
                 num += self.code.cur()
                 self.code.next()
-            if num.count('.') == 1:
-                return Token(self.code.ln, self.code.col, TokenType.CONST, float(num))
-            if num.count('.') > 1:
-                raise SSyntaxError(f"wrong number '{num}'.")
-            return Token(self.code.ln, self.code.col, TokenType.CONST, int(num))
+            return Token(self.code.ln, self.code.col, TokenType.CONST, number(num))
         elif self.code.cur().isalpha():
             ident = ""
             while not self.code.eof() and (self.code.cur().isalnum() or self.code.cur() == '_'):
@@ -127,3 +134,229 @@ class Lexer:
                 if self.code.cmp(pat, True):
                     return Token(self.code.ln, self.code.col, res)
             raise SSyntaxError(f"unknown character '{self.code.cur()}'.")
+
+
+class LineMap:
+    """按需由偏移量计算行列号，换行位置只在第一次需要时扫描"""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.newlines: list[int] | None = None
+
+    def position(self, offset: int) -> tuple[int, int]:
+        if self.newlines is None:
+            self.newlines = [m.start() for m in re.finditer("\n", self.code)]
+        ln = bisect_left(self.newlines, offset)
+        return ln, offset - (self.newlines[ln - 1] + 1 if ln else 0)
+
+
+class LazyToken(Token):
+    """只记录偏移量的 Token，行列号在被访问时才计算"""
+    __slots__ = ("lines", "offset", "begin")
+
+    def __init__(self, lines: LineMap, offset: int, tp: TokenType, val: Any = None, begin: int | None = None):
+        self.lines, self.offset, self.tp, self.val = lines, offset, tp, val
+        self.begin = offset if begin is None else begin
+
+    def start(self) -> tuple[int, int]:
+        return self.lines.position(self.begin)
+
+    @property
+    def ln(self) -> int:
+        return self.lines.position(self.offset)[0]
+
+    @property
+    def col(self) -> int:
+        return self.lines.position(self.offset)[1]
+
+
+def number(num: str) -> int | float:
+    """数字 Token 的值；isdigit 为真的字符不都能转换，如上标数字"""
+    if num.count('.') > 1:
+        raise SSyntaxError(f"wrong number '{num}'.")
+    try:
+        return float(num) if '.' in num else int(num)
+    except ValueError:
+        raise SSyntaxError(f"wrong number '{num}'.") from None
+
+
+operator_types = dict(operators)
+skip_pattern = re.compile(r"(?:[ \n\t]+|//[^\n]*|/\*.*?\*/)*", re.S)
+token_pattern = re.compile("|".join([
+    # 只匹配 ASCII 开头的数字和名字，其他字符按 Lexer 的 isdigit/isalpha 判断；名字之后的 \w 与 isalnum 或 _ 一致
+    r"(?P<num>[0-9][0-9.]*)",
+    r"(?P<id>[A-Za-z]\w*)",
+    r'(?P<str>")',
+    "(?P<op>{})".format("|".join(
+        re.escape(pat) for pat in sorted(operator_types, key=len, reverse=True))),
+]))
+word_pattern = re.compile(r"\w*")
+string_pattern = re.compile(r'[^"\\]*')
+octal_pattern = re.compile(r"[0-7]+")
+const_words = {"True": True, "False": False, "None": None}
+
+
+class FastLexer:
+    """基于切片和正则的词法分析器，输出与 Lexer 完全相同的 Token 序列
+
+    Token 的行列号与 Lexer 一致，指向 Token 末尾之后的位置。"""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.pos = 0
+        self.lines = LineMap(code)
+
+    def next(self) -> Token:
+        tp, start, end, val = self.scan()
+        return LazyToken(self.lines, end, tp, val, start)
+
+    def scan(self) -> tuple[TokenType, int, int, Any]:
+        """分析下一个 Token，返回其类型、起止偏移量和值"""
+        code = self.code
+        pos = skip_pattern.match(code, self.pos).end()  # type: ignore
+        if pos >= len(code):
+            self.pos = pos
+            return TokenType.EOF, pos, pos, None
+        if code.startswith("/*", pos):
+            raise SSyntaxError("unexpected EOF.")
+        m = token_pattern.match(code, pos)
+        if m is None:
+            return self.unicode_token(pos)
+        kind, end = m.lastgroup, m.end()
+        self.pos = end
+        if kind == "op":
+            return operator_types[m.group()], pos, end, None
+        elif kind == "id":
+            ident = m.group()
+            if ident in keywords:
+                return keywords[ident], pos, end, None
+            elif ident in const_words:
+                return TokenType.CONST, pos, end, const_words[ident]
+            return TokenType.ID, pos, end, ident
+        elif kind == "num":
+            if end < len(code) and code[end].isdigit():
+                # 之后还有非 ASCII 的数字字符
+                end = self.digits(end)
+                return TokenType.CONST, pos, end, number(code[pos:end])
+            num = m.group()
+            if num.count('.') == 1:
+                return TokenType.CONST, pos, end, float(num)
+            if num.count('.') > 1:
+                raise SSyntaxError(f"wrong number '{num}'.")
+            return TokenType.CONST, pos, end, int(num)
+        end, val = self.string(end)
+        return TokenType.CONST, pos, end, val
+
+    def digits(self, pos: int) -> int:
+        """与 Lexer 一样，数字中可以有任何 isdigit 为真的字符"""
+        code = self.code
+        while pos < len(code) and (code[pos].isdigit() or code[pos] == '.'):
+            pos += 1
+        self.pos = pos
+        return pos
+
+    def unicode_token(self, pos: int) -> tuple[TokenType, int, int, Any]:
+        """以非 ASCII 字符开头的 Token"""
+        ch = self.code[pos]
+        if ch.isdigit():
+            end = self.digits(pos)
+            return TokenType.CONST, pos, end, number(self.code[pos:end])
+        if ch.isalpha():
+            end = self.pos = word_pattern.match(self.code, pos + 1).end()  # type: ignore
+            ident = self.code[pos:end]
+            # 关键字和 True/False/None 都是 ASCII 的
+            return TokenType.ID, pos, end, ident
+        raise SSyntaxError(f"unknown character '{ch}'.")
+
+    def string(self, pos: int) -> tuple[int, str]:
+        code = self.code
+        parts: list[str] = []
+        while True:
+            end = string_pattern.match(code, pos).end()  # type: ignore
+            parts.append(code[pos:end])
+            if end >= len(code):
+                raise SSyntaxError("unexpected EOF.")
+            if code[end] == '"':
+                self.pos = end + 1
+                return end + 1, "".join(parts)
+            pos = end + 1
+            if pos >= len(code):
+                raise SSyntaxError("unexpected EOF.")
+            if code[pos] in escape:
+                parts.append(escape[code[pos]])
+                pos += 1
+                continue
+            m = octal_pattern.match(code, pos)
+            if m is None:
+                raise SSyntaxError("unknown escape sequence at line {}, column {}.".format(
+                    *self.lines.position(pos)))
+            parts.append(chr(int(m.group(), 8)))
+            pos = m.end()
+
+
+token_types = {tp.value: tp for tp in TokenType}
+
+
+class TokenBuffer:
+    """一次分析完整个源码，Token 按列存放在 array 中，访问时才生成 Token 对象
+
+    可以像 Lexer 一样用 next() 逐个读取，也可以按下标前瞻和回溯。
+    与流式分析不同，词法错误会在构造时就抛出。"""
+
+    def __init__(self, code: str):
+        lexer = FastLexer(code)
+        self.lines = lexer.lines
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.literal_ids = array("i")
+        self.literals: list[Any] = []
+        literal_index: dict[tuple[type, Any], int] = {}
+        while True:
+            tp, start, end, val = lexer.scan()
+            self.kinds.append(tp.value)
+            self.starts.append(start)
+            self.ends.append(end)
+            if tp == TokenType.CONST or tp == TokenType.ID:
+                # 相同的标识符和字面量只保存一份；类型参与比较，避免 1、1.0、True 混淆
+                key = (type(val), val)
+                if key not in literal_index:
+                    literal_index[key] = len(self.literals)
+                    self.literals.append(val)
+                self.literal_ids.append(literal_index[key])
+            else:
+                self.literal_ids.append(-1)
+            if tp == TokenType.EOF:
+                break
+        self.index = 0
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, i: int) -> Token:
+        return LazyToken(self.lines, self.ends[i], self.kind(i), self.value(i), self.starts[i])
+
+    def kind(self, i: int) -> TokenType:
+        return token_types[self.kinds[i]]
+
+    def value(self, i: int) -> Any:
+        literal = self.literal_ids[i]
+        return None if literal < 0 else self.literals[literal]
+
+    def text(self, i: int) -> str:
+        return self.lines.code[self.starts[i]:self.ends[i]]
+
+    def peek(self, k: int = 0) -> TokenType:
+        return self.kind(min(self.index + k, len(self.kinds) - 1))
+
+    def next(self) -> Token:
+        token = self[self.index]
+        if self.index < len(self.kinds) - 1:
+            self.index += 1
+        return token
+
+    def mark(self) -> int:
+        return self.index
+
+    def reset(self, index: int):
+        self.index = index
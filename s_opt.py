@@ -0,0 +1,430 @@
+from s_data import TokenType
+import s_ast as ast
+from s_type import IntType, FloatType, BoolType, StrType
+
+# 结果过大的常量表达式不折叠，留到运行时再计算
+MAX_FOLDED_LEN = 4096
+MAX_FOLDED_SHIFT = 256
+
+
+def count_nodes(node: ast.Stmt | ast.Expr) -> int:
+    return sum(1 for _ in ast.walk(node))
+
+
+def is_int(node: ast.Expr, val: int) -> bool:
+    return isinstance(node, ast.Const) and type(node.val) is int and node.val == val
+
+
+def fold(node: ast.Binary | ast.Unary) -> ast.Expr:
+    """对常量操作数求值；求值出错时保留原表达式，让错误在运行时照常抛出"""
+    if isinstance(node, ast.Binary):
+        left, right = node.left.val, node.right.val  # type: ignore
+        if node.op == TokenType.LSH and isinstance(right, int) and right > MAX_FOLDED_SHIFT:
+            return node
+        if node.op == TokenType.MUL and (isinstance(left, str) and isinstance(right, int) and right > MAX_FOLDED_LEN or
+                                         isinstance(right, str) and isinstance(left, int) and left > MAX_FOLDED_LEN):
+            return node
+    try:
+        val = node.eval(None)  # type: ignore
+    except Exception:
+        return node
+    if isinstance(val, str) and len(val) > MAX_FOLDED_LEN:
+        return node
+    res = ast.Const(val)
+    # 重新检查时常量的类型由值决定，与原类型不同（如 int 相除）时不折叠
+    if res.infer(None) != node.type:  # type: ignore
+        return node
+    res.type = node.type
+    return res
+
+
+def simplify_binary(node: ast.Binary) -> ast.Expr:
+    left, right, op = node.left, node.right, node.op
+    if isinstance(left, ast.Const) and isinstance(right, ast.Const):
+        return fold(node)
+    if op in (TokenType.AND, TokenType.OR) and isinstance(left, ast.Const):
+        # 左侧已能决定结果时右侧不会被求值，否则结果就是右侧转换为 bool
+        if bool(left.val) == (op == TokenType.OR):
+            res = ast.Const(op == TokenType.OR)
+            res.type = BoolType
+            return res
+        return right if right.type == BoolType else node
+    # 只在类型不变时化简恒等式：bool + 0 是 int，浮点的 -0.0 + 0 是 0.0
+    if op == TokenType.ADD and node.type == IntType:
+        if is_int(right, 0) and left.type == IntType:
+            return left
+        if is_int(left, 0) and right.type == IntType:
+            return right
+    if op == TokenType.SUB and is_int(right, 0) and left.type in (IntType, FloatType) and node.type == left.type:
+        return left
+    if op == TokenType.MUL:
+        if is_int(right, 1) and left.type in (IntType, FloatType) and node.type == left.type:
+            return left
+        if is_int(left, 1) and right.type in (IntType, FloatType) and node.type == right.type:
+            return right
+    return node
+
+
+def optimize_expr(node: ast.Expr) -> ast.Expr:
+    if isinstance(node, ast.Binary):
+        node.left, node.right = optimize_expr(
+            node.left), optimize_expr(node.right)
+        return simplify_binary(node)
+    if isinstance(node, ast.Unary):
+        node.val = optimize_expr(node.val)
+        return fold(node) if isinstance(node.val, ast.Const) else node
+    if isinstance(node, ast.IndexOp):
+        node.base, node.index = optimize_expr(
+            node.base), optimize_expr(node.index)
+    elif isinstance(node, ast.Call):
+        node.func = optimize_expr(node.func)
+        node.args = list(map(optimize_expr, node.args))
+    return node
+
+
+def optimize_block(block: ast.Block) -> ast.Block:
+    stmts: list[ast.Stmt] = []
+    for stmt in block.stmts:
+        stmts.extend(optimize_stmt(stmt))
+        # 之后的语句不可达
+        if stmts and isinstance(stmts[-1], (ast.ReturnStmt, ast.BreakStmt, ast.ContinueStmt)):
+            break
+    block.stmts = stmts
+    return block
+
+
+def optimize_stmt(stmt: ast.Stmt) -> list[ast.Stmt]:
+    """返回替换该语句的语句列表，可能为空"""
+    if isinstance(stmt, ast.ExprStmt):
+        stmt.expr = optimize_expr(stmt.expr)
+        return [] if isinstance(stmt.expr, ast.Const) else [stmt]
+    if isinstance(stmt, ast.Assign):
+        stmt.right = optimize_expr(stmt.right)
+        if isinstance(stmt.left, ast.IndexOp):
+            stmt.left = optimize_expr(stmt.left)
+    elif isinstance(stmt, ast.VarDecl):
+        stmt.variables = [(name, tp, optimize_expr(val) if val else None)
+                          for name, tp, val in stmt.variables]
+    elif isinstance(stmt, ast.ReturnStmt):
+        stmt.ret = optimize_expr(stmt.ret)
+    elif isinstance(stmt, ast.FnDef):
+        returns = has_return(stmt.body)
+        optimize_block(stmt.body)
+        # 删去的分支中有 return 时原来能通过检查，不能因为优化变得通不过
+        if returns and not has_return(stmt.body):
+            stmt.pruned_returns = True
+    elif isinstance(stmt, ast.WhileStmt):
+        stmt.cond = optimize_expr(stmt.cond)
+        if isinstance(stmt.cond, ast.Const) and not stmt.cond.val:
+            return []
+        optimize_block(stmt.body)
+    elif isinstance(stmt, ast.IfStmt):
+        return optimize_if(stmt)
+    elif isinstance(stmt, ast.NoOp):
+        return []
+    return [stmt]
+
+
+def has_return(block: ast.Block) -> bool:
+    """块中是否有 return，不计入嵌套的函数"""
+    stack: list[ast.Stmt] = [block]
+    while stack:
+        stmt = stack.pop()
+        if isinstance(stmt, ast.ReturnStmt):
+            return True
+        if isinstance(stmt, ast.Block):
+            stack.extend(stmt.stmts)
+        elif isinstance(stmt, ast.IfStmt):
+            stack.extend(body for _, body in stmt.cases)
+            stack.append(stmt.else_block)
+        elif isinstance(stmt, ast.WhileStmt):
+            stack.append(stmt.body)
+    return False
+
+
+def optimize_if(stmt: ast.IfStmt) -> list[ast.Stmt]:
+    cases: list[tuple[ast.Expr, ast.Block]] = []
+    else_block = stmt.else_block
+    for cond, body in stmt.cases:
+        cond = optimize_expr(cond)
+        optimize_block(body)
+        if isinstance(cond, ast.Const):
+            if not cond.val:
+                continue
+            # 条件恒真，之后的分支都不可达
+            else_block = body
+            break
+        cases.append((cond, body))
+    else:
+        optimize_block(else_block)
+    if not cases:
+        if not else_block.stmts:
+            return []
+        # 没有声明的块不需要作用域，直接并入外层
+        if not else_block.scoped:
+            return else_block.stmts
+    stmt.cases, stmt.else_block = cases, else_block
+    return [stmt]
+
+
+# 提出的表达式在第一次迭代之前求值，早于循环体中排在它前面的语句，因此求值不能抛出异常；
+# 操作数是落到末尾的函数返回的 None 时仍会出错，但第一次迭代同样会求值这个表达式
+# int 与 float 混合的算术运算中，超出 float 范围的大整数转换时会抛出 OverflowError，只有比较是安全的；
+# 移位的位数为负或过大时会抛出异常，按位运算保守地都不提出
+SAFE_COMPARE_OPS = {TokenType.EQ, TokenType.NE, TokenType.GT, TokenType.LT, TokenType.GE, TokenType.LE}
+SAFE_NUMBER_OPS = {TokenType.ADD, TokenType.SUB, TokenType.MUL} | SAFE_COMPARE_OPS
+SAFE_STR_OPS = {TokenType.ADD} | SAFE_COMPARE_OPS
+NUMBER_TYPES = (IntType, FloatType, BoolType)
+
+
+class LoopInfo:
+    """程序中与循环优化有关的全局信息，按名字保守地统计"""
+
+    def __init__(self, program: ast.Block):
+        # 函数体中赋值过的变量，循环中有调用时它们可能被改变
+        self.func_assigned: set[str] = set()
+        # 声明时没有初值的变量，值可能是 None 而与类型不符
+        self.uninit: set[str] = set()
+        self.counter = 0
+        for node in ast.walk(program):
+            if isinstance(node, ast.FnDef):
+                self.func_assigned.update(assigned_names(node.body))
+            elif isinstance(node, ast.VarDecl):
+                self.uninit.update(name for name, _, val in node.variables if not val)
+
+    def variant(self, loop: ast.WhileStmt) -> set[str]:
+        names = assigned_names(loop) | self.uninit
+        if any(isinstance(node, ast.Call) for node in ast.walk(loop)):
+            names |= self.func_assigned
+        return names
+
+    def temp(self) -> str:
+        # 词法分析不会产生含 $ 的名字，不会与用户变量冲突
+        self.counter += 1
+        return f"$inv{self.counter}"
+
+
+def assigned_names(node: ast.Stmt) -> set[str]:
+    """被赋值或声明的变量名，包括嵌套的块和函数"""
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Assign) and isinstance(child.left, ast.Variable):
+            names.add(child.left.name)
+        elif isinstance(child, ast.VarDecl):
+            names.update(name for name, _, _ in child.variables)
+        elif isinstance(child, ast.FnDef):
+            names.add(child.name)
+            names.update(child.params)
+    return names
+
+
+def is_invariant(node: ast.Expr, variant: set[str]) -> bool:
+    """只由常量、不变的变量和纯运算组成的表达式"""
+    if isinstance(node, ast.Const):
+        return True
+    if isinstance(node, ast.Variable):
+        return node.name not in variant
+    if isinstance(node, ast.Binary):
+        return is_invariant(node.left, variant) and is_invariant(node.right, variant)
+    if isinstance(node, ast.Unary):
+        return is_invariant(node.val, variant)
+    return False
+
+
+def is_safe(node: ast.Expr) -> bool:
+    """求值不会抛出异常的表达式"""
+    if isinstance(node, (ast.Const, ast.Variable)):
+        return True
+    if isinstance(node, ast.Binary):
+        left, right = node.left.type, node.right.type
+        if not (is_safe(node.left) and is_safe(node.right)):
+            return False
+        if node.op in (TokenType.AND, TokenType.OR):
+            return True
+        if left in NUMBER_TYPES and right in NUMBER_TYPES:
+            if (left == FloatType) != (right == FloatType):
+                return node.op in SAFE_COMPARE_OPS
+            return node.op in SAFE_NUMBER_OPS
+        return left == StrType and right == StrType and node.op in SAFE_STR_OPS
+    if isinstance(node, ast.Unary):
+        if node.op == TokenType.NOT:
+            return is_safe(node.val)
+        return node.op in (TokenType.ADD, TokenType.SUB) and node.val.type in NUMBER_TYPES and is_safe(node.val)
+    return False
+
+
+def expr_key(node: ast.Expr) -> tuple:
+    """结构相同的表达式得到相同的键，用于合并重复的不变式"""
+    if isinstance(node, ast.Const):
+        return ("const", type(node.val), node.val)
+    if isinstance(node, ast.Variable):
+        return ("var", node.name)
+    if isinstance(node, ast.Binary):
+        return (node.op, expr_key(node.left), expr_key(node.right))
+    if isinstance(node, ast.Unary):
+        return ("unary", node.op, expr_key(node.val))
+    return ("node", id(node))
+
+
+class Hoister:
+    """把一个循环中的不变子表达式替换为临时变量"""
+
+    def __init__(self, info: LoopInfo, variant: set[str]):
+        self.info, self.variant = info, variant
+        self.hoisted: dict[tuple, tuple[str, ast.Expr]] = {}
+
+    def expr(self, node: ast.Expr) -> ast.Expr:
+        if isinstance(node, (ast.Binary, ast.Unary)) and is_invariant(node, self.variant) and is_safe(node) \
+                and any(isinstance(child, ast.Variable) for child in ast.walk(node)):
+            key = expr_key(node)
+            if key not in self.hoisted:
+                self.hoisted[key] = (self.info.temp(), node)
+            res = ast.Variable(self.hoisted[key][0])
+            res.type = node.type
+            return res
+        if isinstance(node, ast.Binary):
+            node.left = self.expr(node.left)
+            # and、or 的右侧不一定求值
+            if node.op not in (TokenType.AND, TokenType.OR):
+                node.right = self.expr(node.right)
+        elif isinstance(node, ast.Unary):
+            node.val = self.expr(node.val)
+        elif isinstance(node, ast.IndexOp):
+            node.base, node.index = self.expr(node.base), self.expr(node.index)
+        elif isinstance(node, ast.Call):
+            node.func = self.expr(node.func)
+            node.args = list(map(self.expr, node.args))
+        return node
+
+    def loop(self, loop: ast.WhileStmt):
+        loop.cond = self.expr(loop.cond)
+        self.block(loop.body)
+
+    def block(self, block: ast.Block) -> bool:
+        """只处理每次迭代都会执行的语句：遇到分支、循环或跳转后停止，返回是否处理完整个块"""
+        for stmt in block.stmts:
+            # 函数体只在调用时执行，不属于循环
+            if isinstance(stmt, ast.Block):
+                if not self.block(stmt):
+                    return False
+            elif isinstance(stmt, ast.ExprStmt):
+                stmt.expr = self.expr(stmt.expr)
+            elif isinstance(stmt, ast.Assign):
+                stmt.right = self.expr(stmt.right)
+                if isinstance(stmt.left, ast.IndexOp):
+                    stmt.left = self.expr(stmt.left)
+            elif isinstance(stmt, ast.VarDecl):
+                stmt.variables = [(name, tp, self.expr(val) if val else None)
+                                  for name, tp, val in stmt.variables]
+            elif isinstance(stmt, ast.ReturnStmt):
+                stmt.ret = self.expr(stmt.ret)
+                return False
+            elif isinstance(stmt, ast.IfStmt):
+                # 只有第一个条件一定会求值
+                if stmt.cases:
+                    cond, body = stmt.cases[0]
+                    stmt.cases[0] = (self.expr(cond), body)
+                return False
+            elif not isinstance(stmt, ast.FnDef):
+                return False
+        return True
+
+
+def copy_expr(node: ast.Expr) -> ast.Expr | None:
+    """复制没有调用的表达式，复制的节点重新检查后才有类型和地址；有调用时返回 None"""
+    if isinstance(node, ast.Const):
+        return ast.Const(node.val)
+    if isinstance(node, ast.Variable):
+        return ast.Variable(node.name)
+    if isinstance(node, ast.Binary):
+        left, right = copy_expr(node.left), copy_expr(node.right)
+        return ast.Binary(node.op, left, right) if left and right else None
+    if isinstance(node, ast.Unary):
+        val = copy_expr(node.val)
+        return ast.Unary(node.op, val) if val else None
+    if isinstance(node, ast.IndexOp):
+        base, index = copy_expr(node.base), copy_expr(node.index)
+        return ast.IndexOp(base, index) if base and index else None
+    return None
+
+
+def has_continue(block: ast.Block) -> bool:
+    """块中是否有作用于当前循环的 continue，不计入嵌套的循环和函数"""
+    stack: list[ast.Stmt] = [block]
+    while stack:
+        stmt = stack.pop()
+        if isinstance(stmt, ast.ContinueStmt):
+            return True
+        if isinstance(stmt, ast.Block):
+            stack.extend(stmt.stmts)
+        elif isinstance(stmt, ast.IfStmt):
+            stack.extend(body for _, body in stmt.cases)
+            stack.append(stmt.else_block)
+    return False
+
+
+def to_range(loop: ast.WhileStmt, info: LoopInfo) -> ast.Stmt:
+    """识别 while i < n { ...; i = i + step; }，n 不变、i 只在末尾自增"""
+    cond, stmts = loop.cond, loop.body.stmts
+    if not isinstance(cond, ast.Binary) or cond.op not in (TokenType.LT, TokenType.LE) or \
+            not isinstance(cond.left, ast.Variable) or not stmts:
+        return loop
+    var, stop, inc = cond.left, cond.right, stmts[-1]
+    if var.type != IntType or stop.type != IntType or not isinstance(inc, ast.Assign) or \
+            not isinstance(inc.left, ast.Variable) or inc.left.name != var.name:
+        return loop
+    right = inc.right
+    if not isinstance(right, ast.Binary) or right.op != TokenType.ADD:
+        return loop
+    if isinstance(right.left, ast.Variable) and right.left.name == var.name:
+        step = right.right
+    elif isinstance(right.right, ast.Variable) and right.right.name == var.name:
+        step = right.left
+    else:
+        return loop
+    if not isinstance(step, ast.Const) or type(step.val) is not int or step.val <= 0:
+        return loop
+    body = ast.Block(stmts[:-1])
+    # 除末尾的自增之外 i 不能被改变，continue 会跳过自增
+    others = assigned_names(body) | info.uninit
+    if any(isinstance(node, ast.Call) for node in ast.walk(loop)):
+        others |= info.func_assigned
+    if var.name in others or not is_invariant(stop, info.variant(loop)) or has_continue(body):
+        return loop
+    return ast.RangeStmt(loop, var, stop, step.val, cond.op == TokenType.LE, body)
+
+
+def optimize_loops(block: ast.Block, info: LoopInfo):
+    """由内向外处理循环：先提出不变式，再识别计数循环"""
+    stmts = []
+    for stmt in block.stmts:
+        if isinstance(stmt, ast.Block):
+            optimize_loops(stmt, info)
+        elif isinstance(stmt, ast.IfStmt):
+            for _, body in stmt.cases:
+                optimize_loops(body, info)
+            optimize_loops(stmt.else_block, info)
+        elif isinstance(stmt, ast.FnDef):
+            optimize_loops(stmt.body, info)
+        elif isinstance(stmt, ast.WhileStmt):
+            optimize_loops(stmt.body, info)
+            # 条件中有调用时求值两次会重复副作用，不提出
+            guard = copy_expr(stmt.cond)
+            hoister = Hoister(info, info.variant(stmt))
+            if guard:
+                hoister.loop(stmt)
+            stmt = to_range(stmt, info)
+            if hoister.hoisted:
+                # 临时变量在第一次检查条件成立后求值，放在包住循环的块中，不会泄漏到外层作用域
+                decl = ast.VarDecl([(name, node.type, node) for name, node in hoister.hoisted.values()])
+                stmt = ast.IfStmt([(guard, ast.Block([decl, stmt]))], ast.Block([]))
+        stmts.append(stmt)
+    block.stmts = stmts
+
+
+def optimize_program(program: ast.Block) -> ast.Block:
+    """在 check 之后改写程序，依赖 check 记录的类型和作用域信息
+    改写会改变作用域结构，之后需要重新 check"""
+    optimize_block(program)
+    optimize_loops(program, LoopInfo(program))
+    return program
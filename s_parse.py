@@ -3,12 +3,15 @@ from s_lex import Token, Lexer
 from s_error import SSyntaxError
 import s_ast as ast
 from s_type import *
+from typing import Any
 
 
 class Parser:
-    def __init__(self, lexer: Lexer):
+    def __init__(self, lexer: Lexer, positions: bool = False):
         self.lexer = lexer
         self.token = lexer.next()
+        # 是否给节点记录起始 Token 起点的行列号（从 0 开始计），供剖析报告使用
+        self.positions = positions
 
     def eat(self, expect: TokenType | None = None) -> Token:
         if expect and self.token.tp != expect:
@@ -20,65 +23,115 @@ class Parser:
 
     def parse_block(self) -> ast.Block:
         stmts: list[ast.Stmt] = []
-        self.eat(TokenType.BEGIN)
+        begin = self.eat(TokenType.BEGIN)
         while self.token.tp != TokenType.END:
             stmts.append(self.parse_stmt())
         self.eat(TokenType.END)
-        return ast.Block(stmts)
+        block = ast.Block(stmts)
+        if self.positions:
+            block.pos = begin.start()
+        return block
 
     def parse_expr(self) -> ast.Expr:
-        res = self.parse_factor()
-
-        if self.token.tp in prio:
-            op = self.eat().tp
-            res = ast.Binary(op, res, self.parse_factor())
-            while self.token.tp in prio:
-                op = self.eat().tp
-                factor = self.parse_factor()
-                if prio[res.op] > prio[op]:
-                    res = ast.Binary(op, res, factor)
+        """优先级爬升，括号、下标和调用参数的嵌套用显式栈保存而不递归"""
+        # 外层上下文：(values, ops, prefix, 类型, 附加数据)
+        frames: list[tuple[list[ast.Expr], list[TokenType], list[TokenType], str, Any]] = []
+        values: list[ast.Expr] = []
+        ops: list[TokenType] = []
+        prefix: list[TokenType] = []
+        res: ast.Expr
+        expect_operand = True
+        # 复合表达式的位置取其最左侧的操作数
+        positions = self.positions
+
+        while True:
+            if expect_operand:
+                prefix = []
+                while self.token.tp in (TokenType.ADD, TokenType.SUB, TokenType.NOT, TokenType.INV):
+                    prefix.append(self.eat().tp)
+                token = self.token
+                if token.tp == TokenType.CONST:
+                    res = ast.Const(self.eat().val)
+                elif token.tp == TokenType.ID:
+                    res = ast.Variable(self.eat().val)
+                elif self.token.tp == TokenType.LPAREN:
+                    self.eat()
+                    frames.append((values, ops, prefix, "group", None))
+                    values, ops = [], []
+                    continue
                 else:
-                    res = ast.Binary(res.op, res.left,
-                                     ast.Binary(op, res.right, factor))
-
-        return res
+                    raise SSyntaxError(
+                        f"unknown token '{self.token.tp}' at line {self.token.ln}, column {self.token.col}.")
+                if positions:
+                    res.pos = token.start()
+                expect_operand = False
+                continue
 
-    def parse_factor(self) -> ast.Expr:
-        prefix = []
-        while self.token.tp in (TokenType.ADD, TokenType.SUB, TokenType.NOT, TokenType.INV):
-            prefix.append(self.eat())
-
-        if self.token.tp == TokenType.CONST:
-            res = ast.Const(self.eat().val)
-        elif self.token.tp == TokenType.ID:
-            res = ast.Variable(self.eat().val)
-        elif self.token.tp == TokenType.LPAREN:
-            self.eat()
-            res = self.parse_expr()
-            self.eat(TokenType.RPAREN)
-        else:
-            raise SSyntaxError(
-                f"unknown token '{self.token.tp}' at line {self.token.ln}, column {self.token.col}.")
-
-        while self.token.tp in (TokenType.LSQBR, TokenType.LPAREN):
             if self.token.tp == TokenType.LSQBR:
                 self.eat()
-                res = ast.IndexOp(res, self.parse_expr())
-                self.eat(TokenType.RSQBR)
-            elif self.token.tp == TokenType.LPAREN:
+                frames.append((values, ops, prefix, "index", res))
+                values, ops = [], []
+                expect_operand = True
+                continue
+            if self.token.tp == TokenType.LPAREN:
                 self.eat()
-                args: list[ast.Expr] = []
-                if self.token.tp != TokenType.RPAREN:
-                    args.append(self.parse_expr())
-                    while self.token.tp == TokenType.COMMA:
-                        self.eat()
-                        args.append(self.parse_expr())
+                if self.token.tp == TokenType.RPAREN:
+                    self.eat()
+                    res = ast.Call(res, [])
+                    if positions:
+                        res.pos = res.func.pos
+                    continue
+                frames.append((values, ops, prefix, "call", (res, [])))
+                values, ops = [], []
+                expect_operand = True
+                continue
+
+            for op in reversed(prefix):
+                res = ast.Unary(op, res)
+                if positions:
+                    res.pos = res.val.pos
+            values.append(res)
+            if self.token.tp in prio:
+                op = self.eat().tp
+                while ops and prio[ops[-1]] >= prio[op]:
+                    self.reduce(values, ops)
+                ops.append(op)
+                expect_operand = True
+                continue
+
+            while ops:
+                self.reduce(values, ops)
+            res = values.pop()
+            if not frames:
+                return res
+            values, ops, prefix, kind, data = frames.pop()
+            if kind == "group":
+                self.eat(TokenType.RPAREN)
+            elif kind == "index":
+                self.eat(TokenType.RSQBR)
+                res = ast.IndexOp(data, res)
+                if positions:
+                    res.pos = data.pos
+            else:
+                func, args = data
+                args.append(res)
+                if self.token.tp == TokenType.COMMA:
+                    self.eat()
+                    frames.append((values, ops, prefix, kind, data))
+                    values, ops = [], []
+                    expect_operand = True
+                    continue
                 self.eat(TokenType.RPAREN)
-                res = ast.Call(res, args)
+                res = ast.Call(func, args)
+                if positions:
+                    res.pos = func.pos
 
-        for i in reversed(prefix):
-            res = ast.Unary(i, res)
-        return res
+    def reduce(self, values: list[ast.Expr], ops: list[TokenType]):
+        right = values.pop()
+        left = values[-1]
+        values[-1] = ast.Binary(ops.pop(), left, right)
+        if self.positions:
+            values[-1].pos = left.pos
 
     def parse_var_decl(self) -> tuple[str, Type, ast.Expr | None]:
         name = self.eat(TokenType.ID).val
@@ -92,6 +145,13 @@ class Parser:
         return name, tp, val
 
     def parse_stmt(self) -> ast.Stmt:
+        token = self.token
+        stmt = self.parse_bare_stmt()
+        if self.positions:
+            stmt.pos = token.start()
+        return stmt
+
+    def parse_bare_stmt(self) -> ast.Stmt:
         if self.token.tp == TokenType.SEMICOLON:
             self.eat()
             return ast.NoOp()
@@ -102,6 +162,7 @@ class Parser:
                 self.eat()
                 if self.token.tp != TokenType.IF:
                     return ast.IfStmt(cases, self.parse_block())
+                self.eat()
                 cases.append((self.parse_expr(), self.parse_block()))
             return ast.IfStmt(cases, ast.Block([]))
         elif self.token.tp == TokenType.WHILE:
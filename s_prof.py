@@ -0,0 +1,166 @@
+from typing import Any
+from time import perf_counter
+import s_ast as ast
+from s_type import Function
+
+
+class Stats:
+    """一个节点或函数的执行次数、总时间和自身时间（扣除子节点或被调函数的时间）"""
+    __slots__ = ("count", "total", "own", "depth")
+
+    def __init__(self):
+        self.count = 0
+        self.total = self.own = 0.0
+        # 正在执行的层数，递归时只有最外层计入总时间
+        self.depth = 0
+
+
+class Profiler:
+    """记录树遍历解释器中每个节点和每个函数的执行情况
+
+    剖析时把节点的类换成包装了 eval/run 的子类，结束后换回；
+    不剖析时节点上没有任何额外的判断。"""
+
+    def __init__(self):
+        self.nodes: dict[ast.Stmt | ast.Expr, Stats] = {}
+        # 函数体的 Block 到函数定义，各函数（None 为顶层代码）的统计和显示名；同名的函数分别统计
+        self.bodies: dict[ast.Block, ast.FnDef] = {}
+        self.functions: dict[ast.FnDef | None, Stats] = {}
+        self.labels: dict[ast.FnDef | None, str] = {None: "<main>"}
+        # 调用栈（以 ; 连接的函数名）到自身时间，即火焰图的折叠栈
+        self.stacks: dict[str, float] = {}
+        # 正在执行的各节点、各函数中子节点、被调函数累计的时间
+        self.children: list[float] = [0.0]
+        self.callees: list[float] = [0.0]
+        self.calls: list[str] = ["<main>"]
+        self.elapsed = 0.0
+
+    def install(self, program: ast.Block):
+        for fn in ast.walk(program):
+            if isinstance(fn, ast.FnDef):
+                self.bodies[fn.body] = fn
+                self.labels[fn] = fn.name if fn.pos is None else f"{fn.name} ({where(fn)})"
+        for node in ast.walk(program):
+            self.nodes[node] = Stats()
+            node.__class__ = profiled_class(type(node), node in self.bodies)
+
+    def uninstall(self):
+        for node in self.nodes:
+            node.__class__ = node.__class__.__bases__[0]
+
+    def run(self, program: ast.Block, scope: ast.Scope) -> ast.Scope:
+        """剖析执行检查过的程序；JIT 编译的函数和命中缓存的调用绕过节点，剖析期间都关闭"""
+        global active
+        saved = Function.jit_threshold, Function.memo_size
+        Function.jit_threshold = Function.memo_size = None
+        active = self
+        self.install(program)
+        start = perf_counter()
+        try:
+            program.run(scope)
+        finally:
+            self.elapsed = perf_counter() - start
+            self.uninstall()
+            active = None
+            Function.jit_threshold, Function.memo_size = saved
+        main = self.functions[None] = Stats()
+        main.count, main.total, main.own = 1, self.elapsed, self.elapsed - self.callees[0]
+        self.stacks["<main>"] = self.stacks.get("<main>", 0.0) + main.own
+        return scope
+
+    def report(self, code: str | None = None, limit: int = 30) -> str:
+        """按自身时间排序的函数和节点报告，给出源码时附上节点所在的行"""
+        lines = code.split("\n") if code is not None else []
+        out = [f"total {self.elapsed * 1000:.2f} ms", "",
+               f"{'own ms':>10} {'total ms':>10} {'calls':>10}  function"]
+        for fn, stats in sorted(self.functions.items(), key=lambda item: -item[1].own):
+            out.append(f"{stats.own * 1000:10.2f} {stats.total * 1000:10.2f} {stats.count:10}  {self.labels[fn]}")
+        out += ["", f"{'own ms':>10} {'total ms':>10} {'count':>10}  {'line:col':<10} node"]
+        ranked = sorted(self.nodes.items(), key=lambda item: -item[1].own)
+        for node, stats in ranked[:limit]:
+            if not stats.count:
+                break
+            text = lines[node.pos[0]].strip() if node.pos is not None and node.pos[0] < len(lines) else ""
+            out.append(f"{stats.own * 1000:10.2f} {stats.total * 1000:10.2f} {stats.count:10}  {where(node):<10} "
+                       f"{type(node).__name__:<14} {text[:60]}")
+        return "\n".join(out)
+
+    def collapsed(self) -> str:
+        """折叠栈格式，每行为调用栈和自身时间（微秒），可直接交给 flamegraph.pl"""
+        return "\n".join(f"{stack} {round(own * 1000000)}" for stack, own in self.stacks.items()) + "\n"
+
+
+def where(node: ast.Stmt | ast.Expr) -> str:
+    """节点起点的行号和列号，与编辑器一样从 1 开始计"""
+    if node.pos is None:
+        return "?"
+    return f"{node.pos[0] + 1}:{node.pos[1] + 1}"
+
+
+# 正在剖析的 Profiler
+active: Profiler | None = None
+profiled_classes: dict[tuple[type, bool], type] = {}
+
+
+def profiled_class(cls: type, body: bool = False) -> type:
+    """包装了 eval/run 的子类，body 为 True 时同时记录函数调用"""
+    key = (cls, body)
+    if key in profiled_classes:
+        return profiled_classes[key]
+    if issubclass(cls, ast.Expr):
+        method, inner = "eval", cls.eval
+    else:
+        method, inner = "run", cls.run
+
+    def measure(self, scope: ast.Scope) -> Any:
+        prof: Profiler = active  # type: ignore
+        stats = prof.nodes[self]
+        children = prof.children
+        children.append(0.0)
+        stats.depth += 1
+        start = perf_counter()
+        try:
+            return inner(self, scope)
+        finally:
+            elapsed = perf_counter() - start
+            stats.depth -= 1
+            stats.count += 1
+            if not stats.depth:
+                stats.total += elapsed
+            stats.own += elapsed - children.pop()
+            children[-1] += elapsed
+
+    def call(self, scope: ast.Scope) -> Any:
+        prof: Profiler = active  # type: ignore
+        fn = prof.bodies[self]
+        stats = prof.functions.get(fn)
+        if stats is None:
+            stats = prof.functions[fn] = Stats()
+        calls, callees = prof.calls, prof.callees
+        calls.append(prof.labels[fn])
+        callees.append(0.0)
+        stats.depth += 1
+        start = perf_counter()
+        try:
+            return measure(self, scope)
+        finally:
+            elapsed = perf_counter() - start
+            stats.depth -= 1
+            stats.count += 1
+            if not stats.depth:
+                stats.total += elapsed
+            own = elapsed - callees.pop()
+            stats.own += own
+            callees[-1] += elapsed
+            stack = ";".join(calls)
+            prof.stacks[stack] = prof.stacks.get(stack, 0.0) + own
+            calls.pop()
+
+    profiled = profiled_classes[key] = type(cls.__name__, (cls,), {method: call if body else measure})
+    return profiled
+
+
+def profile(program: ast.Block, scope: ast.Scope) -> Profiler:
+    profiler = Profiler()
+    profiler.run(program, scope)
+    return profiler
@@ -0,0 +1,161 @@
+import s_ast as ast
+import s_builtins
+from s_type import Type, BasicType
+
+
+class Binding:
+    """一次变量声明；同一作用域中重复声明视为对同一变量的赋值"""
+
+    def __init__(self, tp: Type | None, fn: ast.FnDef | None = None, pure: bool = False):
+        self.type, self.fn = tp, fn
+        self.assigned = False
+        # 内置函数没有 FnDef，由 pure 标明是否纯
+        self.pure = pure
+
+
+class FnInfo:
+    def __init__(self, node: ast.FnDef):
+        self.node = node
+        self.impure = False
+        # 函数体（包括嵌套函数）中读取的外层变量和调用的函数
+        self.reads: list[Binding] = []
+        self.calls: list[Binding] = []
+        self.callees: list[FnInfo] = []
+
+
+def is_value_type(tp: Type | None) -> bool:
+    """int、float、bool、str 和 None 的值不可变且可哈希"""
+    return isinstance(tp, BasicType)
+
+
+class Analyzer:
+    """按词法作用域解析每个名字，记录各函数对外层变量的读写和调用"""
+
+    def __init__(self):
+        # 最外层是内置函数，程序的全局变量在其内层
+        self.scopes: list[dict[str, Binding]] = [
+            {name: Binding(tp, pure=True) for name, (tp, _) in s_builtins.builtins.items()}, {}]
+        # (函数, 函数自身作用域的下标)，下标更小的作用域中的变量对该函数而言是外层变量
+        self.functions: list[tuple[FnInfo, int]] = []
+        self.infos: dict[ast.FnDef, FnInfo] = {}
+
+    def resolve(self, name: str) -> tuple[int, Binding | None]:
+        for i in range(len(self.scopes) - 1, -1, -1):
+            binding = self.scopes[i].get(name)
+            if binding is not None:
+                return i, binding
+        return -1, None
+
+    def outer(self, index: int) -> list[FnInfo]:
+        """对第 index 个作用域中的变量而言，正在分析的哪些函数位于其内部"""
+        return [info for info, base in self.functions if base > index]
+
+    def declare(self, name: str, binding: Binding):
+        scope = self.scopes[-1]
+        if name in scope:
+            scope[name].assigned = True
+        else:
+            scope[name] = binding
+
+    def impure(self):
+        for info, _ in self.functions:
+            info.impure = True
+
+    def block(self, block: ast.Block):
+        self.scopes.append({})
+        for stmt in block.stmts:
+            self.stmt(stmt)
+        self.scopes.pop()
+
+    def stmt(self, stmt: ast.Stmt):
+        if isinstance(stmt, ast.Block):
+            self.block(stmt)
+        elif isinstance(stmt, ast.VarDecl):
+            for name, tp, val in stmt.variables:
+                # 初值在声明生效前求值
+                if val:
+                    self.expr(val)
+                self.declare(name, Binding(tp))
+        elif isinstance(stmt, ast.FnDef):
+            self.declare(stmt.name, Binding(None, stmt))
+            info = self.infos[stmt] = FnInfo(stmt)
+            self.scopes.append({name: Binding(tp) for name, tp in zip(stmt.params, stmt.param_types)})
+            self.functions.append((info, len(self.scopes) - 1))
+            self.block(stmt.body)
+            self.functions.pop()
+            self.scopes.pop()
+        elif isinstance(stmt, ast.Assign):
+            self.expr(stmt.right)
+            if isinstance(stmt.left, ast.Variable):
+                index, binding = self.resolve(stmt.left.name)
+                if binding is not None:
+                    binding.assigned = True
+                for info in self.outer(index):
+                    info.impure = True
+            else:
+                self.expr(stmt.left)
+                self.impure()
+        elif isinstance(stmt, ast.RangeStmt):
+            self.stmt(stmt.loop)
+        else:
+            for child in ast.children(stmt):
+                if isinstance(child, ast.Stmt):
+                    self.stmt(child)
+                else:
+                    self.expr(child)
+
+    def expr(self, expr: ast.Expr):
+        if isinstance(expr, ast.Variable):
+            index, binding = self.resolve(expr.name)
+            for info in self.outer(index):
+                if binding is None:
+                    info.impure = True
+                else:
+                    info.reads.append(binding)
+            return
+        if isinstance(expr, ast.Call):
+            if isinstance(expr.func, ast.Variable):
+                _, binding = self.resolve(expr.func.name)
+                if binding is None:
+                    self.impure()
+                else:
+                    for info, _ in self.functions:
+                        info.calls.append(binding)
+            else:
+                # 调用的不是具名函数，无法确定
+                self.impure()
+        for child in ast.children(expr):
+            self.expr(child)  # type: ignore
+
+
+def analyze(program: ast.Block) -> ast.Block:
+    """标记检查过的程序中的纯函数
+
+    纯函数不给外层变量赋值、不写下标、只读取从不重新赋值的函数和值类型的外层变量、只调用纯函数。
+    参数和返回值都是值类型的纯函数可以按参数缓存结果，设置 FnDef.memoize。"""
+    analyzer = Analyzer()
+    for stmt in program.stmts:
+        analyzer.stmt(stmt)
+    infos = analyzer.infos
+    for info in infos.values():
+        for binding in info.reads:
+            if binding.assigned or binding.fn is None and not binding.pure and not is_value_type(binding.type):
+                info.impure = True
+        for binding in info.calls:
+            if binding.pure and not binding.assigned:
+                continue
+            if binding.assigned or binding.fn is None:
+                info.impure = True
+            else:
+                info.callees.append(infos[binding.fn])
+    # 调用了非纯函数的函数也不纯，传播到不动点，互相递归的函数默认为纯
+    changed = True
+    while changed:
+        changed = False
+        for info in infos.values():
+            if not info.impure and any(callee.impure for callee in info.callees):
+                info.impure = changed = True
+    for node, info in infos.items():
+        node.pure = not info.impure
+        node.memoize = node.pure and is_value_type(node.ret_type) and all(map(is_value_type, node.param_types))
+    return program
@@ -0,0 +1,133 @@
+from typing import Any, Callable
+import argparse
+import sys
+from s_lex import FastLexer
+from s_parse import Parser
+from s_error import SException
+import s_ast as ast
+from s_type import Function, Memo, Memoized
+import s_vm
+import s_closure
+import s_opt
+import s_pure
+import s_cache
+import s_builtins
+import s_prof
+
+
+def load(code: str, optimize: bool = False, cache_dir: str | None = None,
+         positions: bool = False, check_scope: Callable[[], ast.Scope] = s_builtins.new_check_scope) -> ast.Block:
+    """词法、语法分析并检查整个程序；给出 cache_dir 时命中缓存则跳过这些步骤
+
+    positions 为 True 时给节点记录源码位置；check_scope 新建检查用的全局作用域，
+    可以在内置函数之外预先定义变量。这两种程序都不经过缓存。"""
+    if cache_dir is not None and not positions and check_scope is s_builtins.new_check_scope:
+        key = s_cache.cache_key(code, optimize)
+        path = s_cache.cache_path(cache_dir, key)
+        program = s_cache.read(path, key)
+        if program is None:
+            program = load(code, optimize)
+            s_cache.write(path, key, program)
+        return program
+    program = Parser(FastLexer(code), positions).parse_program()
+    program.check(check_scope())
+    if optimize:
+        return optimize_program(program, check_scope)
+    return s_pure.analyze(program)
+
+
+def optimize_program(program: ast.Block,
+                     check_scope: Callable[[], ast.Scope] = s_builtins.new_check_scope) -> ast.Block:
+    """优化检查过的程序，优化会改变作用域结构，因此在同样的全局作用域中重新检查一遍"""
+    s_opt.optimize_program(program)
+    program.check(check_scope())
+    return s_pure.analyze(program)
+
+
+# 各执行引擎：接收检查过的程序，返回可反复执行的 runner(scope)
+engines: dict[str, Callable[[ast.Block], Callable[[ast.Scope], Any]]] = {
+    "tree": lambda program: program.run,
+    "vm": lambda program: s_vm.compile_program(program).run,
+    "closure": s_closure.compile_program,
+}
+
+
+def prepare(program: ast.Block, engine: str = "tree") -> Callable[[ast.Scope], Any]:
+    if engine not in engines:
+        raise ValueError(f"unknown engine '{engine}'.")
+    return engines[engine](program)
+
+
+def execute(program: ast.Block, scope: ast.Scope | None = None, engine: str = "tree") -> ast.Scope:
+    if scope is None:
+        scope = s_builtins.new_run_scope()
+    prepare(program, engine)(scope)
+    return scope
+
+
+def memo_stats(scope: ast.Scope) -> dict[str, Memo]:
+    """全局作用域中带结果缓存的函数及其缓存"""
+    return {name: val.memo for name, val in scope.variables.items() if isinstance(val, Memoized)}
+
+
+def main(argv: list[str] | None = None):
+    argparser = argparse.ArgumentParser(description="run a Static program.")
+    argparser.add_argument("file")
+    argparser.add_argument("--engine", choices=list(engines), default="tree")
+    argparser.add_argument("--dis", action="store_true",
+                           help="print the bytecode instead of running.")
+    argparser.add_argument("-O", "--optimize", action="store_true",
+                           help="fold constants and prune dead code after checking.")
+    argparser.add_argument("--opt-stats", action="store_true",
+                           help="print the node counts before and after optimizing.")
+    argparser.add_argument("--cache-dir", default=s_cache.default_dir(),
+                           help="directory of the checked-program cache.")
+    argparser.add_argument("--no-cache", action="store_true",
+                           help="always lex, parse and check the source.")
+    argparser.add_argument("--jit-threshold", type=int, default=Function.jit_threshold,
+                           help="calls before a function is JIT compiled, 0 disables it.")
+    argparser.add_argument("--memo-size", type=int, default=Function.memo_size,
+                           help="results cached per pure function, 0 disables caching.")
+    argparser.add_argument("--memo-stats", action="store_true",
+                           help="print the cache statistics of pure functions.")
+    argparser.add_argument("--profile", action="store_true",
+                           help="run on the tree engine and print time per function and node.")
+    argparser.add_argument("--profile-stacks", metavar="FILE",
+                           help="with --profile, write collapsed stacks for flame graphs to FILE.")
+    args = argparser.parse_args(argv)
+    Function.jit_threshold = args.jit_threshold or None
+    Function.memo_size = args.memo_size or None
+
+    with open(args.file, encoding="utf-8") as f:
+        code = f.read()
+    try:
+        if args.opt_stats:
+            program = load(code)
+            before = s_opt.count_nodes(program)
+            optimize_program(program)
+            print(f"nodes: {before} -> {s_opt.count_nodes(program)}", file=sys.stderr)
+        else:
+            program = load(code, args.optimize,
+                           None if args.no_cache else args.cache_dir, args.profile)
+        if args.dis:
+            print(s_vm.compile_program(program).dis())
+            return
+        if args.profile:
+            scope = s_builtins.new_run_scope()
+            profiler = s_prof.profile(program, scope)
+            print(profiler.report(code), file=sys.stderr)
+            if args.profile_stacks:
+                with open(args.profile_stacks, "w", encoding="utf-8") as f:
+                    f.write(profiler.collapsed())
+        else:
+            scope = execute(program, engine=args.engine)
+        if args.memo_stats:
+            for name, memo in memo_stats(scope).items():
+                print(f"memo {name}: {memo}", file=sys.stderr)
+    except SException as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
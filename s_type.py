@@ -1,19 +1,19 @@
-from s_ast import Scope
-import s_ast as ast
 from s_type import *
 from typing import Any
+from array import array
+from collections import OrderedDict
+from s_error import SValueError
 
 
 class Type:
+    """类型对象都经过驻留，相等的类型是同一个对象，可直接用 is 或 == 比较并作为字典的键"""
+
     def __str__(self) -> str:
         ...
 
     def __repr__(self) -> str:
         ...
 
-    def __eq__(self, other) -> bool:
-        ...
-
     def issubscriptable(self) -> bool:
         ...
 
@@ -22,8 +22,18 @@ class Type:
 
 
 class BasicType(Type):
-    def __init__(self, name: str):
-        self.name = name
+    interned: dict[str, "BasicType"] = {}
+
+    def __new__(cls, name: str):
+        tp = cls.interned.get(name)
+        if tp is None:
+            tp = cls.interned[name] = super().__new__(cls)
+            tp.name = name
+        return tp
+
+    def __reduce__(self):
+        # 反序列化时同样经过驻留
+        return BasicType, (self.name,)
 
     def __str__(self) -> str:
         return self.name
@@ -31,9 +41,6 @@ class BasicType(Type):
     def __repr__(self) -> str:
         return self.name
 
-    def __eq__(self, other) -> bool:
-        return isinstance(other, BasicType) and self.name == other.name
-
     def issubscriptable(self) -> bool:
         return self.name == "str"
 
@@ -46,15 +53,26 @@ class BasicType(Type):
             return 0.0
         elif self.name == "str":
             return ""
-        elif self.name == "NoneType":
+        elif self.name == "None":
             return None
         else:
             return None
 
 
 class TemplateType(Type):
-    def __init__(self, tname: str, targs: list[Type]):
-        self.tname, self.targs = tname, targs
+    interned: dict[tuple, "TemplateType"] = {}
+
+    def __new__(cls, tname: str, targs: "list[Type] | tuple[Type, ...]"):
+        # 类型参数已经驻留，按对象即可组成键
+        key = (tname, *targs)
+        tp = cls.interned.get(key)
+        if tp is None:
+            tp = cls.interned[key] = super().__new__(cls)
+            tp.tname, tp.targs = tname, tuple(targs)
+        return tp
+
+    def __reduce__(self):
+        return TemplateType, (self.tname, self.targs)
 
     def __str__(self) -> str:
         return "{}<{}>".format(self.tname, ", ".join(map(str, self.targs)))
@@ -62,18 +80,45 @@ class TemplateType(Type):
     def __repr__(self) -> str:
         return "{}<{}>".format(self.tname, ", ".join(map(str, self.targs)))
 
-    def __eq__(self, other) -> bool:
-        return isinstance(other, TemplateType) and self.tname == other.tname and self.targs == other.targs
-
     def issubscriptable(self) -> bool:
         return self.tname == "list"
 
-    def new(self) -> Any:
+    def new(self, size: int = 0) -> Any:
+        """新建 size 个元素的值，数值和 bool 元素的 list 使用紧凑存储并填充为 0"""
         if self.tname == "list":
-            return []
+            elem = self.targs[0]
+            code = array_typecodes.get(elem)
+            if code is None:
+                if isinstance(elem, TemplateType):
+                    # 每个元素各自新建，避免共用同一个 list
+                    return [elem.new() for _ in range(size)]
+                return [elem.new()] * size
+            if code == "B":
+                return BoolArray(bytes(size))
+            return array(code, bytes(size * array(code).itemsize))
         else:
             return None
 
+    def make(self, values) -> Any:
+        """由可迭代对象创建 list 的值"""
+        code = array_typecodes.get(self.targs[0])
+        if code is None:
+            return list(values)
+        if code == "B":
+            return BoolArray(values)
+        try:
+            return array(code, values)
+        except OverflowError:
+            raise out_of_range() from None
+
+
+def accepts(param: Type, arg: Type) -> bool:
+    """类型为 arg 的实参能否传给类型为 param 的形参，param 中的 ? 匹配任意类型"""
+    if param is arg or param is AnyType:
+        return True
+    return isinstance(param, TemplateType) and isinstance(arg, TemplateType) and \
+        param.tname == arg.tname and len(param.targs) == len(arg.targs) and all(map(accepts, param.targs, arg.targs))
+
 
 def ListType(base: Type):
     return TemplateType("list", [base])
@@ -83,6 +128,13 @@ def FunctionType(ret_type: Type, param_types: list[Type]):
     return TemplateType("function", [ret_type, *param_types])
 
 
+def OverloadType(signatures: "list[Type] | tuple[Type, ...]"):
+    """内置函数的多个签名，调用时按实参类型选用其中的函数类型"""
+    return TemplateType("overload", signatures)
+
+
+# 内置函数签名中的任意类型，不是合法的标识符，源码中写不出
+AnyType = BasicType("?")
 IntType = BasicType("int")
 FloatType = BasicType("float")
 BoolType = BasicType("bool")
@@ -90,17 +142,288 @@ StrType = BasicType("str")
 NoneType = BasicType("None")
 
 
+class BoolArray(array):
+    """list<bool> 的存储，每个元素一个字节，读出时转换回 bool"""
+
+    def __new__(cls, values: Any = (), typecode: str = "B"):
+        # 反序列化时以 (typecode, values) 调用
+        if isinstance(values, str):
+            values, typecode = typecode, values
+        return super().__new__(cls, "B", values)
+
+    def __getitem__(self, index: Any) -> Any:
+        # 切片同样得到 list<bool>
+        val = super().__getitem__(index)
+        return bool(val) if type(val) is int else BoolArray(val)
+
+    def __iter__(self):
+        return map(bool, super().__iter__())
+
+    # array 的拼接、重复和复制得到的是普通 array，需要换回子类
+    def __add__(self, other: Any) -> "BoolArray":
+        return BoolArray(super().__add__(other))
+
+    def __mul__(self, count: int) -> "BoolArray":
+        return BoolArray(super().__mul__(count))
+
+    __rmul__ = __mul__
+
+    def __copy__(self) -> "BoolArray":
+        return BoolArray(self)
+
+    def __deepcopy__(self, memo: Any) -> "BoolArray":
+        return BoolArray(self)
+
+
+# 元素类型到 array 类型码的映射，int 元素为 64 位有符号整数
+array_typecodes: dict[Type, str] = {IntType: "q", FloatType: "d", BoolType: "B"}
+
+
+def out_of_range() -> SValueError:
+    """写入紧凑存储的值超出元素的范围，各执行引擎都以此代替 OverflowError"""
+    return SValueError("value out of range for the list element, list<int> elements are 64-bit integers.")
+
+
+def export(val: Any) -> memoryview:
+    """不复制地导出紧凑存储的 list，供 struct、NumPy 等按缓冲区读写"""
+    if not isinstance(val, array):
+        raise TypeError(f"'{type(val).__name__}' has no contiguous buffer.")
+    return memoryview(val)
+
+
+class Rope:
+    """运行时较长的 str：拼接的片段记录在列表中，用到时才合并，循环中反复追加均摊 O(1)
+
+    追加得到的 Rope 与原来的共享片段列表，count 是自己占用的前缀长度；
+    只有占满列表的 Rope 能就地追加，从较早的 Rope 追加时先复制其前缀。
+    下标、比较、哈希等操作按合并后的 str 进行，对程序不可见。"""
+    __slots__ = ("parts", "count", "length", "flat")
+    # 拼接结果达到该长度才使用 Rope，短字符串直接拼接更快
+    threshold = 256
+
+    def __init__(self, parts: list[str], count: int, length: int):
+        self.parts, self.count, self.length = parts, count, length
+        self.flat: str | None = None
+
+    def extend(self, pieces: Any) -> "Rope":
+        parts = self.parts
+        if len(parts) != self.count:
+            parts = parts[:self.count]
+        length = self.length
+        for piece in pieces:
+            if type(piece) is not str:
+                piece = str(piece)
+            parts.append(piece)
+            length += len(piece)
+        if len(parts) == self.count:
+            return self
+        return Rope(parts, len(parts), length)
+
+    def __str__(self) -> str:
+        flat = self.flat
+        if flat is None:
+            parts = self.parts
+            if len(parts) == self.count:
+                flat = self.flat = "".join(parts)
+                # 之后从本 Rope 追加时无需再次合并这些片段
+                self.parts, self.count = [flat], 1
+            else:
+                flat = self.flat = "".join(parts[:self.count])
+        return flat
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __reduce__(self):
+        return str, (str(self),)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __getitem__(self, index: Any) -> str:
+        return str(self)[index]
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __add__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return self.extend((other,))
+        return NotImplemented
+
+    def __radd__(self, other: Any) -> Any:
+        if type(other) is str:
+            return other + str(self)
+        return NotImplemented
+
+    def __mul__(self, other: Any) -> Any:
+        return str(self) * other
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __ne__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return str(self) != str(other)
+        return NotImplemented
+
+    def __lt__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return str(self) < str(other)
+        return NotImplemented
+
+    def __le__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return str(self) <= str(other)
+        return NotImplemented
+
+    def __gt__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return str(self) > str(other)
+        return NotImplemented
+
+    def __ge__(self, other: Any) -> Any:
+        if type(other) is str or type(other) is Rope:
+            return str(self) >= str(other)
+        return NotImplemented
+
+
+def concat(left: Any, right: Any) -> Any:
+    """str 的 +，结果较长时得到 Rope"""
+    if type(left) is Rope:
+        return left.extend((right,))
+    if len(left) + len(right) < Rope.threshold:
+        return left + right
+    return Rope([left], 1, len(left)).extend((right,))
+
+
+def concat_all(values: list[Any]) -> Any:
+    """连续的 str 拼接"""
+    head = values[0]
+    if type(head) is Rope:
+        return head.extend(values[1:])
+    try:
+        flat = "".join(values)
+    except TypeError:
+        flat = "".join(map(str, values))
+    return flat if len(flat) < Rope.threshold else Rope([flat], 1, len(flat))
+
+
 class Function:
-    def __init__(self, params: list[str], param_types: list[Type], ret_type: Type, body: ast.Block, closure: Scope):
+    # 调用次数达到该值时尝试 JIT 编译为 Python 函数，None 表示关闭
+    jit_threshold: int | None = 1000
+    # 纯函数结果缓存的容量，None 表示不缓存
+    memo_size: int | None = 1024
+
+    def __init__(self, params: list[str], param_types: list[Type], ret_type: Type, body: "ast.Block", closure: "ast.Scope"):
         self.params, self.param_types = params, param_types
         self.ret_type = ret_type
         self.body = body
         self.closure = closure
+        self.calls = 0
+        self.fast: Any = None
+        # 函数体中参数之后的局部变量槽位，调用时直接补在实参之后
+        self.padding = [None] * (body.size - len(params))
 
     def __call__(self, *args):
-        new_scope = Scope(self.closure)
-        new_scope.variables = dict(zip(self.params, args))
-        ret = self.body.run(new_scope)
-        if ret is None:
+        if self.fast:
+            return self.fast(*args)
+        return self.call(list(args))
+
+    def call(self, slots: list) -> Any:
+        """快速调用协议：slots 是调用方为本次调用新建的实参列表，补齐后直接作为新帧的槽位"""
+        if self.fast:
+            return self.fast(*slots)
+        self.calls += 1
+        if self.calls == Function.jit_threshold:
+            self.fast = s_jit.compile_function(self)
+            if self.fast:
+                return self.fast(*slots)
+        body = self.body
+        if body.layout is None:
+            new_scope = ast.Scope(self.closure)
+            new_scope.bind(self.params, slots)
+        else:
+            slots += self.padding
+            new_scope = ast.Scope(self.closure, body.layout, slots)
+        if body.run(new_scope) is ast.RETURN:
+            ret, ast.RETURN.ret_val = ast.RETURN.ret_val, None
             return ret
-        return ret.ret_val
+        return None
+
+
+
+# 缓存未命中的标记，返回值本身可能是 None
+MISS = object()
+
+
+class Memo:
+    """按参数缓存返回值，超出容量时淘汰最久未使用的项"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.cache: OrderedDict[tuple, Any] = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: tuple) -> Any:
+        ret = self.cache.get(key, MISS)
+        if ret is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        return ret
+
+    def put(self, key: tuple, val: Any):
+        cache = self.cache
+        cache[key] = val
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+
+    def __str__(self) -> str:
+        return f"hits {self.hits}, misses {self.misses}, evictions {self.evictions}, size {len(self.cache)}/{self.maxsize}"
+
+
+class Memoized:
+    """混入各执行引擎的函数类，为 s_pure 判定可缓存的函数加上结果缓存"""
+    memo: Memo
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memo = Memo(Function.memo_size)  # type: ignore
+
+    def __call__(self, *args):
+        return self.call(list(args))
+
+    def call(self, slots: list) -> Any:
+        memo = self.memo
+        key = tuple(slots)
+        ret = memo.get(key)
+        if ret is MISS:
+            ret = super().call(slots)  # type: ignore
+            memo.put(key, ret)
+        return ret
+
+
+class MemoFunction(Memoized, Function):
+    pass
+
+
+def call_entry(func: Any):
+    """调用点内联缓存的入口：Function 走快速调用协议，其他可调用对象展开参数调用"""
+    if isinstance(func, Function):
+        return func.call
+    return lambda slots: func(*slots)
+
+
+# s_ast 与 s_jit 依赖本模块中的类型，需在全部定义之后再导入以避免循环导入
+import s_ast as ast
+import s_jit
@@ -0,0 +1,396 @@
+from typing import Any
+from enum import IntEnum, unique
+from s_data import TokenType, unary_ops
+import s_ast as ast
+from s_type import Function, Memoized, MISS, Type, out_of_range
+
+
+@unique
+class OpCode(IntEnum):
+    CONST = 0
+    LOAD = 1
+    STORE = 2
+    DEFINE = 3
+    POP = 4
+    BINARY = 5
+    UNARY = 6
+    INDEX = 7
+    STORE_INDEX = 8
+    CALL = 9
+    JUMP = 10
+    JUMP_IF_FALSE = 11
+    JUMP_IF_TRUE = 12
+    TO_BOOL = 13
+    RETURN = 14
+    PUSH_SCOPE = 15
+    POP_SCOPE = 16
+    MAKE_FUNCTION = 17
+    TAIL_CALL = 18
+    LOAD_SLOT = 19
+    LOAD_OUTER = 20
+    STORE_SLOT = 21
+    STORE_OUTER = 22
+
+
+# 分派循环中直接与整数比较，避免每条指令都经过枚举
+CONST = OpCode.CONST.value
+LOAD = OpCode.LOAD.value
+STORE = OpCode.STORE.value
+DEFINE = OpCode.DEFINE.value
+POP = OpCode.POP.value
+BINARY = OpCode.BINARY.value
+UNARY = OpCode.UNARY.value
+INDEX = OpCode.INDEX.value
+STORE_INDEX = OpCode.STORE_INDEX.value
+CALL = OpCode.CALL.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+JUMP_IF_TRUE = OpCode.JUMP_IF_TRUE.value
+TO_BOOL = OpCode.TO_BOOL.value
+RETURN = OpCode.RETURN.value
+PUSH_SCOPE = OpCode.PUSH_SCOPE.value
+POP_SCOPE = OpCode.POP_SCOPE.value
+MAKE_FUNCTION = OpCode.MAKE_FUNCTION.value
+TAIL_CALL = OpCode.TAIL_CALL.value
+LOAD_SLOT = OpCode.LOAD_SLOT.value
+LOAD_OUTER = OpCode.LOAD_OUTER.value
+STORE_SLOT = OpCode.STORE_SLOT.value
+STORE_OUTER = OpCode.STORE_OUTER.value
+
+
+class Code:
+    """编译后的指令序列"""
+
+    def __init__(self, instrs: list[tuple[int, Any]]):
+        self.instrs = instrs
+
+    def run(self, scope: ast.Scope) -> Any:
+        return execute(self.instrs, scope)
+
+    def dis(self) -> str:
+        lines = []
+        for i, (op, arg) in enumerate(self.instrs):
+            if op == CONST:
+                arg = repr(arg)
+            elif isinstance(arg, FunctionProto):
+                arg = f"<fn {arg.name}>"
+            elif callable(arg):
+                arg = getattr(arg, "__name__", arg)
+            lines.append(f"{i:>5} {OpCode(op).name:<14} {'' if arg is None else arg}")
+        return "\n".join(lines)
+
+
+class FunctionProto:
+    """FnDef 编译结果，运行到 MAKE_FUNCTION 时与当前作用域绑定"""
+
+    def __init__(self, node: ast.FnDef, code: Code):
+        self.name, self.params, self.param_types = node.name, node.params, node.param_types
+        self.ret_type, self.body = node.ret_type, node.body
+        self.memoize = node.memoize
+        self.code = code
+
+
+class CompiledFunction(Function):
+    def __init__(self, params: list[str], param_types: list[Type], ret_type: Type, body: ast.Block, closure: ast.Scope, code: Code):
+        super().__init__(params, param_types, ret_type, body, closure)
+        self.code = code
+        # 参数名到槽位的映射，每次调用复制一份作为新作用域的映射
+        self.names = dict(zip(params, range(len(params))))
+
+    def call(self, slots: list) -> Any:
+        return execute(self.code.instrs, ast.Scope(self.closure, self.names.copy(), slots))
+
+
+class MemoCompiledFunction(Memoized, CompiledFunction):
+    pass
+
+
+class Compiler:
+    def __init__(self):
+        self.instrs: list[tuple[int, Any]] = []
+        # 当前相对于函数帧新建的作用域层数
+        self.depth = 0
+        # (循环起点, 进入循环时的作用域层数, 待回填的 break 跳转)
+        self.loops: list[tuple[int, int, list[int]]] = []
+
+    def emit(self, op: int, arg: Any = None) -> int:
+        self.instrs.append((op, arg))
+        return len(self.instrs) - 1
+
+    def patch(self, at: int, target: int | None = None):
+        op, _ = self.instrs[at]
+        self.instrs[at] = (op, len(self.instrs) if target is None else target)
+
+    def compile_function(self, block: ast.Block) -> Code:
+        self.compile_block(block, False)
+        self.emit(CONST, None)
+        self.emit(RETURN)
+        return Code(self.instrs)
+
+    def compile_block(self, block: ast.Block, new_scope: bool = True):
+        new_scope = new_scope and block.has_bindings()
+        if new_scope:
+            self.emit(PUSH_SCOPE)
+            self.depth += 1
+        for stmt in block.stmts:
+            self.compile_stmt(stmt)
+        if new_scope:
+            self.emit(POP_SCOPE, 1)
+            self.depth -= 1
+
+    def unwind(self, depth: int):
+        if self.depth > depth:
+            self.emit(POP_SCOPE, self.depth - depth)
+
+    def compile_stmt(self, stmt: ast.Stmt):
+        if isinstance(stmt, ast.ExprStmt):
+            self.compile_expr(stmt.expr)
+            self.emit(POP)
+        elif isinstance(stmt, ast.Assign):
+            self.compile_expr(stmt.right)
+            if isinstance(stmt.left, ast.Variable):
+                self.emit_variable(stmt.left, STORE, STORE_SLOT, STORE_OUTER)
+            elif isinstance(stmt.left, ast.IndexOp):
+                self.compile_expr(stmt.left.base)
+                self.compile_expr(stmt.left.index)
+                self.emit(STORE_INDEX)
+        elif isinstance(stmt, ast.VarDecl):
+            for name, tp, val in stmt.variables:
+                if val:
+                    self.compile_expr(val)
+                else:
+                    self.emit(CONST, None)
+                self.emit(DEFINE, name)
+        elif isinstance(stmt, ast.IfStmt):
+            ends = []
+            for cond, body in stmt.cases:
+                self.compile_expr(cond)
+                skip = self.emit(JUMP_IF_FALSE)
+                self.compile_block(body)
+                ends.append(self.emit(JUMP))
+                self.patch(skip)
+            self.compile_block(stmt.else_block)
+            for end in ends:
+                self.patch(end)
+        elif isinstance(stmt, ast.WhileStmt):
+            start = len(self.instrs)
+            self.compile_expr(stmt.cond)
+            exit = self.emit(JUMP_IF_FALSE)
+            self.loops.append((start, self.depth, [exit]))
+            self.compile_block(stmt.body)
+            self.emit(JUMP, start)
+            for at in self.loops.pop()[2]:
+                self.patch(at)
+        elif isinstance(stmt, ast.RangeStmt):
+            # 字节码中的循环本身就是跳转，按原来的 while 编译
+            self.compile_stmt(stmt.loop)
+        elif isinstance(stmt, ast.BreakStmt):
+            if not self.loops:
+                # 与树遍历一致：循环外的 break 结束当前函数
+                self.emit(CONST, None)
+                self.emit(RETURN)
+                return
+            _, depth, breaks = self.loops[-1]
+            self.unwind(depth)
+            breaks.append(self.emit(JUMP))
+        elif isinstance(stmt, ast.ContinueStmt):
+            if not self.loops:
+                self.emit(CONST, None)
+                self.emit(RETURN)
+                return
+            start, depth, _ = self.loops[-1]
+            self.unwind(depth)
+            self.emit(JUMP, start)
+        elif isinstance(stmt, ast.ReturnStmt):
+            if isinstance(stmt.ret, ast.Call):
+                # 尾调用复用当前帧，不再返回到这里
+                self.compile_args(stmt.ret)
+                self.emit(TAIL_CALL, len(stmt.ret.args))
+                # 调用的不是普通的 CompiledFunction 时按普通调用执行，再由这里返回
+                self.emit(RETURN)
+                return
+            self.compile_expr(stmt.ret)
+            self.emit(RETURN)
+        elif isinstance(stmt, ast.FnDef):
+            code = Compiler().compile_function(stmt.body)
+            self.emit(MAKE_FUNCTION, FunctionProto(stmt, code))
+            self.emit(DEFINE, stmt.name)
+        elif isinstance(stmt, ast.NoOp):
+            pass
+        else:
+            raise TypeError(f"can't compile statement '{type(stmt).__name__}'.")
+
+    def compile_expr(self, expr: ast.Expr):
+        if isinstance(expr, ast.Const):
+            self.emit(CONST, expr.val)
+        elif isinstance(expr, ast.Variable):
+            self.emit_variable(expr, LOAD, LOAD_SLOT, LOAD_OUTER)
+        elif isinstance(expr, ast.Binary):
+            self.compile_expr(expr.left)
+            if expr.op in (TokenType.AND, TokenType.OR):
+                short = self.emit(JUMP_IF_FALSE if expr.op ==
+                                  TokenType.AND else JUMP_IF_TRUE)
+                self.compile_expr(expr.right)
+                self.emit(TO_BOOL)
+                end = self.emit(JUMP)
+                self.patch(short)
+                self.emit(CONST, expr.op == TokenType.OR)
+                self.patch(end)
+            else:
+                self.compile_expr(expr.right)
+                self.emit(BINARY, ast.binary_func(expr))
+        elif isinstance(expr, ast.Unary):
+            self.compile_expr(expr.val)
+            self.emit(UNARY, unary_ops[expr.op])
+        elif isinstance(expr, ast.IndexOp):
+            self.compile_expr(expr.base)
+            self.compile_expr(expr.index)
+            self.emit(INDEX)
+        elif isinstance(expr, ast.Call):
+            self.compile_args(expr)
+            self.emit(CALL, len(expr.args))
+        else:
+            raise TypeError(f"can't compile expression '{type(expr).__name__}'.")
+
+    def emit_variable(self, var: ast.Variable, by_name: int, local: int, outer: int):
+        """按 check 解析出的地址访问变量，与树遍历解释器的作用域结构一致；未检查过的按名字查找"""
+        if var.slot < 0:
+            self.emit(by_name, var.name)
+        elif var.depth == 0:
+            self.emit(local, var.slot)
+        else:
+            self.emit(outer, (var.depth, var.slot))
+
+    def compile_args(self, call: ast.Call):
+        self.compile_expr(call.func)
+        for arg in call.args:
+            self.compile_expr(arg)
+
+
+def compile_program(program: ast.Block) -> Code:
+    """编译 parse_program 得到并已 check 过的程序"""
+    return Compiler().compile_function(program)
+
+
+def execute(instrs: list[tuple[int, Any]], scope: ast.Scope) -> Any:
+    """执行指令序列；调用 CompiledFunction 时不递归，而是把调用者的 (指令, pc, 作用域) 压入帧栈，
+    因此调用深度只受内存限制。各帧共用操作数栈，返回时栈顶恰好是返回值。
+    调用缓存未命中的纯函数时帧中还记录 (缓存, 参数)，返回时写入结果"""
+    stack: list[Any] = []
+    push, pop = stack.append, stack.pop
+    frames: list[tuple[list[tuple[int, Any]], int, ast.Scope, tuple | None]] = []
+    pc = 0
+    while True:
+        op, arg = instrs[pc]
+        pc += 1
+        if op == LOAD_SLOT:
+            push(scope.slots[arg])
+        elif op == CONST:
+            push(arg)
+        elif op == BINARY:
+            right = pop()
+            stack[-1] = arg(stack[-1], right)
+        elif op == STORE_SLOT:
+            scope.slots[arg] = pop()
+        elif op == LOAD_OUTER:
+            depth, slot = arg
+            owner = scope
+            for _ in range(depth):
+                owner = owner.parent  # type: ignore
+            push(owner.slots[slot])
+        elif op == JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == CALL:
+            if arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+            func = pop()
+            if type(func) is CompiledFunction:
+                frames.append((instrs, pc, scope, None))
+                scope = ast.Scope(func.closure, func.names.copy(), args)
+                instrs, pc = func.code.instrs, 0
+            elif type(func) is MemoCompiledFunction:
+                key = tuple(args)
+                ret = func.memo.get(key)
+                if ret is MISS:
+                    frames.append((instrs, pc, scope, (func.memo, key)))
+                    scope = ast.Scope(func.closure, func.names.copy(), args)
+                    instrs, pc = func.code.instrs, 0
+                else:
+                    push(ret)
+            else:
+                push(func(*args))
+        elif op == RETURN:
+            if not frames:
+                return pop()
+            instrs, pc, scope, pending = frames.pop()
+            if pending is not None:
+                pending[0].put(pending[1], stack[-1])
+        elif op == INDEX:
+            index = pop()
+            stack[-1] = stack[-1][index]
+        elif op == UNARY:
+            stack[-1] = arg(stack[-1])
+        elif op == POP:
+            pop()
+        elif op == DEFINE:
+            scope.define(arg, pop())
+        elif op == STORE_INDEX:
+            index = pop()
+            base = pop()
+            try:
+                base[index] = pop()
+            except OverflowError:
+                raise out_of_range() from None
+        elif op == PUSH_SCOPE:
+            scope = ast.Scope(scope)
+        elif op == POP_SCOPE:
+            for _ in range(arg):
+                scope = scope.parent  # type: ignore
+        elif op == JUMP_IF_TRUE:
+            if pop():
+                pc = arg
+        elif op == TO_BOOL:
+            stack[-1] = bool(stack[-1])
+        elif op == STORE_OUTER:
+            depth, slot = arg
+            owner = scope
+            for _ in range(depth):
+                owner = owner.parent  # type: ignore
+            owner.slots[slot] = pop()
+        elif op == LOAD:
+            push(scope.find(arg))
+        elif op == STORE:
+            scope.set(arg, pop())
+        elif op == MAKE_FUNCTION:
+            cls = MemoCompiledFunction if arg.memoize and Function.memo_size else CompiledFunction
+            push(cls(arg.params, arg.param_types,
+                 arg.ret_type, arg.body, scope, arg.code))
+        elif op == TAIL_CALL:
+            if arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+            func = pop()
+            if type(func) is CompiledFunction:
+                # 直接替换当前帧，尾递归不会使帧栈增长
+                scope = ast.Scope(func.closure, func.names.copy(), args)
+                instrs, pc = func.code.instrs, 0
+            elif type(func) is MemoCompiledFunction:
+                ret = func.memo.get(tuple(args))
+                if ret is MISS:
+                    # 未命中时同样替换当前帧，只是不缓存这次尾调用的结果
+                    scope = ast.Scope(func.closure, func.names.copy(), args)
+                    instrs, pc = func.code.instrs, 0
+                else:
+                    push(ret)
+            else:
+                push(func(*args))
+        else:
+            raise RuntimeError(f"unknown opcode {op}.")
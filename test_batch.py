@@ -0,0 +1,27 @@
+import unittest
+from s_type import IntType
+import s_batch
+
+
+class BatchTest(unittest.TestCase):
+    def test_bad_json_line(self):
+        # 格式错误的输入行只让对应的任务出错
+        batch = s_batch.Batch("let y: int = x * 2;", {"x": IntType}, ["y"])
+        lines = ['{"x": 1}\n', '{"x": \n', '[1]\n', '{"x": 3}\n']
+        results = list(s_batch.run_batch(batch, lines, workers=0))
+        self.assertEqual([res.index for res in results], [0, 1, 2, 3])
+        self.assertEqual(results[0].values, {"y": 2})
+        self.assertIn("JSONDecodeError", results[1].error)
+        self.assertIn("SValueError", results[2].error)
+        self.assertEqual(results[3].values, {"y": 6})
+
+    def test_optimized_missing_return(self):
+        # 参数在检查前定义，优化后的重新检查同样看得到
+        code = "fn f() -> int { if False { return 1; } } let y: int = x + 1;"
+        batch = s_batch.Batch(code, {"x": IntType}, ["y"], optimize=True)
+        results = list(s_batch.run_batch(batch, [{"x": 1}], workers=0))
+        self.assertEqual(results[0].values, {"y": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from s_error import SValueError, STypeError
+from s_type import IntType, FloatType, ListType
+import s_builtins
+import s_run
+
+big = 2 ** 62
+
+
+def backends() -> list:
+    """可用的后端：纯 Python，以及安装了的 NumPy"""
+    return [None] if s_builtins.np is None else [None, s_builtins.np]
+
+
+class BuiltinsTest(unittest.TestCase):
+    """NumPy 与纯 Python 后端对同样的输入给出相同的结果或相同的错误"""
+
+    def setUp(self):
+        self.saved = s_builtins.np
+
+    def tearDown(self):
+        s_builtins.np = self.saved
+
+    def call(self, name: str, *args):
+        """在各后端上调用内置函数，返回各自的结果或异常类型"""
+        impl = s_builtins.builtins[name][1]
+        out = []
+        for np in backends():
+            s_builtins.np = np
+            try:
+                out.append(impl(*args))
+            except SValueError as e:
+                out.append(type(e))
+        return out
+
+    def assertAgree(self, name: str, *args, expected=None):
+        out = self.call(name, *args)
+        values = [val if isinstance(val, type) else list(val) if hasattr(val, "typecode") else val for val in out]
+        self.assertTrue(all(val == values[0] for val in values), (name, values))
+        if expected is not None:
+            self.assertEqual(values[0], expected)
+
+    def test_sum_dot_exact(self):
+        ints = ListType(IntType).make
+        a = ints([big, big, big, -1])
+        self.assertAgree("sum", a, expected=3 * big - 1)
+        self.assertAgree("dot", a, a, expected=3 * big * big + 1)
+        self.assertAgree("sum", ints([1, 2, 3]), expected=6)
+        self.assertAgree("dot", ints([]), ints([]), expected=0)
+
+    def test_elementwise_overflow(self):
+        ints = ListType(IntType).make
+        a = ints([2 ** 63 - 1, 1])
+        self.assertAgree("add", a, a, expected=SValueError)
+        self.assertAgree("mul", a, a, expected=SValueError)
+        self.assertAgree("map_scale", a, 2, expected=SValueError)
+        # 上界估计偏大时回退到纯 Python，结果仍然精确
+        b = ints([big, -big])
+        self.assertAgree("add", b, ints([big - 1, big]), expected=[2 * big - 1, 0])
+        self.assertAgree("map_scale", ints([3, -4]), 5, expected=[15, -20])
+
+    def test_floats(self):
+        floats = ListType(FloatType).make
+        a = floats([1e308, 1e308])
+        self.assertAgree("add", a, a, expected=[float("inf")] * 2)
+        self.assertAgree("sum", floats([0.5, 0.25]), expected=0.75)
+
+    def test_negative_length(self):
+        for name in ("zeros", "fzeros", "arange"):
+            self.assertAgree(name, -1, expected=SValueError)
+            self.assertAgree(name, 0, expected=[])
+        self.assertAgree("arange", 3, expected=[0, 1, 2])
+
+    def test_generic_len(self):
+        code = """fn count(s: list<str>, t: list<list<int> >) -> int { return len(s) + len(t); }
+            let n: int = len(arange(3)) + len(less(arange(2), arange(2)));"""
+        self.assertEqual(s_run.execute(s_run.load(code)).find("n"), 5)
+        with self.assertRaises(STypeError):
+            s_run.load("let n: int = len(1);")
+
+
+if __name__ == "__main__":
+    unittest.main()
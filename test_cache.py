@@ -0,0 +1,107 @@
+import unittest
+from unittest import mock
+import glob
+import os
+import tempfile
+import s_cache
+import s_run
+
+code = "fn sq(n: int) -> int { return n * n; } let r: int = sq(7);"
+
+
+class CacheTest(unittest.TestCase):
+    """缓存的程序与重新检查的结果相同，任何不一致都退回重新检查"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.saved = s_cache._version
+
+    def tearDown(self):
+        s_cache._version = self.saved
+        self.tmp.cleanup()
+
+    def files(self, pattern: str = "*.sast") -> list[str]:
+        return glob.glob(os.path.join(self.dir, "*", pattern))
+
+    def load(self, source: str = code, optimize: bool = False):
+        program = s_run.load(source, optimize, self.dir)
+        self.assertEqual(s_run.execute(program).find("r"), 49)
+        return program
+
+    def test_key(self):
+        key = s_cache.cache_key(code)
+        self.assertEqual(key, s_cache.cache_key(code))
+        self.assertNotEqual(key, s_cache.cache_key(code + " "))
+        self.assertNotEqual(key, s_cache.cache_key(code, True))
+        s_cache._version = "other"
+        self.assertNotEqual(key, s_cache.cache_key(code))
+
+    def test_miss(self):
+        # 源码、优化开关或解释器变化时都是新的缓存项
+        self.load()
+        self.load()
+        self.assertEqual(len(self.files()), 1)
+        self.load(code + "\n")
+        self.load(optimize=True)
+        s_cache._version = "other"
+        self.load()
+        self.assertEqual(len(self.files()), 4)
+
+    def test_hit(self):
+        program = self.load()
+        with mock.patch.object(s_run, "Parser", side_effect=AssertionError("parsed")):
+            self.assertIsNot(self.load(), program)
+
+    def test_corrupted(self):
+        self.load()
+        path, = self.files()
+        key = os.path.basename(path)[:-len(".sast")]
+        with open(path, "rb") as f:
+            data = f.read()
+        for bad in (b"", b"garbage", data[:len(data) // 2], data[:len(s_cache.MAGIC) + 10],
+                    s_cache.MAGIC + key[::-1].encode() + data[len(s_cache.MAGIC) + len(key):]):
+            with open(path, "wb") as f:
+                f.write(bad)
+            self.assertIsNone(s_cache.read(path, key))
+            # 退回重新检查，并覆盖损坏的文件
+            self.load()
+            self.assertIsNotNone(s_cache.read(path, key))
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIX permissions")
+    def test_untrusted(self):
+        self.load()
+        path, = self.files()
+        key = os.path.basename(path)[:-len(".sast")]
+        directory = os.path.dirname(path)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+        os.chmod(path, 0o666)
+        self.assertIsNone(s_cache.read(path, key))
+        os.chmod(path, 0o600)
+        self.assertIsNotNone(s_cache.read(path, key))
+        os.chmod(directory, 0o777)
+        self.assertIsNone(s_cache.read(path, key))
+        os.chmod(directory, 0o700)
+
+    def test_atomic_write(self):
+        program = self.load()
+        path, = self.files()
+        key = os.path.basename(path)[:-len(".sast")]
+        with open(path, "rb") as f:
+            data = f.read()
+        # 替换失败时删去临时文件，原来的缓存文件保持完整
+        with mock.patch.object(s_cache.os, "replace", side_effect=OSError):
+            self.assertFalse(s_cache.write(path, key, program))
+        with mock.patch.object(s_cache.pickle, "dumps", return_value=b"x" * 100), \
+                mock.patch.object(s_cache.os, "fdopen", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                s_cache.write(path, key, program)
+        self.assertEqual(self.files("*.tmp"), [])
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertTrue(s_cache.write(path, key, program))
+        self.assertEqual(self.files("*"), [path])
+
+
+if __name__ == "__main__":
+    unittest.main()
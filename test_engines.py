@@ -0,0 +1,93 @@
+import unittest
+from s_type import Function
+import s_run
+
+# 函数体引用的变量在之后被同一块中的声明遮蔽，按检查时的词法作用域应读到外层的 x
+shadowed = "let x: int = 1, r: int = 0; if True { fn g() -> int { return x; } let x: int = 5; r = g(); }"
+
+
+class EngineTest(unittest.TestCase):
+    """各执行引擎及 JIT、优化开关的组合应得到相同的结果"""
+
+    def setUp(self):
+        self.saved = Function.jit_threshold, Function.memo_size
+
+    def tearDown(self):
+        Function.jit_threshold, Function.memo_size = self.saved
+
+    def results(self, code: str, name: str) -> dict[tuple, object]:
+        out = {}
+        for engine in s_run.engines:
+            for jit_threshold in (None, 1):
+                for optimize in (False, True):
+                    Function.jit_threshold = jit_threshold
+                    scope = s_run.execute(s_run.load(code, optimize), engine=engine)
+                    out[engine, jit_threshold, optimize] = scope.find(name)
+        return out
+
+    def assertAll(self, code: str, name: str, expected: object):
+        for key, val in self.results(code, name).items():
+            self.assertEqual(val, expected, key)
+
+    def test_shadowed_after_function(self):
+        self.assertAll(shadowed, "r", 1)
+
+    def test_shadowed_assign(self):
+        code = "let x: int = 1; if True { fn g() -> int { x = 3; return 0; } let x: int = 5; g(); }"
+        self.assertAll(code, "x", 3)
+
+    def test_nested_blocks(self):
+        code = """let x: int = 2, r: int = 0;
+            fn f(n: int) -> int {
+                let s: int = 0;
+                let i: int = 0;
+                while i < n {
+                    let y: int = i * x;
+                    if y > 2 { let z: int = y; s = s + z; }
+                    i = i + 1;
+                }
+                return s;
+            }
+            if True { let x: int = 100; r = f(5) + f(5); }"""
+        self.assertAll(code, "r", 2 * (4 + 6 + 8))
+
+    def test_pruned_return(self):
+        # 优化删去唯一的 return 后仍应通过检查，结果与不优化时相同
+        code = "fn f() -> int { if False { return 1; } } let r: int = f();"
+        self.assertAll(code, "r", None)
+        code = "fn f() -> int { while False { return 1; } if 1 > 2 { return 2; } } let r: int = f();"
+        self.assertAll(code, "r", None)
+
+    def test_hoisted_overflow(self):
+        # 循环一次都不执行时，提出循环的 big * f 不应求值，大整数转换为 float 会溢出
+        code = """let big: int = 1, i: int = 0;
+            while i < 400 { big = big * 10; i = i + 1; }
+            let f: float = 1.5, y: float = 0.0, k: int = 0;
+            while k < 0 { y = y + big * f; k = k + 1; }"""
+        self.assertAll(code, "y", 0.0)
+
+    def test_hoisted_none(self):
+        # 落到末尾的 int 函数返回 None，循环一次都不执行时 n * 2 不应求值
+        code = """fn f() -> int { if False { return 1; } }
+            let n: int = f(); let r: int = 0; let i: int = 0;
+            while i < 0 { r = r + n * 2; i = i + 1; }"""
+        self.assertAll(code, "r", 0)
+        # 只在某些迭代执行的分支中的表达式也不应提前求值
+        code = """fn f() -> int { if False { return 1; } }
+            let n: int = f(); let r: int = 0; let i: int = 0;
+            while i < 3 { if i > 5 { r = r + n * 2; } i = i + 1; }"""
+        self.assertAll(code, "r", 0)
+
+    def test_hoisted_values(self):
+        code = """let a: int = 3, b: int = 4, r: int = 0, i: int = 0;
+            while i < 10 {
+                let j: int = 0;
+                while j < a * b { r = r + a * b + j; j = j + 1; }
+                if r > 0 && a * b > 10 { r = r + 1; }
+                i = i + 1;
+            }"""
+        self.assertAll(code, "r", 10 * (12 * 12 + 66 + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from s_lex import FastLexer
+from s_parse import Parser
+from s_error import SException, SSyntaxError
+from s_incr import Document
+import s_builtins
+import s_run
+
+code = """let x: int = 1;
+fn f(n: int) -> int { return n + x; }
+let y: int = f(2);
+let s: str = "a";
+let z: int = y * 2;
+"""
+
+
+def fresh(text: str) -> tuple[list[str], object]:
+    """整份源码重新解析，逐条检查，返回错误信息和检查后的全局作用域"""
+    program = Parser(FastLexer(text)).parse_program()
+    scope = s_builtins.new_check_scope()
+    errors = []
+    for stmt in program.stmts:
+        try:
+            stmt.check(scope)
+        except SException as e:
+            errors.append(str(e))
+    return errors, scope
+
+
+def values(scope) -> dict:
+    """运行结果中可比较的全局变量，函数对象每次运行都不同"""
+    return {name: val for name, val in scope.variables.items() if isinstance(val, (int, float, str))}
+
+
+class DocumentTest(unittest.TestCase):
+    """每次编辑后的错误、全局作用域和运行结果应与整份重新检查的相同"""
+
+    def open(self, replay_cost: int) -> Document:
+        doc = Document(code)
+        doc.replay_cost = replay_cost
+        # 记录每次编辑走了哪条更新全局作用域的路径
+        self.paths = []
+        rewind, snapshot = doc.rewind, doc.snapshot
+        doc.rewind = lambda *args: self.paths.append("rewind") or rewind(*args)
+        doc.snapshot = lambda *args: self.paths.append("snapshot") or snapshot(*args)
+        self.assertSame(doc)
+        return doc
+
+    def edit(self, doc: Document, old: str, new: str):
+        start = doc.text.index(old)
+        self.paths.clear()
+        doc.edit(start, start + len(old), new)
+
+    def assertSame(self, doc: Document):
+        self.assertIsNone(doc.syntax_error)
+        self.assertIsNone(doc.dirty)
+        errors, scope = fresh(doc.text)
+        self.assertEqual([str(e) for e in doc.errors], errors)
+        self.assertEqual(doc.scope.names, scope.names)
+        self.assertEqual(doc.scope.slots, scope.slots)
+        if not errors:
+            expected = s_run.execute(s_run.load(doc.text))
+            self.assertEqual(values(s_run.execute(doc.program)), values(expected))
+
+    def test_edits(self):
+        for replay_cost in (0, Document.replay_cost, 10 ** 9):
+            with self.subTest(replay_cost=replay_cost):
+                doc = self.open(replay_cost)
+                self.edit(doc, "return n + x", "return n * x")
+                self.assertSame(doc)
+                self.edit(doc, "let x: int = 1;", 'let x: str = "1";')
+                self.assertSame(doc)
+                self.assertTrue(doc.errors)
+                self.edit(doc, 'let x: str = "1";', "let x: int = 3;")
+                self.assertSame(doc)
+                # 插入和删除语句使之后的全局变量换到别的槽位
+                self.edit(doc, "let y", "let w: int = 7;\nlet y")
+                self.assertSame(doc)
+                self.edit(doc, 'let s: str = "a";\n', "")
+                self.assertSame(doc)
+                self.edit(doc, "y * 2", "y * w + 1")
+                self.assertSame(doc)
+                self.assertEqual(s_run.execute(doc.program).find("z"), 6 * 7 + 1)
+                # 之后重新定义同名的全局变量，快照中要撤销它覆盖的类型
+                self.edit(doc, "let z", 'let x: str = "b";\nlet z')
+                self.assertSame(doc)
+                self.edit(doc, "let x: int = 3;", "let x: int = 4;")
+                self.assertSame(doc)
+                self.edit(doc, 'let x: str = "b";\n', "")
+                self.assertSame(doc)
+                self.assertEqual(s_run.execute(doc.program).find("z"), 8 * 7 + 1)
+
+    def test_paths(self):
+        doc = self.open(0)
+        self.edit(doc, "f(2)", "f(3)")
+        self.assertSame(doc)
+        self.assertIn("rewind", self.paths)
+        doc = self.open(10 ** 9)
+        self.edit(doc, "f(2)", "f(3)")
+        self.assertSame(doc)
+        self.assertNotIn("rewind", self.paths)
+        self.assertIn("snapshot", self.paths)
+
+    def test_unchanged_globals(self):
+        # 编辑后导出的全局变量不变时之后的语句不重新检查，变化时重新检查
+        doc = self.open(10 ** 9)
+        self.edit(doc, "return n + x", "return n * x")
+        self.assertSame(doc)
+        self.assertEqual(doc.checked, 1)
+        self.edit(doc, "fn f(n: int) -> int", "fn f(n: int) -> str")
+        self.assertSame(doc)
+        self.assertGreater(doc.checked, 1)
+        self.assertTrue(doc.errors)
+        self.edit(doc, "fn f(n: int) -> str", "fn f(n: int) -> int")
+        self.assertSame(doc)
+        self.assertFalse(doc.errors)
+
+    def test_syntax_error(self):
+        for replay_cost in (0, 10 ** 9):
+            with self.subTest(replay_cost=replay_cost):
+                doc = self.open(replay_cost)
+                self.edit(doc, "let s", "fn g( { let s")
+                self.assertIsInstance(doc.syntax_error, SSyntaxError)
+                self.assertIsNotNone(doc.dirty)
+                self.assertIs(doc.errors[0], doc.syntax_error)
+                with self.assertRaises(SSyntaxError):
+                    fresh(doc.text)
+                # 仍有语法错误时的编辑与未能解析的范围合并，修正后一起重新分析
+                self.edit(doc, "y * 2", "y * 5")
+                self.assertIsNotNone(doc.syntax_error)
+                self.edit(doc, "let x: int = 1;", "let x: int = 2;")
+                self.assertIsNotNone(doc.syntax_error)
+                self.edit(doc, "fn g( { ", "")
+                self.assertSame(doc)
+                self.assertEqual(s_run.execute(doc.program).find("z"), 4 * 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
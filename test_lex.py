@@ -0,0 +1,94 @@
+import unittest
+from s_error import SSyntaxError
+from s_lex import Lexer, FastLexer, TokenBuffer
+from s_data import TokenType
+
+ascii_code = 'let x_1: int = 12 + 3.5; fn f() -> str { return "a\\n"; } // c\n/* d */ True'
+non_ascii = ["let 变量: int = 1;", "ünïcode + x", "Ⅻ", "x = Ⅻ;", "áb", "́", "²", "1²",
+             "x²", "٣٤ + 1", "1٣", "x٣", "١.٥", "ℕ", "ª", "é_1"]
+
+
+def tokens(lexer_class: type, code: str) -> list[tuple]:
+    """Token 序列，出错时以异常类型结尾；值的类型参与比较"""
+    out: list[tuple] = []
+    try:
+        lexer = lexer_class(code)
+        while True:
+            token = lexer.next()
+            out.append((token.tp, type(token.val), token.val, token.ln, token.col))
+            if token.tp == TokenType.EOF:
+                return out
+    except Exception as e:
+        return out + [(type(e),)]
+
+
+class LexerTest(unittest.TestCase):
+    """FastLexer 与 Lexer 对同样的源码给出相同的 Token 序列或相同的错误"""
+
+    def assertSame(self, code: str):
+        self.assertEqual(tokens(FastLexer, code), tokens(Lexer, code), repr(code))
+
+    def test_ascii(self):
+        self.assertSame(ascii_code)
+
+    def test_non_ascii(self):
+        for code in non_ascii:
+            self.assertSame(code)
+
+    def test_bad_numbers(self):
+        for code in ["²", "1²", "1.2.3"]:
+            self.assertEqual(tokens(FastLexer, code)[-1], (SSyntaxError,), code)
+
+    def test_every_code_point(self):
+        # 每个 BMP 字符单独出现以及跟在名字、数字之后
+        for cp in range(0x80, 0x10000, 7):
+            ch = chr(cp)
+            if 0xD800 <= cp < 0xE000:
+                continue
+            for code in (ch, "a" + ch, "1" + ch, ch + "1"):
+                self.assertSame(code)
+
+
+class TokenBufferTest(unittest.TestCase):
+    """TokenBuffer 给出与 Lexer 相同的 Token 和行列号，词法错误在构造时抛出"""
+
+    def test_same_as_lexer(self):
+        for code in [ascii_code, *non_ascii, "1 1.0 True x 1.0 x", "a\n  b\n\nc", ""]:
+            expected = tokens(Lexer, code)
+            if expected[-1][0] is SSyntaxError:
+                expected = expected[-1:]
+            self.assertEqual(tokens(TokenBuffer, code), expected, repr(code))
+
+    def test_starts(self):
+        for code in [ascii_code, *non_ascii[:2], "a\n  bc\n\n12.5"]:
+            buffer, lexer = TokenBuffer(code), FastLexer(code)
+            for i in range(len(buffer)):
+                token = lexer.next()
+                self.assertEqual(buffer[i].start(), token.start(), (code, i))
+                self.assertEqual(buffer.text(i), code[buffer.starts[i]:buffer.ends[i]])
+
+    def test_literals(self):
+        # 相同的字面量只保存一份，1、1.0 和 True 各自保存
+        buffer = TokenBuffer("1 1.0 True x 1 x 1.0 y")
+        self.assertEqual(buffer.literals, [1, 1.0, True, "x", "y"])
+        self.assertEqual([type(buffer.value(i)) for i in range(len(buffer))],
+                         [int, float, bool, str, int, str, float, str, type(None)])
+        self.assertEqual(list(buffer.literal_ids), [0, 1, 2, 3, 0, 3, 1, 4, -1])
+
+    def test_lookahead(self):
+        buffer = TokenBuffer("let x: int = 1;")
+        self.assertEqual(buffer.peek(), TokenType.LET)
+        self.assertEqual(buffer.peek(2), TokenType.COLON)
+        self.assertEqual(buffer.peek(100), TokenType.EOF)
+        buffer.next()
+        mark = buffer.mark()
+        self.assertEqual([buffer.next().tp for _ in range(3)], [TokenType.ID, TokenType.COLON, TokenType.ID])
+        buffer.reset(mark)
+        self.assertEqual(buffer.next().val, "x")
+        # 读到末尾后一直返回 EOF
+        kinds = [buffer.next().tp for _ in range(8)]
+        self.assertEqual(kinds[-4:], [TokenType.SEMICOLON, TokenType.EOF, TokenType.EOF, TokenType.EOF])
+
+
+if __name__ == "__main__":
+    unittest.main()
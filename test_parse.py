@@ -0,0 +1,99 @@
+import unittest
+from s_data import TokenType, operators, prio
+from s_error import SSyntaxError
+from s_lex import FastLexer
+from s_parse import Parser
+import s_ast as ast
+
+symbols = {tp: text for text, tp in operators}
+
+
+def parse(code: str, positions: bool = False) -> ast.Expr:
+    parser = Parser(FastLexer(code), positions)
+    expr = parser.parse_expr()
+    parser.eat(TokenType.EOF)
+    return expr
+
+
+def show(node: ast.Expr) -> str:
+    """完全加括号的形式，只用于较浅的表达式"""
+    if isinstance(node, ast.Const):
+        return repr(node.val)
+    if isinstance(node, ast.Variable):
+        return node.name
+    if isinstance(node, ast.Binary):
+        return f"({show(node.left)} {symbols[node.op]} {show(node.right)})"
+    if isinstance(node, ast.Unary):
+        return f"({symbols[node.op]}{show(node.val)})"
+    if isinstance(node, ast.IndexOp):
+        return f"{show(node.base)}[{show(node.index)}]"
+    if isinstance(node, ast.Call):
+        return f"{show(node.func)}({', '.join(map(show, node.args))})"
+    raise TypeError(type(node).__name__)
+
+
+class ExprTest(unittest.TestCase):
+    """优先级爬升得到的语法树与运算符的优先级和结合性一致"""
+
+    def assertParse(self, code: str, expected: str):
+        self.assertEqual(show(parse(code)), expected, code)
+
+    def test_left_associative(self):
+        self.assertParse("a - b - c", "((a - b) - c)")
+        self.assertParse("a / b * c % d", "(((a / b) * c) % d)")
+        for op in prio:
+            s = symbols[op]
+            self.assertParse(f"a {s} b {s} c", f"((a {s} b) {s} c)")
+
+    def test_precedence(self):
+        # 每一级与更高的一级组合，无论先后都是高的一级先结合
+        levels = sorted({level: op for op, level in prio.items()}.items())
+        for (_, low), (_, high) in zip(levels, levels[1:]):
+            l, h = symbols[low], symbols[high]
+            self.assertParse(f"a {l} b {h} c", f"(a {l} (b {h} c))")
+            self.assertParse(f"a {h} b {l} c", f"((a {h} b) {l} c)")
+            self.assertParse(f"a {h} b {l} c {h} d", f"((a {h} b) {l} (c {h} d))")
+        self.assertParse("a || b && c ^ d | e & f < g == h << i + j * k",
+                         "(a || (b && (c ^ (d | (e & (f < (g == (h << (i + (j * k))))))))))")
+        self.assertParse("a * b + c << d == e < f & g | h ^ i && j || k",
+                         "((((((((((a * b) + c) << d) == e) < f) & g) | h) ^ i) && j) || k)")
+
+    def test_prefix_postfix(self):
+        self.assertParse("-f(x)[i]", "(-f(x)[i])")
+        self.assertParse("!-~a", "(!(-(~a)))")
+        self.assertParse("-a * -b", "((-a) * (-b))")
+        self.assertParse("f(x)(y)[i][j]", "f(x)(y)[i][j]")
+        self.assertParse("-(a + b)[i]", "(-(a + b)[i])")
+        self.assertParse("g()", "g()")
+
+    def test_nested(self):
+        self.assertParse("f(a, (b + c) * d, g(h[i - 1], k()))[j * (2 - e)]",
+                         "f(a, ((b + c) * d), g(h[(i - 1)], k()))[(j * (2 - e))]")
+        self.assertParse("((a))", "a")
+        self.assertParse("a[b[c[0]]] + f(-x, y)", "(a[b[c[0]]] + f((-x), y))")
+
+    def test_errors(self):
+        for code in ["a +", "(a", "f(a,", "f(a b)", "a[1", "a[]", ")", "a + * b"]:
+            with self.assertRaises(SSyntaxError, msg=code):
+                parse(code)
+
+    def test_positions(self):
+        expr = parse("x +\n  -f(y)[1]", positions=True)
+        self.assertEqual(expr.pos, (0, 0))
+        self.assertEqual(expr.right.pos, (1, 3))
+        self.assertEqual(expr.right.val.pos, (1, 3))
+
+    def test_deep(self):
+        # 递归下降在这些深度会超出递归限制
+        n = 20000
+        self.assertEqual(show(parse("(" * n + "1" + ")" * n)), "1")
+        for code in ["-" * n + "1", "f(" * n + "1" + ")" * n,
+                     "a[" * n + "1" + "]" * n, "1" + " + 1" * n, "1" + " + (1" * n + ")" * n]:
+            expr = parse(code)
+            self.assertGreaterEqual(sum(1 for _ in ast.walk(expr)), n // 2, code[:10])
+        expr = parse("(" * n + "a - b" + ")" * n)
+        self.assertEqual(show(expr), "(a - b)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from s_type import Function
+import s_builtins
+import s_prof
+import s_run
+
+code = """fn a() -> int {
+    fn h(n: int) -> int { return n + 1; }
+    return h(1);
+}
+fn b() -> int {
+    fn h(n: int) -> int { return n + 2; }
+    return h(1) + h(2);
+}
+fn fib(n: int) -> int { if n < 2 { return n; } return fib(n - 1) + fib(n - 2); }
+let r: int = a() + b() + fib(10);"""
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.profiler = s_prof.profile(s_run.load(code, positions=True), s_builtins.new_run_scope())
+        self.calls = {self.profiler.labels[fn]: stats.count for fn, stats in self.profiler.functions.items()}
+
+    def test_same_name_functions(self):
+        self.assertEqual(self.calls["h (2:5)"], 1)
+        self.assertEqual(self.calls["h (6:5)"], 2)
+
+    def test_memo_disabled(self):
+        # fib 是纯函数，缓存结果时只会调用 11 次
+        self.assertEqual(self.calls["fib (9:1)"], 177)
+        self.assertEqual(Function.memo_size, 1024)
+
+    def test_positions(self):
+        report = self.profiler.report(code)
+        self.assertIn("10:1       VarDecl", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
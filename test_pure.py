@@ -0,0 +1,97 @@
+import unittest
+from s_type import Function, Memo, MISS
+import s_ast as ast
+import s_run
+
+
+def memoized(code: str) -> dict[str, bool]:
+    """分析后各函数是否按参数缓存结果"""
+    program = s_run.load(code)
+    return {node.name: node.memoize for node in ast.walk(program) if isinstance(node, ast.FnDef)}
+
+
+class PureTest(unittest.TestCase):
+    """只有结果只取决于参数的函数才能缓存"""
+
+    def test_pure(self):
+        code = """let k: int = 3;
+            fn sq(n: int) -> int { return n * n + k; }
+            fn fib(n: int) -> int { if n < 2 { return n; } return fib(n - 1) + fib(n - 2); }
+            fn local(n: int) -> int { let s: int = 0; s = s + sq(n); return s; }
+            fn join(a: list<int>) -> int { return sum(a); }"""
+        # 参数是 list 的纯函数不缓存结果
+        self.assertEqual(memoized(code), {"sq": True, "fib": True, "local": True, "join": False})
+
+    def test_global_assigned_elsewhere(self):
+        code = """let g: int = 1;
+            fn f(n: int) -> int { return n + g; }
+            fn reset() -> int { g = 2; return 0; }
+            let a: int = f(1); reset(); let b: int = f(1);"""
+        self.assertEqual(memoized(code), {"f": False, "reset": False})
+        for engine in s_run.engines:
+            scope = s_run.execute(s_run.load(code), engine=engine)
+            self.assertEqual((scope.find("a"), scope.find("b")), (2, 3), engine)
+
+    def test_index_write(self):
+        code = """let a: list<int> = zeros(3);
+            fn f(n: int) -> int { a[0] = a[0] + n; return n; }
+            fn g(n: int) -> int { let b: list<int> = zeros(1); b[0] = n; return b[0]; }"""
+        self.assertEqual(memoized(code), {"f": False, "g": False})
+
+    def test_impure_callee(self):
+        # 间接调用非纯函数的函数同样不纯
+        code = """let c: int = 0;
+            fn bump() -> int { c = c + 1; return c; }
+            fn f(n: int) -> int { return n + bump(); }
+            fn g(n: int) -> int { return f(n) * 2; }"""
+        self.assertEqual(memoized(code), {"bump": False, "f": False, "g": False})
+
+    def test_nested_mutates_outer_local(self):
+        code = """fn f(n: int) -> int {
+                let c: int = 0;
+                fn inc() -> int { c = c + n; return c; }
+                inc();
+                return inc();
+            }
+            let r: int = f(2) + f(2);"""
+        self.assertFalse(memoized(code)["inc"])
+        for engine in s_run.engines:
+            scope = s_run.execute(s_run.load(code), engine=engine)
+            self.assertEqual(scope.find("r"), 8, engine)
+
+
+class MemoTest(unittest.TestCase):
+    """结果缓存按最近使用的顺序淘汰"""
+
+    def setUp(self):
+        self.saved = Function.jit_threshold, Function.memo_size
+
+    def tearDown(self):
+        Function.jit_threshold, Function.memo_size = self.saved
+
+    def test_lru(self):
+        memo = Memo(2)
+        self.assertIs(memo.get((1,)), MISS)
+        memo.put((1,), 10)
+        memo.put((2,), 20)
+        self.assertEqual(memo.get((1,)), 10)
+        # (2,) 最久未使用，被淘汰
+        memo.put((3,), 30)
+        self.assertIs(memo.get((2,)), MISS)
+        self.assertEqual(list(memo.cache), [(1,), (3,)])
+        self.assertEqual((memo.hits, memo.misses, memo.evictions), (1, 2, 1))
+
+    def test_engines(self):
+        code = """fn sq(n: int) -> int { return n * n; }
+            let r: int = sq(1) + sq(2) + sq(1) + sq(3) + sq(2);"""
+        Function.jit_threshold, Function.memo_size = None, 2
+        for engine in s_run.engines:
+            scope = s_run.execute(s_run.load(code), engine=engine)
+            memo = s_run.memo_stats(scope)["sq"]
+            self.assertEqual(scope.find("r"), 1 + 4 + 1 + 9 + 4, engine)
+            self.assertEqual((memo.hits, memo.misses, memo.evictions), (1, 4, 2), engine)
+            self.assertEqual(list(memo.cache), [(3,), (2,)], engine)
+
+
+if __name__ == "__main__":
+    unittest.main()
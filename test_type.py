@@ -0,0 +1,158 @@
+import copy
+import json
+import pickle
+import unittest
+from s_error import STypeError, SValueError
+from s_type import BoolArray, Function, Rope, StrType, concat
+import s_batch
+import s_run
+
+
+class BoolArrayTest(unittest.TestCase):
+    """list<bool> 的紧凑存储在各种操作下都应表现为 bool 的 list"""
+
+    def setUp(self):
+        self.a = BoolArray([True, False, True])
+
+    def assertBools(self, val: object, expected: list[bool]):
+        self.assertIs(type(val), BoolArray)
+        self.assertEqual(list(val), expected)
+        self.assertTrue(all(type(elem) is bool for elem in val))
+
+    def test_index(self):
+        self.assertIs(self.a[1], False)
+        self.assertIs(self.a[-1], True)
+
+    def test_slice(self):
+        self.assertBools(self.a[0:2], [True, False])
+        self.assertBools(self.a[::2], [True, True])
+
+    def test_concat_repeat(self):
+        self.assertBools(self.a + self.a, [True, False, True] * 2)
+        self.assertBools(self.a * 2, [True, False, True] * 2)
+        self.assertBools(2 * self.a, [True, False, True] * 2)
+        self.assertIs((self.a + self.a)[1], False)
+
+    def test_copy(self):
+        for val in (copy.copy(self.a), copy.deepcopy(self.a), pickle.loads(pickle.dumps(self.a))):
+            self.assertBools(val, [True, False, True])
+
+    def test_program(self):
+        code = """let c: list<bool> = less(arange(3), map_scale(arange(3), 2));
+            let d: list<bool> = c + c;
+            let v: bool = d[3];
+            let e: list<bool> = c * 2;"""
+        for engine in s_run.engines:
+            scope = s_run.execute(s_run.load(code), engine=engine)
+            self.assertIs(scope.find("v"), False)
+            self.assertBools(scope.find("d"), [False, True, True] * 2)
+            self.assertBools(scope.find("e"), [False, True, True] * 2)
+
+
+class IntListTest(unittest.TestCase):
+    """list<int> 使用 64 位整数存储，检查通过的写入不会得到 Python 的 TypeError/OverflowError"""
+
+    def setUp(self):
+        self.saved = Function.jit_threshold
+
+    def tearDown(self):
+        Function.jit_threshold = self.saved
+
+    def test_division_is_float(self):
+        with self.assertRaises(STypeError):
+            s_run.load("let a: list<int> = zeros(2); a[0] = 7 / 2;")
+        scope = s_run.execute(s_run.load("let f: float = 7 / 2;"))
+        self.assertEqual(scope.find("f"), 3.5)
+
+    def test_out_of_range(self):
+        code = """fn put(a: list<int>, v: int) -> int { a[0] = v; return 0; }
+            let a: list<int> = zeros(1);
+            let r: int = put(a, 9223372036854775807);
+            r = put(a, 9223372036854775807 + 1);"""
+        for engine in s_run.engines:
+            for jit_threshold in (None, 1):
+                Function.jit_threshold = jit_threshold
+                with self.assertRaises(SValueError, msg=(engine, jit_threshold)):
+                    s_run.execute(s_run.load(code), engine=engine)
+
+
+
+class RopeTest(unittest.TestCase):
+    """长度达到 Rope.threshold 的 str 拼接为 Rope，对程序的表现与 str 相同"""
+
+    def setUp(self):
+        self.saved = Function.jit_threshold, Function.memo_size
+
+    def tearDown(self):
+        Function.jit_threshold, Function.memo_size = self.saved
+
+    def test_threshold(self):
+        n = Rope.threshold
+        self.assertIs(type(concat("a" * (n - 2), "b")), str)
+        rope = concat("a" * (n - 1), "b")
+        self.assertIs(type(rope), Rope)
+        self.assertEqual(len(rope), n)
+        self.assertIs(type(concat(rope, "c")), Rope)
+
+    def test_str_behaviour(self):
+        rope = concat("a" * Rope.threshold, "bc")
+        flat = "a" * Rope.threshold + "bc"
+        self.assertTrue(rope == flat and flat == rope and not rope != flat)
+        self.assertEqual(hash(rope), hash(flat))
+        self.assertEqual({flat: 1}[rope], 1)
+        self.assertEqual((rope[0], rope[-1], rope[-3:]), ("a", "c", "abc"))
+        self.assertEqual(rope * 2, flat * 2)
+        self.assertEqual(2 * rope, flat * 2)
+        self.assertEqual("x" + rope, "x" + flat)
+        self.assertEqual(pickle.loads(pickle.dumps(rope)), flat)
+        # 从较早的 Rope 追加不影响之后的 Rope
+        longer = concat(rope, "d")
+        other = concat(rope, "e")
+        self.assertEqual((str(rope), str(longer), str(other)), (flat, flat + "d", flat + "e"))
+
+    def test_program(self):
+        code = """let n: int = %d, s: str = "", i: int = 0;
+            while i < n { s = s + "a"; i = i + 1; }
+            let t: str = s;
+            t = t + "!";
+            s = s + "?";
+            let p: str = "<" + s;
+            let c: str = s[n - 1] + s[n], e: bool = s == "%s", m: str = t * 2;"""
+        for n in range(Rope.threshold - 2, Rope.threshold + 2):
+            flat = "a" * n
+            for engine in s_run.engines:
+                for jit_threshold in (None, 1):
+                    Function.jit_threshold = jit_threshold
+                    scope = s_run.execute(s_run.load(code % (n, flat + "?")), engine=engine)
+                    key = (n, engine, jit_threshold)
+                    self.assertEqual(scope.find("s"), flat + "?", key)
+                    self.assertEqual(scope.find("t"), flat + "!", key)
+                    self.assertEqual(scope.find("p"), "<" + flat + "?", key)
+                    self.assertEqual(scope.find("c"), "a?", key)
+                    self.assertIs(scope.find("e"), True, key)
+                    self.assertEqual(scope.find("m"), (flat + "!") * 2, key)
+
+    def test_memo_key(self):
+        # 相等的 Rope 与 str 参数命中同一个缓存项
+        Function.jit_threshold, Function.memo_size = None, 16
+        code = """fn f(s: str) -> str { return s + "!"; }
+            let s: str = "", i: int = 0;
+            while i < %d { s = s + "a"; i = i + 1; }
+            let a: str = f(s), b: str = f("%s");""" % (Rope.threshold, "a" * Rope.threshold)
+        for engine in s_run.engines:
+            scope = s_run.execute(s_run.load(code), engine=engine)
+            self.assertIs(type(scope.find("s")), Rope, engine)
+            self.assertEqual(scope.find("b"), "a" * Rope.threshold + "!", engine)
+            memo = s_run.memo_stats(scope)["f"]
+            self.assertEqual((memo.hits, memo.misses), (1, 1), engine)
+
+    def test_batch_json(self):
+        batch = s_batch.Batch("let s: str = \"\"; while n > 0 { s = s + \"ab\"; n = n - 1; }",
+                              {"n": s_batch.IntType}, ["s"])
+        results = list(s_batch.run_batch(batch, [{"n": Rope.threshold // 2}, {"n": Rope.threshold}], workers=0))
+        for res, n in zip(results, (Rope.threshold // 2, Rope.threshold)):
+            self.assertEqual(json.loads(json.dumps(res.values, default=s_batch.jsonable)), {"s": "ab" * n})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from s_type import Function
+import s_run
+
+down = """fn down(n: int) -> int {
+    if n == 0 { return 0; }
+    return 1 + down(n - 1);
+}
+"""
+
+loop = """fn loop(n: int, acc: int) -> int {
+    if n == 0 { return acc; }
+    return loop(n - 1, acc + n);
+}
+"""
+
+
+def run(code: str):
+    return s_run.execute(s_run.load(code), engine="vm")
+
+
+class FrameStackTest(unittest.TestCase):
+    """VM 的调用在显式的帧栈上执行，深度只受内存限制，尾调用不使帧栈增长"""
+
+    def setUp(self):
+        self.saved = Function.memo_size
+
+    def tearDown(self):
+        Function.memo_size = self.saved
+
+    def test_deep_recursion(self):
+        Function.memo_size = None
+        scope = run(down + "let d: int = down(200000);")
+        self.assertEqual(scope.find("d"), 200000)
+
+    def test_tail_loop(self):
+        Function.memo_size = 16
+        scope = run(loop + "let t: int = loop(1000000, 0); let u: int = loop(1000000, 0);")
+        self.assertEqual(scope.find("t"), 500000500000)
+        self.assertEqual(scope.find("u"), 500000500000)
+        # 尾调用替换当前帧而不留下待缓存的项，只有最外层的调用缓存了结果
+        memo = scope.find("loop").memo
+        self.assertEqual(dict(memo.cache), {(1000000, 0): 500000500000})
+        self.assertEqual((memo.hits, memo.misses, memo.evictions), (1, 1000001, 0))
+
+    def test_deep_memo(self):
+        # 非尾调用在帧栈上留下待缓存的项，返回时依次写入缓存
+        Function.memo_size = 16
+        scope = run(down + "let d: int = down(20000); let e: int = down(19990);")
+        self.assertEqual((scope.find("d"), scope.find("e")), (20000, 19990))
+        memo = scope.find("down").memo
+        self.assertEqual(dict(memo.cache), {(n,): n for n in range(19985, 20001)})
+        self.assertEqual((memo.hits, memo.misses, memo.evictions), (1, 20001, 20001 - 16))
+
+    def test_memo_tail_call(self):
+        # 被尾调用的函数命中缓存时，结果写入调用者留下的待缓存项
+        Function.memo_size = 16
+        code = """fn g(n: int) -> int { return n * 2; }
+            fn h(n: int) -> int { return g(n + 1); }
+            let a: int = g(6); let b: int = h(5); let c: int = h(5) + h(7);"""
+        scope = run(code)
+        self.assertEqual((scope.find("a"), scope.find("b"), scope.find("c")), (12, 12, 28))
+        # 未命中的尾调用替换了当前帧，g(8) 的结果只缓存在 h 的项中
+        self.assertEqual(dict(scope.find("g").memo.cache), {(6,): 12})
+        self.assertEqual(dict(scope.find("h").memo.cache), {(5,): 12, (7,): 16})
+
+
+if __name__ == "__main__":
+    unittest.main()